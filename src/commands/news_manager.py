@@ -20,11 +20,17 @@
 from __future__ import annotations
 from typing import Dict, Sequence, Optional, Any, List
 
+import asyncio
 import discord
 from discord import app_commands
 import os
 
+from utils.archive import cold_archive
 from utils.db import *
+from utils.fanout import fanout
+from utils.globals import logger
+from utils.images import image_metadata
+from utils.tracing import traced_command, tracer
 
 GUILD_ID = discord.Object(id=int(os.environ["GUILD_ID"]))
 
@@ -37,6 +43,14 @@ ADMIN_ID = [
 ]
 
 
+def start_image_check(image_url: Optional[str]) -> Optional[asyncio.Future]:
+    # Started before deferring, so the check overlaps the defer round-trip
+    # instead of adding one of its own.
+    if image_url is None or not image_metadata.enabled:
+        return None
+    return asyncio.ensure_future(image_metadata.probe(image_url))
+
+
 class NewsCommands(app_commands.Group):
     def __init__(self):
         super().__init__(name="news", description="Manage and post news")
@@ -50,6 +64,7 @@ class NewsCommands(app_commands.Group):
         category="Category of this news item (choose from EMC categories)",
         region="The region this news item is about (defaults to 'Global')",
     )
+    @traced_command("news add")
     async def add(
         self,
         interaction: discord.Interaction,
@@ -71,6 +86,24 @@ class NewsCommands(app_commands.Group):
         except Exception:
             await interaction.response.send_message("Use a fucking user id")
             return
+        # newsschema's unique title doesn't see archived articles.
+        if await cold_archive.has_title(title):
+            await interaction.response.send_message("An archived news item already has that title.", ephemeral=True)
+            return
+
+        image_check = start_image_check(image_url)
+        # Sending and publishing can take longer than the 3 seconds allowed
+        # for a first response.
+        await interaction.response.defer(ephemeral=True)
+
+        image_note = ""
+        if image_check is not None:
+            image = await image_check
+            if image.broken:
+                await interaction.followup.send(f"That image URL doesn't work: {image.problem()}.", ephemeral=True)
+                return
+            if image.error is not None:
+                image_note = f" Couldn't check the image: {image.error}."
 
         news = await NewsSchema.create(
             title=title,
@@ -83,29 +116,40 @@ class NewsCommands(app_commands.Group):
             category=category.value,
         )
         if news is None:
-            await interaction.response.send_message("Failed to create news item.", ephemeral=True)
+            await interaction.followup.send("Failed to create news item.", ephemeral=True)
             return
 
         embed = news.to_embed()
 
         main_guild = interaction.client.get_guild(GUILD_ID.id)
         if main_guild is None:
-            await interaction.response.send_message("News saved but main guild not found.", ephemeral=True)
+            await interaction.followup.send("News saved but main guild not found.", ephemeral=True)
             return
 
         main_channel = main_guild.get_channel(NEWS_CHANNEL_ID)
         if not isinstance(main_channel, discord.TextChannel):
-            await interaction.response.send_message("News saved but main news channel is invalid.", ephemeral=True)
+            await interaction.followup.send("News saved but main news channel is invalid.", ephemeral=True)
             return
 
-        msg = await main_channel.send(embed=embed)
-        await msg.publish()
-
+        with tracer.span("discord.send"):
+            msg = await main_channel.send(embed=embed)
+        # Recorded before publishing, so a failed publish still leaves the
+        # message editable and deletable.
         news.message_id = msg.id
-        await news.save()
+        await news.save(update_fields=["message_id"])
+        await fanout.record(news.id, msg)
 
-        reporter.posts += 1
-        await reporter.save()
+        # Crossposts are limited to 10 an hour per channel; past that the
+        # article is posted but not published, and the reply says so.
+        publish_note = ""
+        try:
+            with tracer.span("discord.publish"):
+                await msg.publish()
+        except (discord.HTTPException, discord.RateLimited) as e:
+            logger.error(f"Could not publish news {news.id}: {e}")
+            publish_note = " It couldn't be published to following servers right now."
+
+        await interaction.followup.send(f"Posted news `{news.id}`.{publish_note}{image_note}", ephemeral=True)
 
 
     @app_commands.command(
@@ -122,6 +166,7 @@ class NewsCommands(app_commands.Group):
         region="(Optional) New region",
     )
 
+    @traced_command("news edit")
     async def edit(
         self,
         interaction: discord.Interaction,
@@ -133,7 +178,7 @@ class NewsCommands(app_commands.Group):
         category: Optional[Category] = None,
         region: Optional[Region] = None,
     ) -> None:
-        news = await NewsSchema.get_or_none(id=news_id)
+        news = await NewsSchema.get_or_none(id=news_id) or await cold_archive.restore(news_id)
         if news is None:
             await interaction.response.send_message(
                 "News ID not found.", ephemeral=True
@@ -148,6 +193,10 @@ class NewsCommands(app_commands.Group):
             )
             return
 
+        if title is not None and title != news.title and await cold_archive.has_title(title):
+            await interaction.response.send_message("An archived news item already has that title.", ephemeral=True)
+            return
+
         updated_fields = []
         if title is not None:
             news.title = title
@@ -175,20 +224,29 @@ class NewsCommands(app_commands.Group):
             )
             return
 
-        await news.save(update_fields=updated_fields)
+        image_check = start_image_check(image_url)
+        await interaction.response.defer()
 
-        new_embed = news.to_embed()
+        image_note = ""
+        if image_check is not None:
+            image = await image_check
+            if image.broken:
+                await interaction.followup.send(f"That image URL doesn't work: {image.problem()}. Nothing was changed.")
+                return
+            if image.error is not None:
+                image_note = f" Couldn't check the image: {image.error}."
 
-        msg: discord.Message = await interaction.guild.get_channel(NEWS_CHANNEL_ID).fetch_message(NewsSchema.message_id)
+        await news.save(update_fields=updated_fields)
 
-        await msg.edit(embed=new_embed)
+        result = await fanout.edit(interaction.client, news, news.to_embed(), NEWS_CHANNEL_ID)
 
-        await interaction.response.send_message("Updated message.")
+        await interaction.followup.send(f"Updated news `{news_id}`: {result.summary('updated')}.{image_note}")
         return
     @app_commands.command(name="delete", description="Delete a news item by ID")
     @app_commands.describe(news_id="The ID of the news item to delete")
+    @traced_command("news delete")
     async def delete(self, interaction: discord.Interaction, news_id: int) -> None:
-        news: Optional[NewsSchema] = await NewsSchema.get_or_none(id=news_id)
+        news: Optional[NewsSchema] = await NewsSchema.get_or_none(id=news_id) or await cold_archive.restore(news_id)
         if news is None:
             await interaction.response.send_message("Not found.", ephemeral=True)
             return
@@ -201,14 +259,14 @@ class NewsCommands(app_commands.Group):
             )
             return
 
-        msg: discord.Message = await interaction.guild.get_channel(NEWS_CHANNEL_ID).fetch_message(NewsSchema.message_id)
-        await msg.delete()
+        await interaction.response.defer(ephemeral=True)
+        result = await fanout.delete(interaction.client, news, NEWS_CHANNEL_ID)
 
         await news.delete()
         await news.reset_sqlite_autoincrement("newsschema")
 
-        await interaction.response.send_message(
-            f"🗑Deleted news `{news_id}` from all subscribers.", ephemeral=True
+        await interaction.followup.send(
+            f"🗑Deleted news `{news_id}`: {result.summary('removed')}.", ephemeral=True
         )
 
     @app_commands.command(name="lookup", description="Lookup news by filters")
@@ -217,6 +275,7 @@ class NewsCommands(app_commands.Group):
         nation="Nation to search for",
         author="Author to search for",
     )
+    @traced_command("news lookup")
     async def lookup(
         self,
         interaction: discord.Interaction,
@@ -241,6 +300,7 @@ class NewsCommands(app_commands.Group):
     @app_commands.describe(
         limit="How many items to show (max 10)",
     )
+    @traced_command("news recent")
     async def recent(
         self,
         interaction: discord.Interaction,
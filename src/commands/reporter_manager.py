@@ -3,6 +3,8 @@ from discord import app_commands
 import os
 from utils.globals import logger
 from utils.db import ReporterSchema
+from utils.stats import news_stats
+from utils.tracing import traced_command
 
 REQUIRED_ROLE_ID = int(str(os.environ.get("REPORTER_ROLE")))
 
@@ -26,6 +28,7 @@ class ReporterManager(app_commands.Group):
         return True
 
     @app_commands.command(name="add", description="Add a reporter by user ID")
+    @traced_command("reporter add")
     async def add_reporter(self, interaction: discord.Interaction, user_id: str):
         allowed = await self.interaction_check(interaction)
         if not allowed: await interaction.response.send_message("You are not allowed to perform this action"); return
@@ -38,6 +41,7 @@ class ReporterManager(app_commands.Group):
             await interaction.response.send_message(f"Reporter `{user_id}` added.", ephemeral=True)
 
     @app_commands.command(name="remove", description="Remove a reporter by user ID")
+    @traced_command("reporter remove")
     async def remove_reporter(self, interaction: discord.Interaction, user_id: int):
         allowed = await self.interaction_check(interaction)
         if not allowed: await interaction.response.send_message("You are not allowed to perform this action"); return
@@ -49,6 +53,7 @@ class ReporterManager(app_commands.Group):
             await interaction.response.send_message("Reporter not found.", ephemeral=True)
 
     @app_commands.command(name="suspend", description="Suspend a reporter by user ID")
+    @traced_command("reporter suspend")
     async def suspend_reporter(self, interaction: discord.Interaction, user_id: int):
         rep = await ReporterSchema.get_or_none(user_id=user_id)
         allowed = await self.interaction_check(interaction)
@@ -61,6 +66,7 @@ class ReporterManager(app_commands.Group):
             await interaction.response.send_message("Reporter not found.", ephemeral=True)
 
     @app_commands.command(name="unsuspend", description="Unsuspend a reporter by user ID")
+    @traced_command("reporter unsuspend")
     async def unsuspend_reporter(self, interaction: discord.Interaction, user_id: int):
         rep = await ReporterSchema.get_or_none(user_id=user_id)
         allowed = await self.interaction_check(interaction)
@@ -73,6 +79,7 @@ class ReporterManager(app_commands.Group):
             await interaction.response.send_message("Reporter not found.", ephemeral=True)
 
     @app_commands.command(name="strikes", description="Get the number of strikes for a reporter by user ID")
+    @traced_command("reporter strikes")
     async def get_strikes(self, interaction: discord.Interaction, user_id: int):
         rep = await ReporterSchema.get_or_none(user_id=user_id)
         if rep:
@@ -82,6 +89,27 @@ class ReporterManager(app_commands.Group):
         else:
             await interaction.response.send_message("Reporter not found.", ephemeral=True)
             
+    @app_commands.command(name="stats", description="Show article counts, or one reporter's by user ID")
+    @traced_command("reporter stats")
+    async def stats(self, interaction: discord.Interaction, user_id: str = ""):
+        if user_id:
+            await interaction.response.send_message(
+                f"Reporter `{user_id}` has {news_stats.count('reporter', user_id)} articles.", ephemeral=True
+            )
+            return
+
+        stats = news_stats.get_stats(days=7)
+        top_reporters = sorted(stats["reporters"].items(), key=lambda kv: kv[1], reverse=True)[:5]
+        categories = sorted(stats["categories"].items(), key=lambda kv: kv[1], reverse=True)
+        regions = sorted(stats["regions"].items(), key=lambda kv: kv[1], reverse=True)
+
+        lines = [f"**Total articles:** {stats['total']}"]
+        lines.append("**Top reporters:** " + (", ".join(f"<@{rid}> ({n})" for rid, n in top_reporters) or "none"))
+        lines.append("**Categories:** " + (", ".join(f"{name} ({n})" for name, n in categories) or "none"))
+        lines.append("**Regions:** " + (", ".join(f"{name} ({n})" for name, n in regions) or "none"))
+        lines.append("**Last 7 days:** " + (", ".join(f"{day}: {n}" for day, n in stats["days"].items()) or "none"))
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+            
     async def add_strike(self, interaction: discord.Interaction, user_id: int):
         allowed = await self.interaction_check(interaction)
         if not allowed: await interaction.response.send_message("You are not allowed to perform this action"); return
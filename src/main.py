@@ -16,19 +16,31 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
 import logging
 
+import dotenv, os, asyncio, threading, subprocess, sys, atexit, time
+
+# Before the utils imports: several modules read their settings at import.
+dotenv.load_dotenv()
+
+# First, so that stage timings start as close to process start as possible
+# (importing the package starts the "imports" stage).
+from utils.startup import startup
+
 from tortoise import Tortoise
-import uvicorn
 import importlib
 import pkgutil
 from discord import app_commands
-import dotenv, os, asyncio, threading
 
-from utils.db import ReporterSchema
+from utils.db import DATABASE_URL, NewsSchema, ReporterSchema
+from utils.stats import news_stats
 
-dotenv.load_dotenv()
 from utils.globals import *
 
+startup.finish("imports")
+
 DISCORD_TOKEN = os.environ.get("TOKEN")
+# Above 1, the API runs as that many uvicorn worker processes reading index
+# snapshots that this process writes (see utils/snapshot.py).
+API_WORKERS = int(os.environ.get("API_WORKERS", "1"))
 
 
 def load_app_command_modules(tree: app_commands.CommandTree, package: str):
@@ -92,24 +104,71 @@ async def setup(set_up: bool):
 
 
 def start_api():
-    uvicorn.run("utils.api:app", host="0.0.0.0", port=3000)
+    if API_WORKERS <= 1:
+        # Imported here: the API (and FastAPI with it) only loads on its own thread.
+        import uvicorn
+        uvicorn.run("utils.api:app", host="0.0.0.0", port=3000)
+        return
+
+    from utils.snapshot import SNAPSHOT_PATH
+
+    # uvicorn only supervises workers from a main thread, so in its own process.
+    env = dict(os.environ, API_MODE="worker", API_BOOT_ID=f"{int(time.time() * 1000):x}",
+               INDEX_SNAPSHOT_PATH=os.path.abspath(SNAPSHOT_PATH))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "utils.api:app", "--host", "0.0.0.0", "--port", "3000",
+         "--workers", str(API_WORKERS), "--app-dir", os.path.dirname(os.path.abspath(__file__))],
+        env=env,
+    )
+    atexit.register(process.terminate)
+    process.wait()
 
 async def start_db():
-    await Tortoise.init(
-        db_url="sqlite://db.db",
-        modules={"models": ["utils.db"]},
+    with startup.stage("database"):
+        await Tortoise.init(
+            db_url=DATABASE_URL,
+            modules={"models": ["utils.db"]},
 
-    )
-    await Tortoise.generate_schemas()
+        )
+        await Tortoise.generate_schemas()
     logger.error("Schema generated!")
+    with startup.stage("stats"):
+        await news_stats.load()
+
+async def build_index():
+    # This process owns the index; the workers only read its snapshots. Built
+    # in the background so the bot logs in meanwhile.
+    from utils.idx import initialize_idx
+    from utils.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL, cold_archive
+    from utils.snapshot import SNAPSHOT_DEBOUNCE, SNAPSHOT_MIN_INTERVAL, snapshot_publisher
+
+    try:
+        with startup.stage("index"):
+            await initialize_idx(NewsSchema)
+        with startup.stage("archive"):
+            await cold_archive.refresh_totals()
+        with startup.stage("snapshot"):
+            await snapshot_publisher.publish()
+    except Exception as e:
+        logger.error(f"Failed to build the index: {e}")
+        return
+    asyncio.create_task(snapshot_publisher.run(SNAPSHOT_MIN_INTERVAL, SNAPSHOT_DEBOUNCE))
+    asyncio.create_task(cold_archive.run(ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL))
+
+@bot.event
+async def setup_hook():
+    if API_WORKERS > 1:
+        asyncio.create_task(build_index())
 
 @bot.event
 async def on_ready():
 
     logger.error(f"Logged in as {bot.user} ({bot.user.id})")
+    startup.finish("discord")
 
-    load_app_command_modules(bot.tree, "commands")
-    await bot.tree.sync()
+    with startup.stage("commands"):
+        load_app_command_modules(bot.tree, "commands")
+        await bot.tree.sync()
     logger.error("Commands synced")
     await setup(set_up)
 
@@ -118,4 +177,5 @@ async def on_ready():
 asyncio.run(start_db())
 api_thread = threading.Thread(target=start_api, daemon=True)
 api_thread.start()
+startup.start("discord")
 bot.run(DISCORD_TOKEN, log_handler=None)
@@ -0,0 +1,684 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Offline load test for the slash commands. A stand-in guild, channel,
+# message and interaction layer (with latency and Discord-style rate limits)
+# drives the real `/news` and `/reporter` callbacks concurrently against a
+# throwaway SQLite database.
+#
+#   python src/tools/simulate.py --operations 500 --concurrency 50
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import discord
+
+# The command modules read these at import time.
+os.environ.setdefault("GUILD_ID", "100000000000000001")
+os.environ.setdefault("NEWS_CHANNEL_ID", "100000000000000002")
+os.environ.setdefault("REPORTER_ROLE", "100000000000000003")
+os.environ.setdefault("ADMIN_ID", "")
+# Posted image URLs are made up; checking them would only measure DNS.
+os.environ.setdefault("IMAGE_CHECK", "0")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tortoise import Tortoise
+
+from commands.news_manager import command as news_command
+from commands.reporter_manager import command as reporter_command
+from utils.db import Category, NewsCopySchema, NewsSchema, Region, ReporterSchema
+from utils.idx import initialize_idx
+from utils.limits import TokenBucket
+from utils.stats import news_stats
+
+GUILD_ID = int(os.environ["GUILD_ID"])
+NEWS_CHANNEL_ID = int(os.environ["NEWS_CHANNEL_ID"])
+REPORTER_ROLE = int(os.environ["REPORTER_ROLE"])
+
+# Discord drops an interaction that isn't acknowledged within 3 seconds.
+RESPONSE_DEADLINE = 3.0
+
+DEFAULT_MIX = "add=4,lookup=3,recent=2,edit=1,delete=0.5,stats=0.5"
+
+WORDS = (
+    "crusalis election war treaty harbour council storm market festival border "
+    "sports final mayor bridge strike rail summit trade drought museum"
+).split()
+
+_snowflakes = itertools.count(200_000_000_000_000_000)
+
+
+def snowflake() -> int:
+    return next(_snowflakes)
+
+
+@dataclass
+class SimConfig:
+    latency: float = 0.08
+    jitter: float = 0.04
+    # (requests, per seconds) for each rate-limited route.
+    send_rate: Tuple[int, float] = (5, 5.0)
+    publish_rate: Tuple[int, float] = (10, 3600.0)
+    edit_rate: Tuple[int, float] = (5, 5.0)
+    # discord.py sleeps through shorter rate limits and raises past this.
+    max_ratelimit_timeout: float = 5.0
+
+
+class _HTTPResponse:
+    # Enough of an aiohttp response for discord.HTTPException.
+    def __init__(self, status: int, reason: str):
+        self.status = status
+        self.reason = reason
+
+
+@dataclass
+class SimStats:
+    api_calls: Counter = field(default_factory=Counter)
+    rate_limited: Counter = field(default_factory=Counter)
+    rate_limit_wait: float = 0.0
+    db_queries: int = 0
+    db_waits: int = 0
+    db_wait_time: float = 0.0
+    db_max_wait: float = 0.0
+    db_max_queue: int = 0
+    db_locked_errors: int = 0
+
+
+class SimDiscord:
+    # Shared latency and rate-limit model for every fake API call.
+
+    def __init__(self, config: SimConfig, rng: random.Random):
+        self.config = config
+        self.rng = rng
+        self.stats = SimStats()
+        self.buckets: Dict[Tuple[str, int], TokenBucket] = {}
+
+    async def call(self, route: str, major_id: int = 0) -> None:
+        self.stats.api_calls[route] += 1
+        limit = getattr(self.config, f"{route}_rate", None)
+        if limit is not None:
+            requests, per = limit
+            key = (route, major_id)
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(requests / per, requests, updated=time.monotonic())
+            while True:
+                allowed, retry_after = bucket.take(time.monotonic())
+                if allowed:
+                    break
+                self.stats.rate_limited[route] += 1
+                if retry_after > self.config.max_ratelimit_timeout:
+                    raise discord.RateLimited(retry_after)
+                self.stats.rate_limit_wait += retry_after
+                await asyncio.sleep(retry_after)
+        await asyncio.sleep(max(0.0, self.config.latency + self.rng.uniform(-1, 1) * self.config.jitter))
+
+
+class SimMessage:
+    def __init__(self, sim: SimDiscord, channel: "SimChannel", embed: Optional[discord.Embed], content: Optional[str]):
+        self.sim = sim
+        self.channel = channel
+        self.id = snowflake()
+        self.embed = embed
+        self.content = content
+        self.published = False
+
+    async def edit(self, *, embed: Optional[discord.Embed] = None, content: Optional[str] = None, **_kwargs):
+        await self.sim.call("edit", self.channel.id)
+        if self.id not in self.channel.messages:
+            raise discord.NotFound(_HTTPResponse(404, "Not Found"), "Unknown Message")
+        self.embed = embed if embed is not None else self.embed
+        self.content = content if content is not None else self.content
+        return self
+
+    async def delete(self, **_kwargs) -> None:
+        await self.sim.call("delete", self.channel.id)
+        if self.channel.messages.pop(self.id, None) is None:
+            raise discord.NotFound(_HTTPResponse(404, "Not Found"), "Unknown Message")
+
+    async def publish(self) -> None:
+        await self.sim.call("publish", self.channel.id)
+        self.published = True
+
+
+class SimChannel(discord.TextChannel):
+    # Subclassed only so `isinstance(channel, discord.TextChannel)` holds.
+
+    def __init__(self, sim: SimDiscord, channel_id: int, guild: "SimGuild"):
+        self.sim = sim
+        self.id = channel_id
+        self.name = "news"
+        self.guild = guild
+        self.messages: Dict[int, SimMessage] = {}
+
+    def __repr__(self) -> str:
+        return f"<SimChannel id={self.id}>"
+
+    async def send(self, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None, **_kwargs) -> SimMessage:
+        await self.sim.call("send", self.id)
+        message = SimMessage(self.sim, self, embed, content)
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id: Any) -> SimMessage:
+        await self.sim.call("fetch", self.id)
+        message = self.messages.get(message_id) if isinstance(message_id, int) else None
+        if message is None:
+            raise discord.NotFound(_HTTPResponse(404, "Not Found"), "Unknown Message")
+        return message
+
+
+class SimPartialMessage:
+    # What get_partial_message returns: ids only, so the call is the only cost.
+
+    def __init__(self, sim: SimDiscord, guild: "SimGuild", channel_id: int, message_id: int):
+        self.sim = sim
+        self.guild = guild
+        self.channel_id = channel_id
+        self.id = message_id
+
+    def _resolve(self) -> Optional[SimMessage]:
+        channel = self.guild.get_channel(self.channel_id)
+        return channel.messages.get(self.id) if channel is not None else None
+
+    async def edit(self, **kwargs) -> Optional[SimMessage]:
+        message = self._resolve()
+        if message is None:
+            await self.sim.call("edit", self.channel_id)
+            raise discord.NotFound(_HTTPResponse(404, "Not Found"), "Unknown Message")
+        return await message.edit(**kwargs)
+
+    async def delete(self, **kwargs) -> None:
+        message = self._resolve()
+        if message is None:
+            await self.sim.call("delete", self.channel_id)
+            raise discord.NotFound(_HTTPResponse(404, "Not Found"), "Unknown Message")
+        await message.delete(**kwargs)
+
+
+class SimPartialChannel:
+    def __init__(self, sim: SimDiscord, guild: "SimGuild", channel_id: int):
+        self.sim = sim
+        self.guild = guild
+        self.id = channel_id
+
+    def get_partial_message(self, message_id: int) -> SimPartialMessage:
+        return SimPartialMessage(self.sim, self.guild, self.id, message_id)
+
+
+class SimRole:
+    def __init__(self, role_id: int):
+        self.id = role_id
+        self.members: List["SimMember"] = []
+
+
+class SimMember(discord.Member):
+    # Subclassed only so `isinstance(user, discord.Member)` holds.
+
+    def __init__(self, user_id: int, name: str, roles: List[SimRole]):
+        self._sim_id = user_id
+        self._sim_name = name
+        self._sim_roles = roles
+
+    def __repr__(self) -> str:
+        return f"<SimMember id={self._sim_id}>"
+
+    @property
+    def id(self) -> int:
+        return self._sim_id
+
+    @property
+    def name(self) -> str:
+        return self._sim_name
+
+    @property
+    def roles(self) -> List[SimRole]:
+        return self._sim_roles
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self._sim_id}>"
+
+
+class SimGuild:
+    def __init__(self, sim: SimDiscord, guild_id: int):
+        self.id = guild_id
+        self.channels: Dict[int, SimChannel] = {}
+        self.roles: Dict[int, SimRole] = {}
+        self.channels[NEWS_CHANNEL_ID] = SimChannel(sim, NEWS_CHANNEL_ID, self)
+        self.roles[REPORTER_ROLE] = SimRole(REPORTER_ROLE)
+
+    def get_channel(self, channel_id: int) -> Optional[SimChannel]:
+        return self.channels.get(channel_id)
+
+    def get_role(self, role_id: int) -> Optional[SimRole]:
+        return self.roles.get(role_id)
+
+
+class SimClient:
+    def __init__(self, sim: SimDiscord, guild: SimGuild):
+        self.sim = sim
+        self.guild = guild
+        self.users: Dict[int, SimMember] = {}
+
+    def is_ready(self) -> bool:
+        return True
+
+    def get_guild(self, guild_id: int) -> Optional[SimGuild]:
+        return self.guild if guild_id == self.guild.id else None
+
+    def get_user(self, user_id: int) -> Optional[SimMember]:
+        return self.users.get(user_id)
+
+    def get_partial_messageable(self, channel_id: int, **_kwargs) -> SimPartialChannel:
+        return SimPartialChannel(self.sim, self.guild, channel_id)
+
+    async def fetch_user(self, user_id: int) -> SimMember:
+        await self.sim.call("user")
+        user = self.users.get(user_id)
+        if user is None:
+            raise discord.NotFound(_HTTPResponse(404, "Not Found"), "Unknown User")
+        return user
+
+
+class SimResponse:
+    def __init__(self, interaction: "SimInteraction"):
+        self.interaction = interaction
+        self.responded_at: Optional[float] = None
+
+    def is_done(self) -> bool:
+        return self.responded_at is not None
+
+    async def _respond(self) -> None:
+        if self.is_done():
+            raise discord.InteractionResponded(self.interaction)
+        await self.interaction.sim.call("interaction")
+        self.responded_at = time.monotonic()
+
+    async def send_message(self, content: Optional[str] = None, **_kwargs) -> None:
+        await self._respond()
+
+    async def defer(self, **_kwargs) -> None:
+        await self._respond()
+
+
+class SimFollowup:
+    def __init__(self, interaction: "SimInteraction"):
+        self.interaction = interaction
+        self.sent = 0
+
+    async def send(self, content: Optional[str] = None, **_kwargs) -> None:
+        if not self.interaction.response.is_done():
+            raise discord.NotFound(_HTTPResponse(404, "Not Found"), "Unknown Webhook")
+        await self.interaction.sim.call("followup")
+        self.sent += 1
+
+
+class SimInteraction:
+    def __init__(self, sim: SimDiscord, client: SimClient, user: SimMember):
+        self.sim = sim
+        self.id = snowflake()
+        self.client = client
+        self.guild = client.guild
+        self.guild_id = client.guild.id
+        self.channel = client.guild.get_channel(NEWS_CHANNEL_ID)
+        self.user = user
+        self.created_at = time.monotonic()
+        self.response = SimResponse(self)
+        self.followup = SimFollowup(self)
+
+
+@dataclass
+class Result:
+    command: str
+    duration: float
+    first_response: Optional[float]
+    error: Optional[str]
+    detail: Optional[str]
+
+
+class TimedLock:
+    # Stands in for the SQLite client's connection lock to measure how long
+    # queries queue behind each other.
+
+    def __init__(self, lock: asyncio.Lock, stats: SimStats):
+        self.lock = lock
+        self.stats = stats
+        self.waiting = 0
+
+    def locked(self) -> bool:
+        return self.lock.locked()
+
+    async def acquire(self) -> bool:
+        self.stats.db_queries += 1
+        if not self.lock.locked():
+            return await self.lock.acquire()
+        self.waiting += 1
+        self.stats.db_max_queue = max(self.stats.db_max_queue, self.waiting)
+        started = time.monotonic()
+        try:
+            return await self.lock.acquire()
+        finally:
+            self.waiting -= 1
+            waited = time.monotonic() - started
+            self.stats.db_waits += 1
+            self.stats.db_wait_time += waited
+            self.stats.db_max_wait = max(self.stats.db_max_wait, waited)
+
+    def release(self) -> None:
+        self.lock.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+class Simulation:
+    def __init__(self, config: SimConfig, reporters: int, seed: int):
+        self.rng = random.Random(seed)
+        self.sim = SimDiscord(config, self.rng)
+        self.guild = SimGuild(self.sim, GUILD_ID)
+        self.client = SimClient(self.sim, self.guild)
+        self.channel = self.guild.get_channel(NEWS_CHANNEL_ID)
+        self.role = self.guild.get_role(REPORTER_ROLE)
+        self.members: List[SimMember] = []
+        for i in range(reporters):
+            member = SimMember(snowflake(), f"reporter{i}", [self.role])
+            self.members.append(member)
+            self.role.members.append(member)
+            self.client.users[member.id] = member
+        self.articles: Dict[int, int] = {}
+        self.results: List[Result] = []
+
+    def _title(self) -> str:
+        return " ".join(self.rng.choices(WORDS, k=4)).capitalize() + f" #{snowflake()}"
+
+    async def seed(self, articles: int) -> None:
+        for member in self.members:
+            await ReporterSchema.create(user_id=member.id)
+        for _ in range(articles):
+            member = self.rng.choice(self.members)
+            news = await NewsSchema.create(
+                title=self._title(),
+                description=" ".join(self.rng.choices(WORDS, k=24)),
+                image_url=f"https://example.invalid/{snowflake()}.png",
+                credit=str(member.id),
+                reporter=str(member.id),
+                region=self.rng.choice(list(Region)),
+                category=self.rng.choice(list(Category)).value,
+            )
+            # Already posted before the run: no latency or rate limits.
+            message = SimMessage(self.sim, self.channel, news.to_embed(), None)
+            self.channel.messages[message.id] = message
+            news.message_id = message.id
+            await news.save(update_fields=["message_id"])
+            await NewsCopySchema.create(news=news, guild_id=GUILD_ID, channel_id=self.channel.id, message_id=message.id)
+            self.articles[news.id] = member.id
+
+    def _pick_article(self, member: SimMember) -> Optional[int]:
+        own = [news_id for news_id, owner in self.articles.items() if owner == member.id]
+        return self.rng.choice(own) if own else None
+
+    async def _run_one(self, name: str, member: SimMember) -> None:
+        interaction = SimInteraction(self.sim, self.client, member)
+        title = None
+        error = None
+        detail = None
+        try:
+            if name == "add":
+                title = self._title()
+                await news_command.add.callback(
+                    news_command, interaction,
+                    title=title,
+                    description=" ".join(self.rng.choices(WORDS, k=24)),
+                    image_url=f"https://example.invalid/{snowflake()}.png",
+                    credit=str(member.id),
+                    category=self.rng.choice(list(Category)),
+                    region=self.rng.choice(list(Region)),
+                )
+            elif name == "lookup":
+                await news_command.lookup.callback(news_command, interaction, topic=self.rng.choice(WORDS))
+            elif name == "recent":
+                await news_command.recent.callback(news_command, interaction, limit=5)
+            elif name == "edit":
+                news_id = self._pick_article(member)
+                if news_id is None:
+                    return
+                await news_command.edit.callback(
+                    news_command, interaction, news_id=news_id,
+                    description=" ".join(self.rng.choices(WORDS, k=24)),
+                )
+            elif name == "delete":
+                news_id = self._pick_article(member)
+                if news_id is None:
+                    return
+                self.articles.pop(news_id, None)
+                await news_command.delete.callback(news_command, interaction, news_id=news_id)
+            elif name == "stats":
+                # Mirrors the tree's dispatch: the group check runs first.
+                if await reporter_command.interaction_check(interaction):
+                    await reporter_command.stats.callback(reporter_command, interaction, user_id="")
+            else:
+                raise ValueError(f"Unknown command {name}")
+        except Exception as e:
+            error = type(e).__name__
+            detail = str(e)[:100]
+
+        finished = time.monotonic()
+        responded_at = interaction.response.responded_at
+        self.results.append(Result(
+            command=name,
+            duration=finished - interaction.created_at,
+            first_response=None if responded_at is None else responded_at - interaction.created_at,
+            error=error,
+            detail=detail,
+        ))
+
+        if name == "add" and title is not None:
+            news = await NewsSchema.get_or_none(title=title)
+            if news is not None:
+                self.articles[news.id] = member.id
+
+    async def run(self, operations: int, concurrency: int, mix: Dict[str, float]) -> float:
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def worker(name: str, member: SimMember) -> None:
+            async with semaphore:
+                await self._run_one(name, member)
+
+        plan = [(self.rng.choices(names, weights)[0], self.rng.choice(self.members)) for _ in range(operations)]
+        started = time.monotonic()
+        await asyncio.gather(*(worker(name, member) for name, member in plan))
+        return time.monotonic() - started
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def build_report(simulation: Simulation, elapsed: float) -> Dict[str, Any]:
+    by_command: Dict[str, List[Result]] = defaultdict(list)
+    for result in simulation.results:
+        by_command[result.command].append(result)
+
+    commands = {}
+    for name, results in sorted(by_command.items()):
+        durations = [r.duration for r in results]
+        no_response = sum(1 for r in results if r.first_response is None)
+        late = sum(1 for r in results if r.first_response is not None and r.first_response > RESPONSE_DEADLINE)
+        commands[name] = {
+            'count': len(results),
+            'errors': dict(Counter(r.error for r in results if r.error)),
+            'error_examples': {r.error: r.detail for r in reversed(results) if r.error},
+            'p50_ms': round(_percentile(durations, 50) * 1000, 1),
+            'p95_ms': round(_percentile(durations, 95) * 1000, 1),
+            'max_ms': round(max(durations) * 1000, 1),
+            'late_responses': late,
+            'no_response': no_response,
+        }
+
+    stats = simulation.sim.stats
+    total = len(simulation.results)
+    return {
+        'operations': total,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_ops_s': round(total / elapsed, 2) if elapsed else 0.0,
+        'deadline_misses': sum(c['late_responses'] + c['no_response'] for c in commands.values()),
+        'commands': commands,
+        'discord': {
+            'api_calls': dict(stats.api_calls),
+            'rate_limited': dict(stats.rate_limited),
+            'rate_limit_wait_s': round(stats.rate_limit_wait, 3),
+        },
+        'db': {
+            'queries': stats.db_queries,
+            'queued': stats.db_waits,
+            'queue_wait_s': round(stats.db_wait_time, 3),
+            'max_queue_wait_ms': round(stats.db_max_wait * 1000, 1),
+            'max_queue_depth': stats.db_max_queue,
+            'locked_errors': stats.db_locked_errors,
+        },
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['operations']} operations in {report['elapsed_s']}s "
+          f"({report['throughput_ops_s']} ops/s), {report['deadline_misses']} missed the "
+          f"{RESPONSE_DEADLINE:.0f}s response deadline")
+    print()
+    print(f"{'command':<8} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'late':>5} {'no resp':>8}  errors")
+    for name, row in report['commands'].items():
+        errors = "; ".join(
+            f"{error} x{count} ({row['error_examples'][error]})" for error, count in row['errors'].items()
+        ) or "-"
+        print(f"{name:<8} {row['count']:>6} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['max_ms']:>9} "
+              f"{row['late_responses']:>5} {row['no_response']:>8}  {errors}")
+    print()
+    discord_stats = report['discord']
+    print(f"discord: {sum(discord_stats['api_calls'].values())} calls, rate limited "
+          f"{discord_stats['rate_limited'] or 'never'}, {discord_stats['rate_limit_wait_s']}s waited across calls")
+    db = report['db']
+    print(f"db: {db['queries']} queries, {db['queued']} queued behind another "
+          f"({db['queue_wait_s']}s total, max {db['max_queue_wait_ms']} ms, depth {db['max_queue_depth']}), "
+          f"{db['locked_errors']} 'database is locked' errors")
+
+
+def _rate(value: str) -> Tuple[int, float]:
+    requests, _, per = value.partition("/")
+    return int(requests), float(per or 1)
+
+
+def _mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def _instrument_db(stats: SimStats) -> None:
+    client = Tortoise.get_connection("default")
+    client._lock = TimedLock(client._lock, stats)
+
+    for method in ("execute_insert", "execute_query", "execute_query_dict", "execute_many", "execute_script"):
+        original = getattr(client, method)
+
+        async def wrapped(*args, _original=original, **kwargs):
+            try:
+                return await _original(*args, **kwargs)
+            except Exception as e:
+                if "locked" in str(e):
+                    stats.db_locked_errors += 1
+                raise
+
+        setattr(client, method, wrapped)
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    config = SimConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        send_rate=_rate(args.send_rate),
+        publish_rate=_rate(args.publish_rate),
+        edit_rate=_rate(args.edit_rate),
+        max_ratelimit_timeout=args.max_ratelimit_timeout,
+    )
+    simulation = Simulation(config, args.reporters, args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        await Tortoise.init(db_url=f"sqlite://{tmp}/simulate.db", modules={"models": ["utils.db"]})
+        try:
+            await Tortoise.generate_schemas()
+            await simulation.seed(args.articles)
+            await news_stats.load()
+            await initialize_idx(NewsSchema)
+            await _instrument_db(simulation.sim.stats)
+
+            elapsed = await simulation.run(args.operations, args.concurrency, _mix(args.mix))
+        finally:
+            await Tortoise.close_connections()
+
+    return build_report(simulation, elapsed)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load-test the slash commands against a fake Discord.")
+    parser.add_argument("--operations", type=int, default=200, help="number of command invocations")
+    parser.add_argument("--concurrency", type=int, default=25, help="invocations in flight at once")
+    parser.add_argument("--reporters", type=int, default=20, help="registered reporters sending commands")
+    parser.add_argument("--articles", type=int, default=100, help="articles in the database before the run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted commands, e.g. add=4,lookup=3")
+    parser.add_argument("--latency", type=float, default=0.08, help="mean Discord API latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.04, help="latency jitter in seconds")
+    parser.add_argument("--send-rate", default="5/5", help="channel message sends, requests/seconds")
+    parser.add_argument("--publish-rate", default="10/3600", help="announcement crossposts, requests/seconds")
+    parser.add_argument("--edit-rate", default="5/5", help="message edits, requests/seconds")
+    parser.add_argument("--max-ratelimit-timeout", type=float, default=5.0,
+                        help="longest rate limit to sleep through before raising RateLimited")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    result = asyncio.run(main(arguments))
+    if arguments.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
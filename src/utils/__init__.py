@@ -1,4 +1,25 @@
-from .api import *
-from .db import *
-from .idx import *
-from .globals import *
\ No newline at end of file
+# Submodules are imported when first used: `utils.api` alone pulls in
+# FastAPI and every index structure, which the bot doesn't need before the
+# API thread starts. `stats` and `stream` are imported up front because
+# importing them registers the ORM signals that keep the counters and the
+# event feed in step with every write. `startup` comes before them, so that
+# the "imports" stage covers them too.
+import importlib
+
+from .startup import startup as _startup
+
+_startup.start("imports")
+
+from . import stats, stream  # noqa: E402,F401
+
+# What `from utils import name` still finds, searched in this order.
+_EXPORTING_MODULES = ("globals", "db", "idx", "stats", "stream", "api")
+
+
+def __getattr__(name: str):
+    if not name.startswith("_"):
+        for module_name in _EXPORTING_MODULES:
+            module = importlib.import_module(f".{module_name}", __name__)
+            if hasattr(module, name):
+                return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Text analysis for the search index: unicode normalization -> case folding ->
+# word split -> stop words / min length -> optional light stemming.
+
+import hashlib
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+# Bump when the pipeline itself changes in a way that alters its output.
+# 2: words are split before normalization, so every token keeps its offsets.
+PIPELINE_VERSION = 2
+
+DEFAULT_STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'from', 'up', 'about', 'into', 'through', 'during',
+    'before', 'after', 'above', 'below', 'between', 'among', 'down', 'out',
+    'off', 'over', 'under', 'again', 'further', 'then', 'once', 'here',
+    'there', 'when', 'where', 'why', 'how', 'all', 'any', 'both', 'each',
+    'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not',
+    'only', 'own', 'same', 'so', 'than', 'too', 'very', 'can', 'will',
+    'just', 'should', 'now'
+})
+
+_WORD_RE = re.compile(r'\w+')
+
+# Cached per-word results; cleared wholesale when full.
+_WORD_CACHE_SIZE = 50_000
+
+
+@dataclass(frozen=True)
+class AnalyzerConfig:
+    unicode_form: Optional[str] = 'NFKC'
+    casefold: bool = True
+    stop_words: FrozenSet[str] = field(default=DEFAULT_STOP_WORDS)
+    stem: bool = False
+    min_length: int = 3
+
+    @classmethod
+    def from_env(cls) -> "AnalyzerConfig":
+        unicode_form = os.environ.get("ANALYZER_UNICODE_FORM", "NFKC").strip().upper()
+        return cls(
+            unicode_form=unicode_form if unicode_form not in ("", "NONE") else None,
+            casefold=os.environ.get("ANALYZER_CASEFOLD", "1") != "0",
+            stem=os.environ.get("ANALYZER_STEM", "0") == "1",
+            min_length=int(os.environ.get("ANALYZER_MIN_LENGTH", "3")),
+        )
+
+
+def light_stem(word: str) -> str:
+    # Harman's "S" stemmer: plurals only, so it never mangles names.
+    if len(word) > 4 and word.endswith('ies') and not word.endswith(('eies', 'aies')):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('es') and not word.endswith(('aes', 'ees', 'oes')):
+        return word[:-1]
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('us', 'ss')):
+        return word[:-1]
+    return word
+
+
+class Analyzer:
+    def __init__(self, config: Optional[AnalyzerConfig] = None):
+        self.config = config or AnalyzerConfig()
+        self._word_cache: Dict[str, Tuple[Optional[str], ...]] = {}
+
+        digest = hashlib.sha1(repr((
+            PIPELINE_VERSION,
+            self.config.unicode_form,
+            self.config.casefold,
+            sorted(self.config.stop_words),
+            self.config.stem,
+            self.config.min_length,
+        )).encode()).hexdigest()
+        self.version = f"{PIPELINE_VERSION}-{digest[:12]}"
+
+    def _prepare(self, text: str) -> str:
+        if self.config.unicode_form and not text.isascii():
+            text = unicodedata.normalize(self.config.unicode_form, text)
+        return text.casefold() if self.config.casefold else text
+
+    def _term(self, word: str) -> Optional[str]:
+        if len(word) < self.config.min_length or word in self.config.stop_words:
+            return None
+        if self.config.stem:
+            return light_stem(word)
+        return word
+
+    def _word_terms(self, word: str) -> Tuple[Optional[str], ...]:
+        # Terms for one word of the original text, None where dropped.
+        # Normalizing can split a word (NFKC turns "½" into "1⁄2").
+        try:
+            return self._word_cache[word]
+        except KeyError:
+            pass
+
+        terms = tuple(self._term(part) for part in _WORD_RE.findall(self._prepare(word)))
+
+        if len(self._word_cache) >= _WORD_CACHE_SIZE:
+            self._word_cache.clear()
+        self._word_cache[word] = terms
+        return terms
+
+    def analyze_spans(self, text: str) -> List[Tuple[str, int, int, int]]:
+        # (term, position, start, end); positions count every word, kept or
+        # not, and start/end index into the original text.
+        if not text:
+            return []
+        result = []
+        position = 0
+        for match in _WORD_RE.finditer(text):
+            for term in self._word_terms(match.group()):
+                if term is not None:
+                    result.append((term, position, match.start(), match.end()))
+                position += 1
+        return result
+
+    def analyze(self, text: str) -> List[Tuple[str, int]]:
+        return [(term, position) for term, position, _start, _end in self.analyze_spans(text)]
+
+    def terms(self, text: str) -> List[str]:
+        return [term for term, _position, _start, _end in self.analyze_spans(text)]
@@ -4,12 +4,36 @@
 # Updated FastAPI routes with reverse index integration
 #
 from contextlib import asynccontextmanager
+import asyncio
 
-from fastapi import APIRouter, Query, HTTPException, FastAPI
+from fastapi import APIRouter, Query, HTTPException, FastAPI, Header
 from typing import Optional
-from .db import NewsSchema, Category
-from fastapi.responses import FileResponse, HTMLResponse
+from datetime import datetime
+import os
+from urllib.parse import parse_qs, quote
+from .db import NewsSchema, Category, usernames
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from .globals import bot, logger
+from .responses import FastJSONResponse, json_bytes
+from .serialize import (
+    IMAGE_FIELD, SNIPPET_FIELD, PayloadCache, dumps, encode_items, parse_fields, payload_cache, username_ttl,
+)
+from .middleware import CachePolicy, CompressionMiddleware, ConditionalMiddleware, EntityTags, http_stats
+from .singleflight import normalize_query, search_flight
+from .limits import AdmissionMiddleware, admission_stats
+from .stats import news_stats
+from .timeidx import month_range
+from .stream import event_hub
+from .related import related_index
+from .snippets import snippets_for
+from .spell import spell_index
+from .archive import ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL, cold_archive
+from .tracing import TracingMiddleware, render_traces_page, tracer
+from .snapshot import snapshot_reader, worker_lifespan
+from .fanout import fanout
+from .querylog import QUERY_LOG_FLUSH_INTERVAL, WARM_TOP_QUERIES, cache_warmer, query_log
+from .startup import startup
+from .images import image_metadata
 
 from .idx import (
     initialize_idx,
@@ -20,67 +44,442 @@ from .idx import (
 
 router = APIRouter(prefix="", tags=["News"])
 
+API_MODE = os.environ.get("API_MODE", "single")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Requests are accepted straight away: until the index is ready, routes
+    # answer from the database, and the index builds in the background.
+    background = []
+    try:
+        if API_MODE == "worker":
+            # One of several processes started by the bot (API_WORKERS > 1):
+            # the index comes from the bot's snapshots instead.
+            startup.finish("imports")
+            async with worker_lifespan():
+                background.append(asyncio.create_task(_start_in_background(background)))
+                startup.finish("api")
+                yield
+        else:
+            background.append(asyncio.create_task(_start_in_background(background)))
+            startup.finish("api")
+            yield
+    finally:
+        for task in background:
+            task.cancel()
+        query_log.flush()
+        await image_metadata.close()
+
+
+async def _start_in_background(tasks: list) -> None:
+    if API_MODE != "worker" or query_log.claim():
+        tasks.append(asyncio.create_task(query_log.run(QUERY_LOG_FLUSH_INTERVAL)))
     try:
-        await initialize_idx(NewsSchema)
-        logger.info("Search index initialized successfully")
-        yield
+        if API_MODE == "worker":
+            while not news_index.is_initialized:
+                await asyncio.sleep(0.5)
+        else:
+            with startup.stage("index"):
+                await initialize_idx(NewsSchema)
+            logger.info("Search index initialized successfully")
+            with startup.stage("archive"):
+                await cold_archive.refresh_totals()
+            tasks.append(asyncio.create_task(cold_archive.run(ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL)))
+
+        # Replays the most frequent logged queries once there is an index.
+        entries = [(route, params) for route, params, _count in query_log.top(WARM_TOP_QUERIES)]
+        with startup.stage("warm_up"):
+            await cache_warmer.run(entries, _replay, ready=lambda: API_MODE == "worker" or bot.is_ready())
     except Exception as e:
         logger.error(f"Failed to initialize search index: {e}")
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
+CACHE_POLICIES = [
+    CachePolicy("/api/recent", "public, max-age=5"),
+    CachePolicy("/api/news/search/all/", "public, max-age=15"),
+    CachePolicy("/api/news", "public, max-age=15"),
+    CachePolicy("/api/archive/", "public, max-age=60"),
+    CachePolicy("/api/categories", "public, max-age=3600"),
+]
 
-@router.get("/api/news/{title}")
-async def get_news_by_title(title: str, q: Optional[str] = None):
+def _content_version(scope) -> tuple:
+    version = (news_index.generation, bot.is_ready())
+    # Image metadata fills in after the first response that asks for it.
+    fields = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("fields", [])
+    if scope["path"].endswith("/image") or any(IMAGE_FIELD in value.split(",") for value in fields):
+        version += (image_metadata.version,)
+    return version
+
+
+entity_tags = EntityTags(CACHE_POLICIES, _content_version)
+
+app.add_middleware(ConditionalMiddleware, tags=entity_tags)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get("COMPRESS_MIN_SIZE", "1024")),
+)
+# Added last so it runs first: rejected requests cost nothing downstream.
+app.add_middleware(
+    AdmissionMiddleware,
+    rate=float(os.environ.get("RATE_LIMIT_PER_SECOND", "5")),
+    burst=float(os.environ.get("RATE_LIMIT_BURST", "20")),
+    max_concurrent=int(os.environ.get("MAX_EXPENSIVE_REQUESTS", "8")),
+    max_waiting=int(os.environ.get("MAX_EXPENSIVE_WAITING", "64")),
+    max_queue_wait=int(os.environ.get("MAX_QUEUE_WAIT_MS", "500")) / 1000,
+    expensive_prefixes=("/api/news/", "/api/archive/"),
+    expensive_paths=("/api/news",),
+    exempt_prefixes=("/healthz", "/readyz"),
+    trust_proxy=os.environ.get("TRUST_PROXY", "0") == "1",
+    # Revalidations that will end as a 304 don't wait for an expensive slot.
+    skip_queue=entity_tags.not_modified,
+)
+# Outermost, so a trace includes time spent waiting for admission.
+app.add_middleware(
+    TracingMiddleware,
+    tracer=tracer,
+    exclude_prefixes=("/api/stream", "/debug/", "/healthz", "/readyz"),
+)
+
+
+async def fetch_ordered(news_ids: list[int]) -> list[NewsSchema]:
+    with tracer.span("NewsSchema.filter", ids=len(news_ids)):
+        news_items = await NewsSchema.filter(id__in=news_ids).all()
+    id_to_item = {item.id: item for item in news_items}
+    if len(id_to_item) < len(news_ids):
+        missing = [news_id for news_id in news_ids if news_id not in id_to_item]
+        id_to_item.update(await cold_archive.fetch(missing))
+    return [id_to_item[news_id] for news_id in news_ids if news_id in id_to_item]
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[tuple[str, ...]]:
     try:
-        candidate_ids = await search_news(title, limit=20)
-        
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Whole response bodies by route and parameters. Entries are keyed by the
+# content version they were built under, so the old ones just age out. The
+# warm-up fills this, so the first real searches after a restart skip the
+# index and the database as well as the encoding.
+result_cache = PayloadCache(int(os.environ.get("RESULT_CACHE_SIZE", "256")))
+
+
+def _result_version(selected: Optional[tuple[str, ...]]) -> tuple:
+    version = (news_index.generation, cold_archive.version, bot.is_ready())
+    if selected is not None and IMAGE_FIELD in selected:
+        version += (image_metadata.version,)
+    return version
+
+
+async def _cached(key: tuple, selected: Optional[tuple[str, ...]], compute):
+    key += _result_version(selected)
+    result = result_cache.get(key)
+    if result is None:
+        result = await compute()
+        if result is not None:
+            body = result[0] if isinstance(result, tuple) else result
+            ttl = username_ttl(body, bot.is_ready()) if isinstance(body, bytes) else None
+            result_cache.put(key, result, ttl)
+    return result
+
+
+async def _encode(news_items: list[NewsSchema], fields: Optional[tuple[str, ...]], query: Optional[str] = None) -> bytes:
+    extras = None
+    if fields is not None and SNIPPET_FIELD in fields:
+        extras = snippets_for(news_index, news_items, query)
+    if fields is not None and IMAGE_FIELD in fields:
+        extras = _image_extras(news_items, extras or {})
+    return await encode_items(news_items, bot, fields, extras)
+
+
+def _image_extras(news_items: list[NewsSchema], extras: dict) -> dict:
+    # Only what is cached: an unchecked image is null this time and checked
+    # in the background for the next request.
+    for item in news_items:
+        info = image_metadata.cached(item.image_url)
+        extras.setdefault(item.id, {})[IMAGE_FIELD] = info.to_dict() if info is not None else None
+    if image_metadata.enabled:
+        image_metadata.prefetch(item.image_url for item in news_items)
+    return extras
+
+
+async def search_with_suggestions(query: str, limit: int,
+                                  include_archive: bool = False) -> tuple[list[int], Optional[str]]:
+    # Misspelled queries get retried with corrections before any SQL fallback.
+    candidate_ids = await search_news(query, limit=limit)
+    # The archive is only searched when asked for, so its index isn't kept
+    # loaded by ordinary traffic.
+    if include_archive and len(candidate_ids) < limit and cold_archive.block_count:
+        # Recent articles first; the archive only fills up what's left.
+        seen = set(candidate_ids)
+        archived = await cold_archive.search(query, limit)
+        candidate_ids += [news_id for news_id in archived if news_id not in seen][:limit - len(candidate_ids)]
+    if candidate_ids or not news_index.is_initialized:
+        return candidate_ids, None
+
+    for suggestion in spell_index.suggest(query):
+        candidate_ids = await search_news(suggestion, limit=limit)
         if candidate_ids:
-            news_items = await NewsSchema.filter(id__in=candidate_ids).all()
-            id_to_item = {item.id: item for item in news_items}
-            ordered_items = [id_to_item[news_id] for news_id in candidate_ids if news_id in id_to_item]
-        else:
-            ordered_items = await NewsSchema.search_query(topic=title)
-        
-        return {
-            "news": [await item.to_dict(bot) for item in ordered_items], 
-        }
+            return candidate_ids, suggestion
+    return [], None
+
+
+async def _news_by_title(title: str, fields: Optional[tuple[str, ...]],
+                         include_archive: bool = False) -> tuple[bytes, Optional[str]]:
+    candidate_ids, suggestion = await search_with_suggestions(title, 20, include_archive)
+
+    if candidate_ids:
+        ordered_items = await fetch_ordered(candidate_ids)
+    else:
+        ordered_items = await NewsSchema.search_query(topic=title)
+
+    body = b'{"news":' + await _encode(ordered_items, fields, suggestion or title)
+    if suggestion is not None:
+        body += b',"did_you_mean":' + dumps(suggestion)
+    return body + b'}', suggestion
+
+
+async def _search_all(query: str, limit: int, fields: Optional[tuple[str, ...]],
+                      include_archive: bool = False) -> tuple[bytes | dict, Optional[str]]:
+    if news_index.is_initialized:
+        candidate_ids, suggestion = await search_with_suggestions(query, limit, include_archive)
+
+        if candidate_ids:
+            return await _encode(await fetch_ordered(candidate_ids), fields, suggestion or query), suggestion
+
+    news_items = await NewsSchema.search_all(query.upper(), limit)
+    if len(news_items) == 0:
+        return {"error": 404}, None
+    return await _encode(news_items, fields, query), None
+
+
+def _respond(result: tuple[bytes | dict, Optional[str]]):
+    body, suggestion = result
+    if not isinstance(body, bytes):
+        return body
+    headers = {"X-Did-You-Mean": quote(suggestion)} if suggestion is not None else None
+    return json_bytes(body, headers=headers)
+
+
+async def _replay(route: str, params: dict) -> None:
+    # The same work as the route, minus the HTTP layer and the query log.
+    selected = _parse_fields(params.get("fields"))
+    include_archive = params.get("include_archive", False)
+    if route == "title":
+        await _title_result(params["q"], selected, include_archive)
+    elif route == "all":
+        await _search_all_result(params["q"], params.get("limit", 10), selected, include_archive)
+    elif route == "recent":
+        await _cached(("recent", selected), selected, lambda: _recent(selected))
+    elif route == "browse":
+        await _browse(
+            datetime.fromisoformat(params["since"]) if params.get("since") else None,
+            datetime.fromisoformat(params["until"]) if params.get("until") else None,
+            params.get("category"), params.get("region"), params.get("q"),
+            params.get("limit", 20), params.get("offset", 0), params.get("fields"), include_archive,
+        )
+    elif route == "related":
+        # Older logs may hold limits above what the route takes now.
+        limit = min(params.get("limit", 5), related_index.k)
+        await _cached(("related", params["id"], limit, selected), selected,
+                      lambda: _related(params["id"], limit, selected))
+
+
+async def _title_result(title: str, selected: Optional[tuple[str, ...]], include_archive: bool):
+    key = ("title", normalize_query(title), selected, include_archive)
+    return await _cached(key, selected, lambda: search_flight.do(
+        key, lambda: _news_by_title(title, selected, include_archive),
+    ))
+
+
+async def _search_all_result(query: str, limit: int, selected: Optional[tuple[str, ...]], include_archive: bool):
+    key = ("all", normalize_query(query), limit, selected, include_archive)
+    return await _cached(key, selected, lambda: search_flight.do(
+        key, lambda: _search_all(query, limit, selected, include_archive),
+    ))
+
+
+@router.get("/api/news/{title}")
+async def get_news_by_title(title: str, q: Optional[str] = None, fields: Optional[str] = None,
+                            include_archive: bool = False):
+    selected = _parse_fields(fields)
+    query_log.record("title", q=normalize_query(title), fields=fields, include_archive=include_archive or None)
+    try:
+        return _respond(await _title_result(title, selected, include_archive))
     except Exception as e:
         logger.error(f"Error in get_news_by_title: {e}")
         news_items = await NewsSchema.search_query(topic=title)
-        return {"news": [await item.to_dict(bot) for item in news_items], "q": q}
+        return {"news": [await item.to_dict(bot, selected) for item in news_items], "q": q}
 
 @router.get('/api/news/search/all/{query}')
-async def search_all_news(query: str, limit: int = 10):
+async def search_all_news(query: str, limit: int = 10, fields: Optional[str] = None, include_archive: bool = False):
+    selected = _parse_fields(fields)
+    query_log.record("all", q=normalize_query(query), limit=limit, fields=fields, include_archive=include_archive or None)
     try:
-        if news_index.is_initialized:
-            candidate_ids = await search_news(query, limit=limit)
-            
-            if candidate_ids:
-                news_items = await NewsSchema.filter(id__in=candidate_ids).all()
-                
-                id_to_item = {item.id: item for item in news_items}
-                ordered_items = [id_to_item[news_id] for news_id in candidate_ids if news_id in id_to_item]
-                
-                return [await item.to_dict(bot) for item in ordered_items]
-        
-        news_items = await NewsSchema.search_all(query.upper(), limit)
-        if len(news_items) == 0:
-            return {"error": 404}
-        return [await item.to_dict(bot) for item in news_items]
-        
+        return _respond(await _search_all_result(query, limit, selected, include_archive))
     except Exception as e:
         logger.error(f"Error in search_all_news: {e}")
         news_items = await NewsSchema.search_all(query.upper(), limit)
-        return [await item.to_dict(bot) for item in news_items]
+        return [await item.to_dict(bot, selected) for item in news_items]
 
 @router.get("/api/recent")
-async def get_recent():
-    news_items = await NewsSchema.get_recent(10)
-    return [await item.to_dict(bot) for item in news_items]
+async def get_recent(fields: Optional[str] = None):
+    selected = _parse_fields(fields)
+    query_log.record("recent", fields=fields)
+    return json_bytes(await _cached(("recent", selected), selected, lambda: _recent(selected)))
+
+
+async def _recent(selected: Optional[tuple[str, ...]]) -> bytes:
+    if news_index.is_initialized:
+        news_items = await fetch_ordered(news_index.latest(10))
+    else:
+        news_items = await NewsSchema.get_recent(10)
+    return await _encode(news_items, selected)
+
+
+async def _browse(
+    since: Optional[datetime],
+    until: Optional[datetime],
+    category: Optional[str],
+    region: Optional[str],
+    q: Optional[str],
+    limit: int,
+    offset: int,
+    fields: Optional[str] = None,
+    include_archive: bool = False,
+):
+    selected = _parse_fields(fields)
+    # Normalized here so live requests and warm-up replays share cache keys.
+    q = normalize_query(q or "") or None
+    key = ("browse", since, until, category, region, q, limit, offset, selected, include_archive)
+    return json_bytes(await _cached(key, selected, lambda: _browse_page(
+        since, until, category, region, q, limit, offset, selected, include_archive,
+    )))
+
+
+async def _browse_page(
+    since: Optional[datetime],
+    until: Optional[datetime],
+    category: Optional[str],
+    region: Optional[str],
+    q: Optional[str],
+    limit: int,
+    offset: int,
+    selected: Optional[tuple[str, ...]],
+    include_archive: bool,
+) -> bytes:
+    # Dates, facets and text are resolved in memory; the database only sees
+    # the final page of ids.
+    if news_index.is_initialized:
+        if cold_archive.block_count and (include_archive or cold_archive.covers(since, until)):
+            page_ids, total = await cold_archive.browse(news_index, since, until, category, region, q, limit, offset)
+        else:
+            page_ids, total = news_index.browse(since, until, category, region, q, limit, offset)
+        news_items = await fetch_ordered(page_ids) if page_ids else []
+    else:
+        news_items, total = await NewsSchema.browse(since, until, category, region, q, limit, offset)
+
+    header = f'{{"total":{total},"offset":{offset},"limit":{limit},"news":'.encode()
+    return header + await _encode(news_items, selected, q) + b'}'
+
+
+@router.get("/api/news")
+async def browse_news(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    category: Optional[str] = None,
+    region: Optional[str] = None,
+    q: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = None,
+    include_archive: bool = False,
+):
+    q = normalize_query(q or "") or None
+    query_log.record(
+        "browse", since=since.isoformat() if since else None, until=until.isoformat() if until else None,
+        category=category, region=region, q=q,
+        limit=limit, offset=offset, fields=fields, include_archive=include_archive or None,
+    )
+    return await _browse(since, until, category, region, q, limit, offset, fields, include_archive)
+
+
+@router.get("/api/archive/{year}/{month}")
+async def archive(
+    year: int,
+    month: int,
+    category: Optional[str] = None,
+    region: Optional[str] = None,
+    q: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = None,
+):
+    if not 1 <= month <= 12 or not 1 <= year <= 9999:
+        raise HTTPException(status_code=404, detail="No such month")
+    since, until = month_range(year, month)
+    return await _browse(since, until, category, region, q, limit, offset, fields)
+
+
+@router.get("/api/news/{news_id}/related")
+async def related_news(news_id: int, limit: int = Query(min(5, related_index.k), ge=1, le=related_index.k),
+                       fields: Optional[str] = None):
+    # Only RELATED_TOP_K neighbours are stored per article.
+    selected = _parse_fields(fields)
+    query_log.record("related", id=news_id, limit=limit, fields=fields)
+    body = await _cached(("related", news_id, limit, selected), selected, lambda: _related(news_id, limit, selected))
+    if body is None:
+        return {"error": 404}
+    return json_bytes(body)
+
+
+async def _related(news_id: int, limit: int, selected: Optional[tuple[str, ...]]) -> Optional[bytes]:
+    pairs = related_index.related(news_id, limit)
+    if pairs is None:
+        return None
+    return await _encode(await fetch_ordered([other_id for other_id, _score in pairs]), selected)
+
+
+@router.get("/api/news/{news_id}/image")
+async def news_image(news_id: int):
+    if not image_metadata.enabled:
+        raise HTTPException(status_code=503, detail="Image checks are disabled")
+    news_items = await fetch_ordered([news_id])
+    if not news_items:
+        return {"error": 404}
+    info = await image_metadata.probe(news_items[0].image_url)
+    return {"id": news_id, "image_url": info.url, **info.to_dict()}
+
+
+@router.get("/api/stream")
+async def stream(last_event_id: Optional[str] = Header(None)):
+    subscriber = event_hub.subscribe(last_event_id)
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many subscribers", headers={"Retry-After": "30"})
+
+    async def events():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/api/categories")
@@ -91,4 +490,67 @@ async def categories():
     return {"categories": l}
 
 
+@router.get("/api/stats")
+async def content_stats(days: int = Query(30, ge=0, le=3660)):
+    return news_stats.get_stats(days)
+
+
+# Enough to take traffic: everything else has a database fallback.
+READY_STAGES = ("database", "api")
+
+
+def _health() -> dict:
+    health = startup.to_dict()
+    health["index_ready"] = news_index.is_initialized
+    if API_MODE == "worker" and snapshot_reader.snapshot is not None:
+        health["builder"] = snapshot_reader.snapshot.header.get("startup")
+    return health
+
+
+@router.get("/healthz")
+async def healthz():
+    return _health()
+
+
+@router.get("/readyz")
+async def readyz(require: Optional[str] = None):
+    # `require=index,warm_up` waits for more than the minimum.
+    stages = READY_STAGES + tuple(name.strip() for name in (require or "").split(",") if name.strip())
+    health = _health()
+    health["ready"] = startup.is_done(stages)
+    return FastJSONResponse(health, status_code=200 if health["ready"] else 503)
+
+
+@router.get("/api/stats/runtime")
+async def runtime_stats():
+    return {
+        "index": news_index.get_stats(),
+        "payload_cache": payload_cache.get_stats(),
+        "result_cache": result_cache.get_stats(),
+        "http": http_stats,
+        "singleflight": search_flight.get_stats(),
+        "admission": admission_stats,
+        "stream": event_hub.get_stats(),
+        "related": related_index.get_stats(),
+        "spell": spell_index.get_stats(),
+        "tracing": tracer.get_stats(),
+        "archive": cold_archive.get_stats(),
+        "fanout": fanout.get_stats(),
+        "query_log": query_log.get_stats(),
+        "warm_up": cache_warmer.get_stats(),
+        "usernames": usernames.get_stats(),
+        "images": image_metadata.get_stats(),
+        "snapshot": snapshot_reader.get_stats() if API_MODE == "worker" else None,
+    }
+
+
+@router.get("/debug/traces", response_class=HTMLResponse)
+async def slowest_traces(limit: int = Query(50, ge=1, le=500), name: Optional[str] = None,
+                         token: Optional[str] = None, x_debug_token: Optional[str] = Header(None)):
+    # Traces carry paths, queries and user ids: only with TRACE_DEBUG_TOKEN.
+    if not tracer.authorized(x_debug_token or token):
+        raise HTTPException(status_code=404)
+    return HTMLResponse(render_traces_page(tracer.slowest(limit, name)))
+
+
 app.include_router(router)
\ No newline at end of file
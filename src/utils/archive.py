@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Hot/cold tiering. Articles older than ARCHIVE_AFTER_DAYS move out of
+# `newsschema` into compressed blocks in `archiveblockschema` and out of the
+# in-memory index. A second index over the archive is only built when a search
+# or browse actually reaches that far back, and is dropped again once idle, so
+# resident memory follows the hot set rather than the whole history.
+#
+# An article's posted copies (newsschema's copy rows) go into the block with
+# it, and `restore` moves both back when /news edits or deletes the article.
+
+import asyncio
+import json
+import os
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from .db import ArchiveBlockSchema, ArchivedNewsSchema, NewsCopySchema, NewsSchema, Region
+from .globals import logger
+from .idx import ReverseIndex, add_news_to_index, news_index, run_on_index_loop
+from .timeidx import to_timestamp
+
+COLUMNS = (
+    'id', 'title', 'description', 'image_url', 'credit', 'reporter',
+    'region', 'category', 'date', 'message_id', 'editor_id',
+)
+COPY_COLUMNS = ('guild_id', 'channel_id', 'message_id', 'crosspost', 'created')
+
+
+def encode_block(rows: List[Dict[str, Any]]) -> Tuple[bytes, int]:
+    # Each article is its COLUMNS values followed by a list of its copies.
+    raw = json.dumps(
+        [
+            [row[column] for column in COLUMNS]
+            + [[[copy[column] for column in COPY_COLUMNS] for copy in row.get('copies', ())]]
+            for row in rows
+        ],
+        ensure_ascii=False, separators=(",", ":"), default=_encode_value,
+    ).encode("utf-8")
+    return zlib.compress(raw, 6), len(raw)
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Region):
+        return value.value
+    raise TypeError(f"Cannot archive {type(value).__name__}")
+
+
+def decode_rows(data: bytes) -> List[Dict[str, Any]]:
+    rows = []
+    for values in json.loads(zlib.decompress(data)):
+        row = dict(zip(COLUMNS, values))
+        row['date'] = datetime.fromisoformat(row['date']) if row['date'] else None
+        row['region'] = Region(row['region']) if row['region'] else None
+        # Blocks written before copies were kept have no copy list.
+        copies = values[len(COLUMNS)] if len(values) > len(COLUMNS) else []
+        row['copies'] = [dict(zip(COPY_COLUMNS, copy)) for copy in copies]
+        for copy in row['copies']:
+            copy['created'] = datetime.fromisoformat(copy['created']) if copy['created'] else None
+        rows.append(row)
+    return rows
+
+
+def _news(row: Dict[str, Any]) -> NewsSchema:
+    return NewsSchema(**{column: row[column] for column in COLUMNS})
+
+
+def decode_block(data: bytes) -> List[NewsSchema]:
+    # Detached instances: they serialize like live rows but are never saved.
+    return [_news(row) for row in decode_rows(data)]
+
+
+def _block_fields(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    data, raw_size = encode_block(rows)
+    dates = [row['date'] for row in rows if row['date']]
+    ids = [row['id'] for row in rows]
+    return {
+        'first_id': min(ids),
+        'last_id': max(ids),
+        'count': len(rows),
+        'oldest': min(dates) if dates else None,
+        'newest': max(dates) if dates else None,
+        'raw_size': raw_size,
+        'data': data,
+    }
+
+
+class ColdArchive:
+    def __init__(self, block_size: int = 256, idle_seconds: float = 600, cached_blocks: int = 8):
+        self.block_size = block_size
+        self.idle_seconds = idle_seconds
+        self.cached_blocks = cached_blocks
+
+        self.index: Optional[ReverseIndex] = None
+        self.locations: Dict[int, int] = {}
+        self.blocks: "OrderedDict[int, Dict[int, NewsSchema]]" = OrderedDict()
+        self.load_lock = asyncio.Lock()
+        self.last_used = 0.0
+        # Mapped from the builder's archive snapshot in API workers.
+        self.attached = False
+        # Bumped whenever articles move in, so the snapshot publisher can tell.
+        self.version = 0
+
+        self.block_count = 0
+        self.article_count = 0
+        self.compressed_bytes = 0
+        self.raw_bytes = 0
+        self.newest: Optional[float] = None
+        self.loads = 0
+
+    async def refresh_totals(self) -> None:
+        rows = await ArchiveBlockSchema.all().values_list('count', 'raw_size', 'newest')
+        self.block_count = len(rows)
+        self.article_count = sum(count for count, _raw, _newest in rows)
+        self.raw_bytes = sum(raw for _count, raw, _newest in rows)
+        newest = [to_timestamp(date) for _count, _raw, date in rows if date]
+        self.newest = max(newest) if newest else None
+        self.compressed_bytes = 0
+        if rows:
+            conn = Tortoise.get_connection("default")
+            result = await conn.execute_query_dict("SELECT SUM(LENGTH(data)) AS size FROM archiveblockschema")
+            self.compressed_bytes = result[0]["size"] or 0
+
+    async def _check_entries(self) -> None:
+        # For blocks archived before the entries table existed. Only the
+        # process that archives writes it; API workers just read.
+        if await ArchivedNewsSchema.all().count() == self.article_count:
+            return
+        await ArchivedNewsSchema.all().delete()
+        for block_id in await ArchiveBlockSchema.all().order_by('id').values_list('id', flat=True):
+            block = await ArchiveBlockSchema.get(id=block_id)
+            await ArchivedNewsSchema.bulk_create([
+                ArchivedNewsSchema(id=row['id'], block_id=block_id, title=row['title'])
+                for row in decode_rows(block.data)
+            ])
+        logger.info(f"Archive entries rebuilt for {self.article_count} articles")
+
+    def covers(self, since: Optional[datetime], until: Optional[datetime] = None) -> bool:
+        # Whether an explicit date range can reach archived articles. Open
+        # ranges (the default browse) stay on the hot tier.
+        if not self.block_count or (since is None and until is None):
+            return False
+        return since is None or self.newest is None or to_timestamp(since) <= self.newest
+
+    async def archive_before(self, cutoff: datetime) -> int:
+        moved = 0
+        while True:
+            # One transaction per block: nothing else can write in between
+            # reading the rows and deleting them.
+            async with in_transaction() as conn:
+                rows = await (
+                    NewsSchema.filter(date__lt=cutoff).order_by('id')
+                    .limit(self.block_size).using_db(conn).values(*COLUMNS)
+                )
+                if not rows:
+                    break
+                ids = [row['id'] for row in rows]
+                copies: Dict[int, List[Dict[str, Any]]] = {}
+                for copy in await NewsCopySchema.filter(news_id__in=ids).using_db(conn).values('news_id', *COPY_COLUMNS):
+                    copies.setdefault(copy.pop('news_id'), []).append(copy)
+                for row in rows:
+                    row['copies'] = copies.get(row['id'], [])
+                fields = _block_fields(rows)
+                data = fields['data']
+                block = await ArchiveBlockSchema.create(**fields, using_db=conn)
+                await ArchivedNewsSchema.bulk_create(
+                    [ArchivedNewsSchema(id=row['id'], block_id=block.id, title=row['title']) for row in rows],
+                    using_db=conn,
+                )
+                # A queryset delete fires no post_delete signals: the stats
+                # counters and the event stream still see these articles.
+                # The copy rows go with them (the foreign key cascades), but
+                # they are in the block now.
+                await NewsSchema.filter(id__in=ids).using_db(conn).delete()
+
+            for row in rows:
+                news_index.remove_document(row['id'])
+            if self.index is not None:
+                for item in decode_block(data):
+                    self.index.add_document(item)
+                    self.locations[item.id] = block.id
+            moved += len(rows)
+
+        if moved:
+            self.version += 1
+            await self.refresh_totals()
+            logger.info(f"Archived {moved} articles older than {cutoff.date().isoformat()}")
+        return moved
+
+    async def restore(self, news_id: int) -> Optional[NewsSchema]:
+        # Moves an archived article and its copies back into the hot tables,
+        # so /news can edit or delete it like any other. Nothing is signalled
+        # as created: stats and the event stream never saw it leave.
+        async with in_transaction() as conn:
+            entry = await ArchivedNewsSchema.get_or_none(id=news_id).using_db(conn)
+            if entry is None:
+                return None
+            block = await ArchiveBlockSchema.get(id=entry.block_id).using_db(conn)
+            rows = decode_rows(block.data)
+            row = next((row for row in rows if row['id'] == news_id), None)
+            if row is None:
+                return None
+            rest = [other for other in rows if other['id'] != news_id]
+            if rest:
+                await ArchiveBlockSchema.filter(id=block.id).using_db(conn).update(**_block_fields(rest))
+            else:
+                await ArchiveBlockSchema.filter(id=block.id).using_db(conn).delete()
+            await entry.delete(using_db=conn)
+
+            # bulk_create sends no signals, but stamps the auto_now date;
+            # the original goes back in afterwards.
+            await NewsSchema.bulk_create([_news(row)], using_db=conn)
+            await NewsSchema.filter(id=news_id).using_db(conn).update(date=row['date'])
+            news = await NewsSchema.get(id=news_id).using_db(conn)
+            await NewsCopySchema.bulk_create(
+                [NewsCopySchema(news_id=news_id, **copy) for copy in row['copies']], using_db=conn,
+            )
+
+        add_news_to_index(news)
+        run_on_index_loop(self._forget, news_id, block.id)
+        logger.info(f"Restored archived article {news_id}")
+        return news
+
+    def _forget(self, news_id: int, block_id: int) -> None:
+        if self.index is not None and not self.attached:
+            self.index.remove_document(news_id)
+        self.locations.pop(news_id, None)
+        self.blocks.pop(block_id, None)
+        self.version += 1
+        try:
+            asyncio.get_running_loop().create_task(self.refresh_totals())
+        except RuntimeError:
+            pass
+
+    async def has_title(self, title: str) -> bool:
+        return await ArchivedNewsSchema.exists(title=title)
+
+    async def ensure_loaded(self) -> ReverseIndex:
+        self.last_used = time.monotonic()
+        if self.index is not None:
+            return self.index
+        async with self.load_lock:
+            if self.index is not None:
+                return self.index
+            started = time.monotonic()
+            index = ReverseIndex(news_index.analyzer)
+            locations: Dict[int, int] = {}
+            for block_id in await ArchiveBlockSchema.all().order_by('id').values_list('id', flat=True):
+                block = await ArchiveBlockSchema.get(id=block_id)
+                for item in decode_block(block.data):
+                    index.add_document(item)
+                    locations[item.id] = block_id
+                # Let requests for hot articles through between blocks.
+                await asyncio.sleep(0)
+            index.is_initialized = True
+            self.index, self.locations = index, locations
+            self.loads += 1
+            logger.info(f"Archive index loaded: {len(locations)} articles in {time.monotonic() - started:.2f}s")
+            return index
+
+    def attach(self, index: ReverseIndex) -> None:
+        self.index = index
+        self.locations = {}
+        self.attached = True
+
+    def unload_if_idle(self) -> bool:
+        if self.attached or self.index is None or time.monotonic() - self.last_used < self.idle_seconds:
+            return False
+        self.index = None
+        self.locations = {}
+        self.blocks.clear()
+        logger.info("Archive index unloaded after being idle")
+        return True
+
+    async def _block(self, block_id: int) -> Dict[int, NewsSchema]:
+        items = self.blocks.get(block_id)
+        if items is None:
+            block = await ArchiveBlockSchema.get(id=block_id)
+            items = {item.id: item for item in decode_block(block.data)}
+            self.blocks[block_id] = items
+            while len(self.blocks) > self.cached_blocks:
+                self.blocks.popitem(last=False)
+        else:
+            self.blocks.move_to_end(block_id)
+        return items
+
+    async def fetch(self, news_ids: Iterable[int]) -> Dict[int, NewsSchema]:
+        found: Dict[int, NewsSchema] = {}
+        if not self.block_count:
+            return found
+        for news_id in news_ids:
+            if news_id in self.locations:
+                block_ids = [self.locations[news_id]]
+            elif self.index is not None and not self.attached:
+                block_ids = []
+            else:
+                block_ids = await ArchivedNewsSchema.filter(id=news_id).values_list('block_id', flat=True)
+            for block_id in block_ids:
+                item = (await self._block(block_id)).get(news_id)
+                if item is not None:
+                    found[news_id] = item
+                    break
+        return found
+
+    async def search(self, query: str, limit: int) -> List[int]:
+        if not self.block_count:
+            return []
+        index = await self.ensure_loaded()
+        return [news_id for news_id, _score in index.search(query, limit)]
+
+    async def browse(self, hot: ReverseIndex, since, until, category, region, query,
+                     limit: int, offset: int) -> Tuple[List[int], int]:
+        # Both tiers are newest first; merge their first offset+limit ids.
+        cold = await self.ensure_loaded()
+        hot_ids, hot_total = hot.browse(since, until, category, region, query, offset + limit, 0)
+        cold_ids, cold_total = cold.browse(since, until, category, region, query, offset + limit, 0)
+        merged = sorted(
+            [(hot.time_index.by_id.get(news_id, 0.0), news_id) for news_id in hot_ids]
+            + [(cold.time_index.by_id.get(news_id, 0.0), news_id) for news_id in cold_ids],
+            reverse=True,
+        )
+        return [news_id for _timestamp, news_id in merged[offset:offset + limit]], hot_total + cold_total
+
+    async def run(self, after_days: float, interval: float) -> None:
+        try:
+            await self._check_entries()
+        except Exception as e:
+            logger.error(f"Checking archive entries failed: {e}")
+        while True:
+            try:
+                if after_days > 0:
+                    await self.archive_before(datetime.now(timezone.utc) - timedelta(days=after_days))
+                self.unload_if_idle()
+            except Exception as e:
+                logger.error(f"Archiving failed: {e}")
+            await asyncio.sleep(interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'blocks': self.block_count,
+            'articles': self.article_count,
+            'raw_bytes': self.raw_bytes,
+            'compressed_bytes': self.compressed_bytes,
+            'loaded': self.index is not None,
+            'attached': self.attached,
+            'loaded_articles': len(self.locations),
+            'loads': self.loads,
+            'cached_blocks': len(self.blocks),
+        }
+
+
+cold_archive = ColdArchive(
+    block_size=int(os.environ.get("ARCHIVE_BLOCK_SIZE", "256")),
+    idle_seconds=float(os.environ.get("ARCHIVE_IDLE_SECONDS", "600")),
+)
+
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_INTERVAL = float(os.environ.get("ARCHIVE_INTERVAL_SECONDS", "3600"))
@@ -26,13 +26,17 @@ from tortoise.exceptions import DoesNotExist
 from tortoise.fields.relational import ForeignKeyNullableRelation
 from tortoise.expressions import Q
 from tortoise import Tortoise
-import discord, os
+from tortoise.signals import post_delete, post_save
+import discord, os, time
 from discord.ext import commands
 from datetime import datetime, timezone
 from enum import Enum
 import difflib
 from difflib import SequenceMatcher
 from .idx import *
+from .tracing import traced, tracer
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite://db.db")
 
 
 class Region(Enum):
@@ -72,6 +76,102 @@ class ReporterSchema(models.Model):
         return f"Reporter(user_id={self.user_id}), posts={self.posts}, suspended={self.suspended})"
 
 
+class StatSchema(models.Model):
+    id    = fields.IntField(pk=True)
+    kind  = fields.CharField(max_length=20)
+    key   = fields.CharField(max_length=100)
+    count = fields.IntField(default=0)
+
+    class Meta:
+        unique_together = (("kind", "key"),)
+
+    def __str__(self) -> str:
+        return f"Stat({self.kind}:{self.key}={self.count})"
+
+
+class ArchiveBlockSchema(models.Model):
+    # A zlib-compressed JSON list of archived newsschema rows; see utils/archive.py.
+    id       = fields.IntField(pk=True)
+    first_id = fields.IntField(db_index=True)
+    last_id  = fields.IntField(db_index=True)
+    count    = fields.IntField()
+    oldest   = fields.DatetimeField(null=True)
+    newest   = fields.DatetimeField(null=True)
+    raw_size = fields.IntField()
+    data     = fields.BinaryField()
+
+    def __str__(self) -> str:
+        return f"ArchiveBlock({self.first_id}..{self.last_id}, {self.count} articles)"
+
+
+class ArchivedNewsSchema(models.Model):
+    # Which block an archived article is in, and its title, so titles stay
+    # unique across both tiers and /news can find the article again.
+    id       = fields.IntField(pk=True)
+    block_id = fields.IntField(db_index=True)
+    title    = fields.CharField(max_length=255, db_index=True)
+
+
+class UsernameCache:
+    # user id -> name for `to_dict`, so an article costs at most one REST
+    # call per user per `ttl` instead of one per serialization. Failed
+    # lookups (deleted accounts, mostly) are kept for `failure_ttl` and
+    # raised again from the cache.
+
+    def __init__(self, ttl: float = 3600, failure_ttl: float = 60, max_size: int = 10000):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.max_size = max_size
+        self.names: dict[int, tuple[str | discord.HTTPException, float]] = {}
+        self.hits = 0
+        self.fetches = 0
+        self.failures = 0
+
+    async def resolve(self, bot: commands.Bot, user_id: int) -> str:
+        cached = self.names.get(user_id)
+        now = time.monotonic()
+        if cached is not None and cached[1] > now:
+            self.hits += 1
+            if isinstance(cached[0], discord.HTTPException):
+                raise cached[0].with_traceback(None)
+            return cached[0]
+
+        if len(self.names) >= self.max_size:
+            self.names.clear()
+        user = bot.get_user(user_id)
+        if user is None:
+            self.fetches += 1
+            try:
+                with tracer.span("discord.fetch_user", user=user_id):
+                    user = await bot.fetch_user(user_id)
+            except discord.HTTPException as e:
+                self.failures += 1
+                self.names[user_id] = (e, now + self.failure_ttl)
+                raise
+        self.names[user_id] = (user.name, now + self.ttl)
+        return user.name
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            'entries': len(self.names),
+            'hits': self.hits,
+            'fetches': self.fetches,
+            'failures': self.failures,
+        }
+
+
+usernames = UsernameCache(
+    ttl=float(os.environ.get("USERNAME_CACHE_TTL", "3600")),
+    failure_ttl=float(os.environ.get("USERNAME_FAILURE_TTL", "60")),
+)
+
+
+def _select_fields(data: dict, fields: Optional[Sequence[str]]) -> dict:
+    if fields is None:
+        return data
+    return {key: data[key] for key in fields if key in data}
+
+
 class NewsSchema(models.Model):
     id            = fields.IntField(pk=True, unique=True)
     title         = fields.CharField(max_length=255, unique=True)
@@ -79,7 +179,7 @@ class NewsSchema(models.Model):
     image_url     = fields.CharField(max_length=500, unique=True)
     credit        = fields.CharField(max_length=100, null=False)
     reporter      = fields.CharField(max_length=100, null=False)
-    region        = fields.CharEnumField(Region, max_length=10, null=True)
+    region        = fields.CharEnumField(Region, max_length=20, null=True)
     category      = fields.TextField()
     date          = fields.DatetimeField(auto_now_add=False, auto_now=True)
     message_id    = fields.IntField(False, null=True)
@@ -118,25 +218,17 @@ class NewsSchema(models.Model):
         ).ratio()
         return title_ratio > threshold and desc_ratio > threshold
         
-    async def to_dict(self, bot: commands.Bot) -> dict[str, int | str | None]:
-        if not bot or not hasattr(bot, 'fetch_user') or not bot.is_ready():
-            return {
-                "id": self.id,
-                "title": self.title,
-                "description": self.description,
-                "image_url": self.image_url,
-                "credit": f"User:{self.credit}",
-                "reporter": f"User:{self.reporter}",
-                "region": self.region.value if self.region else "global",
-                "date": self.date,
-                "category": self.category
-            }
-        
+    @traced("NewsSchema.to_dict")
+    async def to_dict(self, bot: commands.Bot, fields: Optional[Sequence[str]] = None) -> dict[str, int | str | None]:
+        # `fields` limits the result to those keys; usernames are only
+        # resolved when `credit` or `reporter` is among them, and only once
+        # the bot is ready. Everything else looks the same either way.
+        resolve = bool(bot and hasattr(bot, 'fetch_user') and bot.is_ready())
+
         credit_username = f"User:{self.credit}"  
         try:
-            if self.credit:
-                credit_user = await bot.fetch_user(int(self.credit))
-                credit_username = credit_user.name
+            if resolve and self.credit and (fields is None or "credit" in fields):
+                credit_username = await usernames.resolve(bot, int(self.credit))
         except (discord.NotFound, discord.HTTPException, ValueError) as e:
             logger.error(f"Could not fetch credit user {self.credit}: {e}")
             credit_username = f"Unknown:{self.credit}"
@@ -145,11 +237,8 @@ class NewsSchema(models.Model):
 
         reporter_username = f"User:{self.reporter}"  
         try:
-            if self.reporter:
-                reporter_user = bot.get_user(int(self.reporter))
-                if reporter_user is None:
-                    reporter_user = await bot.fetch_user(int(self.reporter))
-                reporter_username = reporter_user.name
+            if resolve and self.reporter and (fields is None or "reporter" in fields):
+                reporter_username = await usernames.resolve(bot, int(self.reporter))
         except (discord.NotFound, discord.HTTPException, ValueError) as e:
             logger.error(f"Could not fetch reporter user {self.reporter}: {e}")
             reporter_username = f"Unknown:{self.reporter}"
@@ -160,15 +249,18 @@ class NewsSchema(models.Model):
         if self.date:
             try:
                 if self.date.tzinfo is None:
-                    date_utc = self.date.replace(tzinfo=discord.utils.utcnow().tzinfo)
+                    date_utc = self.date
                 else:
-                    date_utc = self.date.astimezone(discord.utils.utcnow().tzinfo)
-                formatted_date = date_utc.strftime("%Y-%m-%d %H:%M:%S UTC")
+                    date_utc = self.date.astimezone(timezone.utc)
+                formatted_date = (
+                    f"{date_utc.year:04d}-{date_utc.month:02d}-{date_utc.day:02d} "
+                    f"{date_utc.hour:02d}:{date_utc.minute:02d}:{date_utc.second:02d} UTC"
+                )
             except Exception as e:
                 logger.error(f"Error formatting date: {e}")
                 formatted_date = str(self.date)
 
-        return {
+        return _select_fields({
             "id": self.id,
             "title": self.title,
             "description": self.description,
@@ -178,7 +270,7 @@ class NewsSchema(models.Model):
             "region": self.region.value if self.region else "global",
             "date": formatted_date,
             "category": self.category
-        }
+        }, fields)
 
 
     @classmethod
@@ -211,6 +303,7 @@ class NewsSchema(models.Model):
         )
 
     @classmethod
+    @traced("NewsSchema.search_all")
     async def search_all(
         cls,
         term: str,
@@ -264,9 +357,14 @@ class NewsSchema(models.Model):
         row = await conn.execute_query_dict(f"SELECT MAX(id) AS maxid FROM {table_name}")
         max_row = row[0]
         max_id = max_row["maxid"] or 0
+        if table_name == "newsschema":
+            # Archived articles keep their ids; never hand those out again.
+            row = await conn.execute_query_dict("SELECT MAX(last_id) AS maxid FROM archiveblockschema")
+            max_id = max(max_id, row[0]["maxid"] or 0)
         await conn.execute_script(f"UPDATE sqlite_sequence SET seq = {max_id} WHERE name = '{table_name}'")
         
     @classmethod
+    @traced("NewsSchema.search")
     async def search(
         cls,
         query: str,
@@ -289,6 +387,7 @@ class NewsSchema(models.Model):
         return ordered_results[:limit]
 
     @classmethod
+    @traced("NewsSchema.search_query")
     async def search_query(
             cls,
             topic: Optional[str] = None,
@@ -310,15 +409,42 @@ class NewsSchema(models.Model):
 
     @classmethod
     async def create_unsafe(cls, **kwargs):
-        news_item = await cls.create(**kwargs)
-        add_news_to_index(news_item)
-        return news_item
+        return await cls.create(**kwargs)
+
+    @classmethod
+    @traced("NewsSchema.browse")
+    async def browse(
+            cls,
+            since: Optional[datetime] = None,
+            until: Optional[datetime] = None,
+            category: Optional[str] = None,
+            region: Optional[str] = None,
+            topic: Optional[str] = None,
+            limit: int = 20,
+            offset: int = 0,
+    ) -> tuple[Sequence["NewsSchema"], int]:
+        filters = Q()
+        if since:
+            filters &= Q(date__gte=since)
+        if until:
+            filters &= Q(date__lt=until)
+        if category:
+            filters &= Q(category__iexact=category)
+        if region:
+            try:
+                filters &= Q(region=Region(region))
+            except ValueError:
+                return [], 0
+        if topic:
+            filters &= Q(title__icontains=topic) | Q(description__icontains=topic)
 
-    async def delete(self):
-        remove_news_from_index(self.id)
-        await super().delete()
+        query = cls.filter(filters)
+        total = await query.count()
+        items = await query.order_by("-date").offset(offset).limit(limit)
+        return items, total
 
     @classmethod
+    @traced("NewsSchema.get_recent")
     async def get_recent(cls, limit: int = 7):
         try:
             recent_news = await cls.all().order_by("-date").limit(limit)
@@ -326,3 +452,36 @@ class NewsSchema(models.Model):
         except Exception as e:
             logger.error(f"Error fetching recent news: {e}")
             return []
+
+
+class NewsCopySchema(models.Model):
+    # One posted copy of an article: the original in the news channel, or a
+    # crosspost of it in a channel following that one. See utils/fanout.py.
+    id         = fields.IntField(pk=True)
+    news: fields.ForeignKeyRelation[NewsSchema] = fields.ForeignKeyField(
+        "models.NewsSchema", related_name="copies", on_delete=fields.CASCADE
+    )
+    guild_id   = fields.BigIntField(null=True)
+    channel_id = fields.BigIntField()
+    message_id = fields.BigIntField()
+    crosspost  = fields.BooleanField(default=False)
+    created    = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = (("channel_id", "message_id"),)
+
+    def __str__(self) -> str:
+        kind = "crosspost" if self.crosspost else "original"
+        return f"NewsCopy(news={self.news_id}, {self.channel_id}/{self.message_id}, {kind})"
+
+
+# Keep the search index in step with every write, including edits made
+# through `save(update_fields=...)`; unchanged fields are not re-analyzed.
+@post_save(NewsSchema)
+async def _index_saved_news(sender, instance: NewsSchema, created, using_db, update_fields) -> None:
+    add_news_to_index(instance)
+
+
+@post_delete(NewsSchema)
+async def _unindex_deleted_news(sender, instance: NewsSchema, using_db) -> None:
+    remove_news_from_index(instance.id)
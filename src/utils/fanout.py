@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Edits and deletes across every posted copy of an article. Copies are
+# recorded as they are posted (and as crossposts show up in followed channels),
+# so an update is one REST call per copy on a partial message, with no fetch
+# first. Calls run concurrently up to a limit and are retried after rate
+# limits and server errors.
+
+import asyncio
+import os
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import discord
+from tortoise.exceptions import IntegrityError
+
+from .db import NewsCopySchema, NewsSchema
+from .globals import bot, logger
+from .tracing import tracer
+
+Operation = Callable[[discord.PartialMessage], Awaitable[Any]]
+
+
+@dataclass
+class FanoutResult:
+    total: int = 0
+    done: int = 0
+    # Already deleted on Discord's side.
+    missing: int = 0
+    failed: List[str] = field(default_factory=list)
+
+    def summary(self, verb: str) -> str:
+        text = f"{verb} {self.done + self.missing} of {self.total} posted cop{'y' if self.total == 1 else 'ies'}"
+        if self.failed:
+            text += f"; failed in {', '.join(self.failed)}"
+        return text
+
+
+class FanoutEngine:
+    def __init__(self, concurrency: int = 8, max_attempts: int = 3, retry_delay: float = 1.0):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.stats: Dict[str, int] = {
+            'calls': 0,
+            'retries': 0,
+            'missing': 0,
+            'failed': 0,
+            'crossposts_recorded': 0,
+        }
+
+    def _limit(self) -> asyncio.Semaphore:
+        # Created on first use, on the bot's loop.
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self.semaphore
+
+    async def record(self, news_id: int, message: discord.Message, crosspost: bool = False) -> None:
+        guild = getattr(message, 'guild', None)
+        try:
+            await NewsCopySchema.create(
+                news_id=news_id,
+                guild_id=guild.id if guild is not None else None,
+                channel_id=message.channel.id,
+                message_id=message.id,
+                crosspost=crosspost,
+            )
+        except IntegrityError:
+            pass
+
+    async def copies(self, news: NewsSchema, default_channel_id: int) -> List[NewsCopySchema]:
+        copies = await NewsCopySchema.filter(news_id=news.id)
+        if not copies and news.message_id:
+            # Posted before copies were recorded: only the original is known.
+            copies = [NewsCopySchema(news_id=news.id, channel_id=default_channel_id,
+                                     message_id=news.message_id, crosspost=False)]
+        return copies
+
+    async def edit(self, client: discord.Client, news: NewsSchema, embed: discord.Embed,
+                   default_channel_id: int) -> FanoutResult:
+        # Crossposts follow their original on Discord's side (and can't be
+        # edited by the bot), so only originals are edited.
+        copies = [copy for copy in await self.copies(news, default_channel_id) if not copy.crosspost]
+        return await self._fan_out(client, "edit", copies, lambda message: message.edit(embed=embed))
+
+    async def delete(self, client: discord.Client, news: NewsSchema, default_channel_id: int) -> FanoutResult:
+        copies = await self.copies(news, default_channel_id)
+        return await self._fan_out(client, "delete", copies, lambda message: message.delete())
+
+    async def _fan_out(self, client: discord.Client, action: str, copies: List[NewsCopySchema],
+                       operation: Operation) -> FanoutResult:
+        result = FanoutResult(total=len(copies))
+        with tracer.span(f"fanout.{action}", copies=len(copies)):
+            outcomes = await asyncio.gather(*(self._apply(client, copy, operation) for copy in copies))
+
+        gone = []
+        for copy, outcome in zip(copies, outcomes):
+            if outcome == "done":
+                result.done += 1
+            elif outcome == "missing":
+                result.missing += 1
+                gone.append(copy)
+            else:
+                result.failed.append(f"<#{copy.channel_id}> ({outcome})")
+        self.stats['missing'] += result.missing
+        self.stats['failed'] += len(result.failed)
+
+        stored = [copy.id for copy in gone if copy.id is not None]
+        if stored:
+            await NewsCopySchema.filter(id__in=stored).delete()
+        return result
+
+    async def _apply(self, client: discord.Client, copy: NewsCopySchema, operation: Operation) -> str:
+        message = client.get_partial_messageable(copy.channel_id, guild_id=copy.guild_id) \
+            .get_partial_message(copy.message_id)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                async with self._limit():
+                    self.stats['calls'] += 1
+                    await operation(message)
+                return "done"
+            except discord.NotFound:
+                return "missing"
+            except discord.Forbidden:
+                return "forbidden"
+            except discord.RateLimited as e:
+                # Only raised past the client's max_ratelimit_timeout; shorter
+                # limits are waited out inside discord.py.
+                delay = e.retry_after
+            except discord.HTTPException as e:
+                if e.status < 500:
+                    return f"HTTP {e.status}"
+                delay = self.retry_delay * 2 ** (attempt - 1)
+
+            if attempt < self.max_attempts:
+                self.stats['retries'] += 1
+                # Sleep outside the semaphore so other copies keep going.
+                await asyncio.sleep(delay)
+        logger.error(f"Giving up on message {copy.message_id} in {copy.channel_id} after {self.max_attempts} attempts")
+        return "gave up"
+
+    async def on_message(self, message: discord.Message) -> None:
+        # Crossposts arrive in channels following the news channel, with a
+        # reference back to the original.
+        reference = message.reference
+        if not message.flags.is_crossposted or reference is None or reference.message_id is None:
+            return
+        source = await NewsCopySchema.get_or_none(
+            channel_id=reference.channel_id, message_id=reference.message_id, crosspost=False
+        )
+        if source is not None:
+            news_id = source.news_id
+        else:
+            news = await NewsSchema.filter(message_id=reference.message_id).first()
+            if news is None:
+                return
+            news_id = news.id
+        await self.record(news_id, message, crosspost=True)
+        self.stats['crossposts_recorded'] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats, concurrency=self.concurrency)
+
+
+fanout = FanoutEngine(
+    concurrency=int(os.environ.get("FANOUT_CONCURRENCY", "8")),
+    max_attempts=int(os.environ.get("FANOUT_MAX_ATTEMPTS", "3")),
+)
+bot.add_listener(fanout.on_message, "on_message")
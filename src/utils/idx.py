@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import re
-from typing import Dict, Set, List, Optional, Tuple
+from array import array
+import asyncio
+from datetime import datetime
+from typing import Callable, Dict, Set, List, Optional, Tuple
 from collections import defaultdict
 from dataclasses import dataclass
 from .globals import logger
+from .analysis import Analyzer, AnalyzerConfig
+from .timeidx import TimeIndex
+from .query import And, Not, Or, Phrase, Term, is_plain, parse_query
+from .tracing import tracer
 
 @dataclass
 class IndexEntry:
@@ -15,167 +21,448 @@ class IndexEntry:
     category_matches: int = 0
     total_score: float = 0.0
 
+# Postings are term id -> {news_id: [positions]}, positions counting every word
+# of the field so that phrases skip over stop words the same way on both sides.
+Postings = Dict[int, Dict[int, List[int]]]
+
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'description': 1.0,
+    'category': 0.5,
+    'region': 0.5,
+}
+
+# Fields searched when a term has no "field:" prefix.
+DEFAULT_FIELDS = ('title', 'description', 'category')
+
+# Bonus for a plain query that appears verbatim, best field only.
+PHRASE_BONUS = {
+    'title': 2.0,
+    'description': 1.0,
+    'category': 0.5,
+}
+
+
+@dataclass(slots=True)
+class FieldStream:
+    # A field's analyzed tokens, kept so removal never re-analyzes the text.
+    # `starts`/`ends` are each token's character offsets, for snippets.
+    term_ids: array
+    positions: array
+    starts: array
+    ends: array
+
+
 class ReverseIndex:
-    def __init__(self):
-        self.title_index: Dict[str, Set[int]] = defaultdict(set)
-        self.description_index: Dict[str, Set[int]] = defaultdict(set)
-        self.category_index: Dict[str, Set[int]] = defaultdict(set)
+    def __init__(self, analyzer: Optional[Analyzer] = None):
+        self.analyzer = analyzer or Analyzer(AnalyzerConfig.from_env())
+
+        self.term_ids: Dict[str, int] = {}
+        self.terms: List[str] = []
+
+        self.title_index: Postings = defaultdict(dict)
+        self.description_index: Postings = defaultdict(dict)
+        self.category_index: Postings = defaultdict(dict)
+        self.region_index: Postings = defaultdict(dict)
+
+        self.field_indexes: Dict[str, Postings] = {
+            'title': self.title_index,
+            'description': self.description_index,
+            'category': self.category_index,
+            'region': self.region_index,
+        }
         
         self.documents: Dict[int, Dict[str, str]] = {}
-        
-        self.stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-            'of', 'with', 'by', 'from', 'up', 'about', 'into', 'through', 'during',
-            'before', 'after', 'above', 'below', 'between', 'among', 'through',
-            'during', 'before', 'after', 'above', 'below', 'up', 'down', 'out',
-            'off', 'over', 'under', 'again', 'further', 'then', 'once', 'here',
-            'there', 'when', 'where', 'why', 'how', 'all', 'any', 'both', 'each',
-            'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not',
-            'only', 'own', 'same', 'so', 'than', 'too', 'very', 'can', 'will',
-            'just', 'should', 'now'
-        }
+        self.streams: Dict[int, Dict[str, FieldStream]] = {}
+        self.time_index = TimeIndex()
+
+        # Bumped on every change, so callers can tell when results may differ.
+        self.generation = 0
+
+        # Called with a news id after it changed, or None after a full rebuild.
+        self.listeners: List[Callable[[Optional[int]], None]] = []
         
         self.is_initialized = False
+        # Set while serving from a snapshot (utils/snapshot.py) in an API worker.
+        self.read_only = False
+        # The loop that builds the index and serves it. Nothing here is
+        # locked, so changes made on another thread (the bot's, in single
+        # mode) are handed over to this loop; see `add_news_to_index`.
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def analyzer_version(self) -> str:
+        return self.analyzer.version
     
+    def _analyze(self, text: str) -> List[Tuple[str, int]]:
+        return self.analyzer.analyze(text)
+
     def _normalize_text(self, text: str) -> List[str]:
+        return self.analyzer.terms(text)
 
-        if not text:
-            return []
-        
-        text = text.lower()
-        text = re.sub(r'[^\w\s]', ' ', text)
-        
-        words = text.split()
-        
-        filtered_words = [
-            word for word in words 
-            if len(word) > 2 and word not in self.stop_words
-        ]
-        
-        return filtered_words
+    def _term_id(self, term: str) -> int:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.term_ids[term] = term_id
+            self.terms.append(term)
+        return term_id
+
+    def _index_field(self, news_id: int, field_name: str, text: str) -> FieldStream:
+        postings = self.field_indexes[field_name]
+        stream = FieldStream(array('I'), array('I'), array('I'), array('I'))
+        for term, position, start, end in self.analyzer.analyze_spans(text):
+            term_id = self._term_id(term)
+            postings[term_id].setdefault(news_id, []).append(position)
+            stream.term_ids.append(term_id)
+            stream.positions.append(position)
+            stream.starts.append(start)
+            stream.ends.append(end)
+        return stream
+
+    def _unindex_field(self, news_id: int, field_name: str, stream: FieldStream) -> None:
+        postings = self.field_indexes[field_name]
+        for term_id in set(stream.term_ids):
+            docs = postings.get(term_id)
+            if docs is None:
+                continue
+            docs.pop(news_id, None)
+            if not docs:
+                del postings[term_id]
     
     def add_document(self, news_item) -> None:
+        if self.read_only:
+            return
         news_id = news_item.id
-        
-        self.documents[news_id] = {
+        doc = {
             'title': news_item.title,
             'description': news_item.description,
             'category': news_item.category,
             'region': news_item.region.value if news_item.region else 'global'
         }
-        
-        title_terms = self._normalize_text(news_item.title)
-        for term in title_terms:
-            self.title_index[term].add(news_id)
-        
-        desc_terms = self._normalize_text(news_item.description)
-        for term in desc_terms:
-            self.description_index[term].add(news_id)
-        
-        category_terms = self._normalize_text(news_item.category)
-        for term in category_terms:
-            self.category_index[term].add(news_id)
+
+        # Re-indexing an edited item only analyzes the fields that changed.
+        old_doc = self.documents.get(news_id)
+        streams = self.streams.setdefault(news_id, {})
+        for field_name, text in doc.items():
+            old_stream = streams.get(field_name)
+            if old_stream is not None:
+                if old_doc is not None and old_doc[field_name] == text:
+                    continue
+                self._unindex_field(news_id, field_name, old_stream)
+            streams[field_name] = self._index_field(news_id, field_name, text)
+
+        self.documents[news_id] = doc
+        self.time_index.add(news_id, getattr(news_item, 'date', None))
+        self.generation += 1
+        self._notify(news_id)
     
     def remove_document(self, news_id: int) -> None:
-        if news_id not in self.documents:
+        if self.read_only or news_id not in self.documents:
             return
-        
-        doc = self.documents[news_id]
-        
-        title_terms = self._normalize_text(doc['title'])
-        for term in title_terms:
-            self.title_index[term].discard(news_id)
-            if not self.title_index[term]:
-                del self.title_index[term]
-        
-        desc_terms = self._normalize_text(doc['description'])
-        for term in desc_terms:
-            self.description_index[term].discard(news_id)
-            if not self.description_index[term]:
-                del self.description_index[term]
-        
-        category_terms = self._normalize_text(doc['category'])
-        for term in category_terms:
-            self.category_index[term].discard(news_id)
-            if not self.category_index[term]:
-                del self.category_index[term]
+
+        for field_name, stream in self.streams.pop(news_id, {}).items():
+            self._unindex_field(news_id, field_name, stream)
         
         del self.documents[news_id]
-    
+        self.time_index.remove(news_id)
+        self.generation += 1
+        self._notify(news_id)
+
+    def set_analyzer(self, analyzer: Analyzer) -> bool:
+        if analyzer.version == self.analyzer.version:
+            return False
+
+        logger.info(f"Analyzer changed ({self.analyzer.version} -> {analyzer.version}), reindexing")
+        self.analyzer = analyzer
+        self.term_ids.clear()
+        self.terms.clear()
+        for postings in self.field_indexes.values():
+            postings.clear()
+        self.streams.clear()
+
+        documents, self.documents = self.documents, {}
+        for news_id, doc in documents.items():
+            self.streams[news_id] = {
+                field_name: self._index_field(news_id, field_name, text)
+                for field_name, text in doc.items()
+            }
+            self.documents[news_id] = doc
+        self.generation += 1
+        self._notify(None)
+        return True
+
+    def attach_snapshot(self, snapshot) -> None:
+        # Serve queries from the snapshot's views; nothing is copied.
+        self.analyzer = snapshot.analyzer
+        self.term_ids = snapshot.term_ids
+        self.terms = snapshot.terms
+        self.field_indexes = snapshot.field_indexes
+        self.title_index = snapshot.field_indexes['title']
+        self.description_index = snapshot.field_indexes['description']
+        self.category_index = snapshot.field_indexes['category']
+        self.region_index = snapshot.field_indexes['region']
+        self.documents = snapshot.documents
+        self.streams = snapshot.streams
+        self.time_index = snapshot.time_index
+        self.generation = snapshot.generation
+        self.read_only = True
+        self.is_initialized = True
+
+    def _notify(self, news_id: Optional[int]) -> None:
+        # Nothing to tell while the initial build is still running.
+        if not self.is_initialized:
+            return
+        for listener in self.listeners:
+            try:
+                listener(news_id)
+            except Exception as e:
+                logger.error(f"Index listener failed for {news_id}: {e}")
+
+    def _postings(self, field_name: str, term: str) -> Dict[int, List[int]]:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return {}
+        return self.field_indexes[field_name].get(term_id, {})
+
+    def _all_ids(self) -> Set[int]:
+        return set(self.documents)
+
+    def _fields(self, node) -> Tuple[str, ...]:
+        return (node.field,) if node.field else DEFAULT_FIELDS
+
+    def _estimate(self, node) -> int:
+        # Rough result size, used to evaluate the most selective AND branch first.
+        if isinstance(node, Term):
+            terms = self._normalize_text(node.text)
+            return sum(len(self._postings(f, t)) for f in self._fields(node) for t in terms)
+        if isinstance(node, Phrase):
+            terms = self._normalize_text(node.text)
+            if not terms:
+                return 0
+            return min(sum(len(self._postings(f, t)) for f in self._fields(node)) for t in terms)
+        if isinstance(node, And):
+            return min((self._estimate(child) for child in node.children), default=0)
+        if isinstance(node, Or):
+            return sum(self._estimate(child) for child in node.children)
+        return len(self.documents)
+
+    def _match_term(self, node: Term, candidates: Optional[Set[int]]) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for term in self._normalize_text(node.text):
+            for field_name in self._fields(node):
+                docs = self._postings(field_name, term)
+                if candidates is not None and len(candidates) < len(docs):
+                    hits = [news_id for news_id in candidates if news_id in docs]
+                else:
+                    hits = docs if candidates is None else [news_id for news_id in docs if news_id in candidates]
+                weight = FIELD_WEIGHTS[field_name]
+                for news_id in hits:
+                    scores[news_id] = scores.get(news_id, 0.0) + weight
+        return scores
+
+    def _phrase_hits(self, field_name: str, terms: List[Tuple[str, int]],
+                     candidates: Optional[Set[int]]) -> Set[int]:
+        postings = [self._postings(field_name, term) for term, _offset in terms]
+        if not all(postings):
+            return set()
+
+        order = sorted(range(len(terms)), key=lambda i: len(postings[i]))
+        docs = set(postings[order[0]])
+        if candidates is not None:
+            docs &= candidates
+        for i in order[1:]:
+            if not docs:
+                return docs
+            docs.intersection_update(postings[i])
+
+        base = terms[0][1]
+        hits = set()
+        for news_id in docs:
+            rest = [
+                (set(postings[i][news_id]), terms[i][1] - base)
+                for i in range(1, len(terms))
+            ]
+            for start in postings[0][news_id]:
+                if all(start + offset in positions for positions, offset in rest):
+                    hits.add(news_id)
+                    break
+        return hits
+
+    def _match_phrase(self, node: Phrase, candidates: Optional[Set[int]]) -> Dict[int, float]:
+        terms = self._analyze(node.text)
+        if len(terms) == 1:
+            return self._match_term(Term(terms[0][0], node.field), candidates)
+
+        scores: Dict[int, float] = {}
+        if not terms:
+            return scores
+        for field_name in self._fields(node):
+            weight = FIELD_WEIGHTS[field_name] * len(terms)
+            for news_id in self._phrase_hits(field_name, terms, candidates):
+                scores[news_id] = scores.get(news_id, 0.0) + weight
+        return scores
+
+    def _match(self, node, candidates: Optional[Set[int]] = None) -> Dict[int, float]:
+        if isinstance(node, Term):
+            return self._match_term(node, candidates)
+
+        if isinstance(node, Phrase):
+            return self._match_phrase(node, candidates)
+
+        if isinstance(node, Not):
+            universe = self._all_ids() if candidates is None else candidates
+            excluded = self._match(node.child, universe)
+            return {news_id: 0.0 for news_id in universe if news_id not in excluded}
+
+        if isinstance(node, Or):
+            scores: Dict[int, float] = {}
+            for child in node.children:
+                for news_id, score in self._match(child, candidates).items():
+                    scores[news_id] = scores.get(news_id, 0.0) + score
+            return scores
+
+        # AND: positive branches in order of selectivity, each one only looking
+        # at what survived the previous, then exclusions on the final set.
+        positives = sorted(
+            (child for child in node.children if not isinstance(child, Not)),
+            key=self._estimate
+        )
+        negatives = [child for child in node.children if isinstance(child, Not)]
+
+        scores = None
+        for child in positives:
+            child_scores = self._match(child, candidates)
+            if scores is None:
+                scores = child_scores
+            else:
+                scores = {
+                    news_id: score + child_scores[news_id]
+                    for news_id, score in scores.items() if news_id in child_scores
+                }
+            if not scores:
+                return {}
+            candidates = set(scores)
+
+        for child in negatives:
+            survivors = self._match(child, candidates)
+            if scores is None:
+                scores = survivors
+            else:
+                scores = {news_id: score for news_id, score in scores.items() if news_id in survivors}
+            if not scores:
+                return {}
+            candidates = set(scores)
+
+        return scores or {}
+
     def search(self, query: str, limit: int = 10) -> List[Tuple[int, float]]:
         if not query.strip():
             return []
-        
-        query_terms = self._normalize_text(query)
-        if not query_terms:
+
+        node = parse_query(query)
+        if node is None:
             return []
-        
-        matches: Dict[int, IndexEntry] = {}
 
-        for term in query_terms:
-            for news_id in self.title_index.get(term, set()):
-                if news_id not in matches:
-                    matches[news_id] = IndexEntry(news_id)
-                matches[news_id].title_matches += 1
-            
-            for news_id in self.description_index.get(term, set()):
-                if news_id not in matches:
-                    matches[news_id] = IndexEntry(news_id)
-                matches[news_id].description_matches += 1
-            
-            for news_id in self.category_index.get(term, set()):
-                if news_id not in matches:
-                    matches[news_id] = IndexEntry(news_id)
-                matches[news_id].category_matches += 1
-        
-        for entry in matches.values():
-            entry.total_score = (
-                entry.title_matches * 3.0 +
-                entry.description_matches * 1.0 +
-                entry.category_matches * 0.5
-            )
-            
-            if news_id in self.documents:
-                doc = self.documents[news_id]
-                query_lower = query.lower()
-                
-                if query_lower in doc['title'].lower():
-                    entry.total_score += 2.0
-                elif query_lower in doc['description'].lower():
-                    entry.total_score += 1.0
-                elif query_lower in doc['category'].lower():
-                    entry.total_score += 0.5
+        scores = self._match(node)
+        if not scores:
+            return []
+
+        if is_plain(node):
+            terms = self._analyze(query)
+            if len(terms) > 1:
+                matched = set(scores)
+                for field_name, bonus in PHRASE_BONUS.items():
+                    hits = self._phrase_hits(field_name, terms, matched)
+                    for news_id in hits:
+                        scores[news_id] += bonus
+                    matched -= hits
         
         sorted_matches = sorted(
-            matches.values(),
-            key=lambda x: x.total_score,
+            scores.items(),
+            key=lambda x: x[1],
             reverse=True
         )
         
-        return [(entry.news_id, entry.total_score) for entry in sorted_matches[:limit]]
+        return sorted_matches[:limit]
     
+    def browse(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        category: Optional[str] = None,
+        region: Optional[str] = None,
+        query: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[List[int], int]:
+        # Newest-first page of ids in [since, until) matching the facets and
+        # query, plus the total number of matches.
+        matches: Optional[Set[int]] = None
+        if query and query.strip():
+            node = parse_query(query)
+            matches = set(self._match(node)) if node is not None else set()
+            if not matches:
+                return [], 0
+
+        category = category.casefold() if category else None
+        region = region.casefold() if region else None
+
+        page: List[int] = []
+        total = 0
+        for news_id in self.time_index.iter_range(since, until):
+            if matches is not None and news_id not in matches:
+                continue
+            doc = self.documents.get(news_id)
+            if doc is None:
+                continue
+            if category is not None and doc['category'].casefold() != category:
+                continue
+            if region is not None and doc['region'].casefold() != region:
+                continue
+            if offset <= total < offset + limit:
+                page.append(news_id)
+            total += 1
+        return page, total
+
+    def latest(self, limit: int) -> List[int]:
+        return self.time_index.latest(limit)
+
     async def initialize_from_database(self, NewsSchema) -> None:
         logger.info("Initializing index...")
+        self.loop = asyncio.get_running_loop()
         
         try:
+            # The module-level index is created before .env is loaded.
+            self.set_analyzer(Analyzer(AnalyzerConfig.from_env()))
+
             all_news = await NewsSchema.all()
 
-            for news_item in all_news:
+            for i, news_item in enumerate(all_news):
                 self.add_document(news_item)
+                if i % 500 == 499:
+                    # Built in the background; let requests through meanwhile.
+                    await asyncio.sleep(0)
             
             self.is_initialized = True
+            self.generation += 1
+            self._notify(None)
             logger.info(f"Index initialized with {len(self.documents)} documents")
             
         except Exception as e:
             logger.error(f"Failed to initialize index: {e}")
             raise
     
-    def get_stats(self) -> Dict[str, int]:
+    def get_stats(self) -> Dict[str, int | str]:
         return {
             'total_documents': len(self.documents),
+            'analyzer_version': self.analyzer.version,
+            'generation': self.generation,
             'title_terms': len(self.title_index),
             'description_terms': len(self.description_index),
             'category_terms': len(self.category_index),
+            'region_terms': len(self.region_index),
+            'vocabulary': len(self.terms),
             'total_terms': len(self.title_index) + len(self.description_index) + len(self.category_index)
         }
 
@@ -184,11 +471,22 @@ news_index = ReverseIndex()
 async def initialize_idx(NewsSchema):
     await news_index.initialize_from_database(NewsSchema)
 
+def run_on_index_loop(func, *args) -> None:
+    loop = news_index.loop
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if loop is None or loop is running or loop.is_closed():
+        func(*args)
+    else:
+        loop.call_soon_threadsafe(func, *args)
+
 def add_news_to_index(news_item):
-    news_index.add_document(news_item)
+    run_on_index_loop(news_index.add_document, news_item)
 
 def remove_news_from_index(news_id: int):
-    news_index.remove_document(news_id)
+    run_on_index_loop(news_index.remove_document, news_id)
 
 async def search_news(query: str, limit: int = 10) -> List[int]:
 
@@ -196,5 +494,8 @@ async def search_news(query: str, limit: int = 10) -> List[int]:
         logger.warning("Search index not initialized, falling back to database search")
         return []
     
-    results = news_index.search(query, limit)
+    with tracer.span("index.search", query=query) as span:
+        results = news_index.search(query, limit)
+        if span is not None:
+            span.set(hits=len(results))
     return [news_id for news_id, score in results]
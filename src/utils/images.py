@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Image URL checks. One ranged GET per URL reads just enough of the file for
+# its type and dimensions (HEAD when the host refuses ranged GETs); results
+# are cached per URL with a TTL, and concurrent checks of the same URL share
+# one request. Each event loop (the bot's, the API's) gets its own pooled
+# aiohttp session.
+#
+# Reporters choose the URLs and the API checks them on request, so only
+# public addresses are ever contacted: names are resolved through
+# PublicResolver, literal addresses are checked before connecting, and
+# redirects are followed here so every hop gets the same checks.
+
+import asyncio
+import ipaddress
+import os
+import socket
+import struct
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from aiohttp.abc import AbstractResolver, ResolveResult
+from yarl import URL
+
+from .singleflight import SingleFlight
+from .tracing import tracer
+
+# Enough for the dimensions of any PNG, GIF or WebP, and of JPEGs with
+# reasonably sized EXIF blocks in front of the frame header.
+HEADER_BYTES = 64 * 1024
+
+IMAGE_CHECK = os.environ.get("IMAGE_CHECK", "1") == "1"
+IMAGE_CHECK_TIMEOUT = float(os.environ.get("IMAGE_CHECK_TIMEOUT_SECONDS", "3"))
+IMAGE_CACHE_TTL = float(os.environ.get("IMAGE_CACHE_TTL_SECONDS", "3600"))
+
+# Hosts that don't do ranged GETs say so with one of these.
+_NO_RANGE_STATUSES = (405, 416, 501)
+
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+
+# JPEG start-of-frame markers (not DHT, JPG or DAC, which share the range).
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data.startswith(b"\xff\xd8"):
+        return "jpeg"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker.
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            # Markers without a length.
+            i += 2
+            continue
+        if marker in _JPEG_SOF:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+
+def image_size(data: bytes) -> Optional[Tuple[str, int, int]]:
+    # (format, width, height) from the start of a file, or None if it isn't a
+    # known format or more bytes are needed.
+    kind = sniff_format(data)
+    size = None
+    if kind == "png" and len(data) >= 24 and data[12:16] == b"IHDR":
+        size = struct.unpack(">II", data[16:24])
+    elif kind == "gif" and len(data) >= 10:
+        size = struct.unpack("<HH", data[6:10])
+    elif kind == "jpeg":
+        size = _jpeg_size(data)
+    elif kind == "webp" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 " and data[23:26] == b"\x9d\x01\x2a":
+            width, height = struct.unpack("<HH", data[26:30])
+            size = (width & 0x3FFF, height & 0x3FFF)
+        elif chunk == b"VP8L" and data[20] == 0x2F:
+            bits = struct.unpack("<I", data[21:25])[0]
+            size = ((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+        elif chunk == b"VP8X":
+            size = (int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1)
+    if size is None:
+        return None
+    return kind, size[0], size[1]
+
+
+class AddressRefused(Exception):
+    pass
+
+
+def is_public_address(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host.split("%", 1)[0])
+    except ValueError:
+        return False
+    if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def _is_ip_literal(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.split("%", 1)[0])
+    except ValueError:
+        return False
+    return True
+
+
+class PublicResolver(AbstractResolver):
+    # Drops private, loopback, link-local and other non-global addresses, so
+    # a name can't point the check at the host's own network.
+
+    def __init__(self):
+        self.resolver = aiohttp.DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET) -> List[ResolveResult]:
+        hosts = await self.resolver.resolve(host, port, family)
+        public = [entry for entry in hosts if is_public_address(entry["host"])]
+        if not public:
+            raise AddressRefused(f"{host} is not a public address")
+        return public
+
+    async def close(self) -> None:
+        await self.resolver.close()
+
+
+@dataclass
+class ImageInfo:
+    url: str
+    status: Optional[int] = None
+    content_type: Optional[str] = None
+    size: Optional[int] = None
+    format: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    # Set when the host couldn't be asked at all (timeout, DNS, refused).
+    error: Optional[str] = None
+    # Set when the URL is somewhere the check won't go: not http(s), or not
+    # a public address. Broken, like an answer that isn't an image.
+    refused: Optional[str] = None
+    checked: float = 0.0
+
+    @property
+    def is_image(self) -> bool:
+        return self.format is not None or (self.content_type or "").startswith("image/")
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status is not None and self.status < 400 and self.is_image
+
+    @property
+    def broken(self) -> bool:
+        # The host answered, and not with an image. Unreachable hosts are
+        # reported but not treated as broken; they may be back in a minute.
+        return self.error is None and not self.ok
+
+    def problem(self) -> Optional[str]:
+        if self.error is not None:
+            return self.error
+        if self.refused is not None:
+            return self.refused
+        if self.status is None:
+            return "not checked"
+        if self.status is not None and self.status >= 400:
+            return f"HTTP {self.status}"
+        if not self.is_image:
+            return f"not an image ({self.content_type or 'unknown type'})"
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'ok': self.ok,
+            'status': self.status,
+            'content_type': self.content_type,
+            'size': self.size,
+            'format': self.format,
+            'width': self.width,
+            'height': self.height,
+            'error': self.problem(),
+        }
+
+
+def _total_size(response: aiohttp.ClientResponse) -> Optional[int]:
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+class ImageMetadataService:
+    def __init__(self, timeout: float = 3.0, ttl: float = 3600.0, failure_ttl: float = 60.0,
+                 max_entries: int = 4096, concurrency: int = 16, enabled: bool = True,
+                 session_factory: Optional[Callable[[], aiohttp.ClientSession]] = None,
+                 allow_private: bool = False):
+        self.timeout = timeout
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.max_entries = max_entries
+        self.concurrency = concurrency
+        # Off, commands post without checking and API responses leave out
+        # image metadata.
+        self.enabled = enabled
+        # Swapped out in tests to point at a local server or a stand-in.
+        self.session_factory = session_factory or self._new_session
+        # Only for tests against a local server.
+        self.allow_private = allow_private
+        self.sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self.cache: "OrderedDict[str, ImageInfo]" = OrderedDict()
+        self.flight = SingleFlight()
+        self.prefetching: set = set()
+        # Bumped whenever cached metadata changes, for ETags over it.
+        self.version = 0
+        self.stats: Dict[str, int] = {
+            'hits': 0,
+            'misses': 0,
+            'requests': 0,
+            'head_fallbacks': 0,
+            'broken': 0,
+            'refused': 0,
+            'unreachable': 0,
+            'bytes_read': 0,
+        }
+
+    def _new_session(self) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.concurrency, ttl_dns_cache=300,
+                resolver=None if self.allow_private else PublicResolver(),
+            ),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": "CNN-Bot image check"},
+        )
+
+    def _session(self) -> aiohttp.ClientSession:
+        # aiohttp sessions belong to the loop they were created on.
+        loop = asyncio.get_running_loop()
+        session = self.sessions.get(loop)
+        if session is None or session.closed:
+            session = self.sessions[loop] = self.session_factory()
+        return session
+
+    def cached(self, url: str) -> Optional[ImageInfo]:
+        info = self.cache.get(url)
+        if info is None:
+            return None
+        ttl = self.ttl if info.ok else self.failure_ttl
+        if time.monotonic() - info.checked > ttl:
+            del self.cache[url]
+            self.version += 1
+            return None
+        self.cache.move_to_end(url)
+        return info
+
+    def _store(self, info: ImageInfo) -> None:
+        self.version += 1
+        self.cache[info.url] = info
+        self.cache.move_to_end(info.url)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    async def probe(self, url: str) -> ImageInfo:
+        info = self.cached(url)
+        if info is not None:
+            self.stats['hits'] += 1
+            return info
+        self.stats['misses'] += 1
+        loop = asyncio.get_running_loop()
+        return await self.flight.do((id(loop), url), lambda: self._probe(url))
+
+    async def probe_many(self, urls: Iterable[str]) -> Dict[str, ImageInfo]:
+        urls = list(dict.fromkeys(urls))
+        results = await asyncio.gather(*(self.probe(url) for url in urls))
+        return dict(zip(urls, results))
+
+    def prefetch(self, urls: Iterable[str]) -> None:
+        # Checks uncached URLs in the background for whoever asks next.
+        missing = [url for url in urls if url and self.cached(url) is None and url not in self.prefetching]
+        if not missing:
+            return
+        self.prefetching.update(missing)
+        task = asyncio.ensure_future(self.probe_many(missing))
+        task.add_done_callback(lambda _t: self.prefetching.difference_update(missing))
+
+    async def _probe(self, url: str) -> ImageInfo:
+        with tracer.span("image.probe", url=url) as span:
+            info = await self._fetch(url)
+            info.checked = time.monotonic()
+            if span is not None:
+                span.set(status=info.status, ok=info.ok)
+        if info.error is not None:
+            self.stats['unreachable'] += 1
+        elif info.refused is not None:
+            self.stats['refused'] += 1
+        elif not info.ok:
+            self.stats['broken'] += 1
+        self._store(info)
+        return info
+
+    def _check_url(self, url: URL) -> None:
+        if url.scheme not in ("http", "https") or not url.host:
+            # Discord won't embed it either.
+            raise AddressRefused("not an http(s) URL")
+        if not self.allow_private and _is_ip_literal(url.host) and not is_public_address(url.host):
+            # Names are checked by PublicResolver; literals never reach it.
+            raise AddressRefused(f"{url.host} is not a public address")
+
+    async def _request(self, session: aiohttp.ClientSession, method: str, url: str,
+                       **kwargs) -> aiohttp.ClientResponse:
+        # Redirects are followed here, so each hop is checked like the first.
+        target = URL(url)
+        for _ in range(MAX_REDIRECTS + 1):
+            self._check_url(target)
+            response = await session.request(method, target, allow_redirects=False, **kwargs)
+            location = response.headers.get("Location")
+            if response.status not in _REDIRECT_STATUSES or not location:
+                return response
+            response.release()
+            target = target.join(URL(location))
+        raise AddressRefused(f"more than {MAX_REDIRECTS} redirects")
+
+    async def _fetch(self, url: str) -> ImageInfo:
+        info = ImageInfo(url=url)
+        session = self._session()
+        try:
+            self.stats['requests'] += 1
+            response = await self._request(session, "GET", url, headers={"Range": f"bytes=0-{HEADER_BYTES - 1}"})
+            async with response:
+                info.status = response.status
+                info.content_type = response.content_type
+                info.size = _total_size(response)
+                if response.status < 400:
+                    await self._read_header(response, info)
+            if info.status in _NO_RANGE_STATUSES:
+                self.stats['head_fallbacks'] += 1
+                async with await self._request(session, "HEAD", url) as response:
+                    info.status = response.status
+                    info.content_type = response.content_type
+                    info.size = _total_size(response)
+        except AddressRefused as e:
+            info = ImageInfo(url=url, refused=str(e))
+        except aiohttp.ClientConnectorError as e:
+            if isinstance(e.__cause__, AddressRefused):
+                info = ImageInfo(url=url, refused=str(e.__cause__))
+            else:
+                info.error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        except asyncio.TimeoutError:
+            info.error = f"timed out after {self.timeout:g}s"
+        except (aiohttp.ClientError, ValueError) as e:
+            info.error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        return info
+
+    async def _read_header(self, response: aiohttp.ClientResponse, info: ImageInfo) -> None:
+        # Stops as soon as the dimensions are in; a PNG needs 24 bytes.
+        data = b""
+        while len(data) < HEADER_BYTES:
+            chunk = await response.content.read(HEADER_BYTES - len(data))
+            if not chunk:
+                break
+            data += chunk
+            found = image_size(data)
+            if found is not None:
+                info.format, info.width, info.height = found
+                break
+        if info.format is None:
+            # Known format but dimensions past HEADER_BYTES, or not an image.
+            info.format = sniff_format(data)
+        self.stats['bytes_read'] += len(data)
+
+    async def close(self) -> None:
+        loop = asyncio.get_running_loop()
+        session = self.sessions.pop(loop, None)
+        if session is not None:
+            await session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return dict(
+            self.stats,
+            enabled=self.enabled,
+            entries=len(self.cache),
+            sessions=len(self.sessions),
+            hit_rate=round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+            flight=self.flight.get_stats(),
+        )
+
+
+image_metadata = ImageMetadataService(
+    timeout=IMAGE_CHECK_TIMEOUT,
+    ttl=IMAGE_CACHE_TTL,
+    max_entries=int(os.environ.get("IMAGE_CACHE_SIZE", "4096")),
+    concurrency=int(os.environ.get("IMAGE_CHECK_CONCURRENCY", "16")),
+    enabled=IMAGE_CHECK,
+)
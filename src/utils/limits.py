@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Admission control for the API: a token bucket per client, a global cap on
+# concurrent expensive requests, and load shedding when the wait for a slot
+# gets too long.
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Sequence, Tuple
+
+from .serialize import dumps
+
+admission_stats = {
+    'admitted': 0,
+    'rate_limited': 0,
+    'shed_queue_full': 0,
+    'shed_wait_timeout': 0,
+    'skipped_queue': 0,
+    'expensive_in_flight': 0,
+    'expensive_waiting': 0,
+    'max_queue_wait_ms': 0.0,
+}
+
+
+@dataclass
+class TokenBucket:
+    rate: float
+    burst: float
+    tokens: float = field(default=-1.0)
+    updated: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self):
+        if self.tokens < 0:
+            self.tokens = self.burst
+
+    def take(self, now: float, cost: float = 1.0) -> Tuple[bool, float]:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        return False, (cost - self.tokens) / self.rate
+
+
+class ClientBuckets:
+    def __init__(self, rate: float, burst: float, max_clients: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def take(self, client: str) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst, updated=now)
+            self.buckets[client] = bucket
+            # A client gone long enough is back to a full bucket anyway.
+            while len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(client)
+        return bucket.take(now)
+
+
+def _client_key(scope, trust_proxy: bool) -> str:
+    if trust_proxy:
+        for key, value in scope.get("headers", ()):
+            if key == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+async def _reject(send, status: int, retry_after: float) -> None:
+    body = dumps({"error": status})
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    def __init__(
+        self,
+        app,
+        rate: float,
+        burst: float,
+        max_concurrent: int,
+        max_waiting: int,
+        max_queue_wait: float,
+        expensive_prefixes: Sequence[str],
+        expensive_paths: Sequence[str] = (),
+        exempt_prefixes: Sequence[str] = (),
+        trust_proxy: bool = False,
+        skip_queue: Optional[Callable[[dict], bool]] = None,
+    ):
+        self.app = app
+        self.buckets = ClientBuckets(rate, burst)
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.max_queue_wait = max_queue_wait
+        self.expensive_prefixes = tuple(expensive_prefixes)
+        # Exact paths, for routes whose path is a prefix of cheap ones too.
+        self.expensive_paths = frozenset(expensive_paths)
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        self.trust_proxy = trust_proxy
+        # For expensive requests that will be answered without the route
+        # running, such as revalidations that end as a 304.
+        self.skip_queue = skip_queue
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        allowed, retry_after = self.buckets.take(_client_key(scope, self.trust_proxy))
+        if not allowed:
+            admission_stats['rate_limited'] += 1
+            await _reject(send, 429, retry_after)
+            return
+
+        if not (scope["path"].startswith(self.expensive_prefixes) or scope["path"] in self.expensive_paths):
+            admission_stats['admitted'] += 1
+            await self.app(scope, receive, send)
+            return
+
+        if self.skip_queue is not None and self.skip_queue(scope):
+            admission_stats['admitted'] += 1
+            admission_stats['skipped_queue'] += 1
+            await self.app(scope, receive, send)
+            return
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+
+        pending = admission_stats['expensive_in_flight'] + admission_stats['expensive_waiting']
+        if pending >= self.max_concurrent + self.max_waiting:
+            admission_stats['shed_queue_full'] += 1
+            await _reject(send, 503, self.max_queue_wait)
+            return
+
+        started = time.monotonic()
+        admission_stats['expensive_waiting'] += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.max_queue_wait)
+        except asyncio.TimeoutError:
+            admission_stats['shed_wait_timeout'] += 1
+            await _reject(send, 503, self.max_queue_wait)
+            return
+        finally:
+            admission_stats['expensive_waiting'] -= 1
+
+        waited_ms = (time.monotonic() - started) * 1000
+        admission_stats['max_queue_wait_ms'] = max(admission_stats['max_queue_wait_ms'], round(waited_ms, 2))
+        admission_stats['admitted'] += 1
+        admission_stats['expensive_in_flight'] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_stats['expensive_in_flight'] -= 1
+            self._slots.release()
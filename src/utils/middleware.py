@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# HTTP caching for the polling routes: ETags from the data generation with
+# If-None-Match -> 304 (answered before the route runs), Cache-Control per
+# route, and gzip/brotli compression of larger bodies.
+
+import gzip
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Changes on restart, since the data generation counter starts over. API
+# workers get theirs from the bot process so that their ETags agree.
+BOOT_ID = os.environ.get("API_BOOT_ID") or f"{int(time.time() * 1000):x}"
+
+ENCODING_SUFFIXES = ("-br", "-gzip")
+
+http_stats = {
+    'not_modified': 0,
+    'compressed': 0,
+    'bytes_saved': 0,
+}
+
+
+@dataclass
+class CachePolicy:
+    prefix: str
+    cache_control: str
+    etag: bool = True
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _strip_etag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)]
+    return tag
+
+
+class EntityTags:
+    # Works out a request's ETag and whether the client already holds it.
+    # Shared by ConditionalMiddleware and by admission, which lets requests
+    # that will end as a 304 skip its queue.
+    def __init__(self, policies: Sequence[CachePolicy], version: Callable[[dict], Any]):
+        # `version` gets the request scope, for content that only some
+        # requests include.
+        self.policies = list(policies)
+        self.version = version
+
+    def policy(self, scope) -> Optional[CachePolicy]:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return None
+        for policy in self.policies:
+            if scope["path"].startswith(policy.prefix):
+                return policy
+        return None
+
+    def etag(self, scope) -> str:
+        digest = hashlib.sha1(repr((
+            BOOT_ID,
+            self.version(scope),
+            scope["path"],
+            scope.get("query_string", b""),
+        )).encode()).hexdigest()
+        return digest[:20]
+
+    def match(self, scope, etag: str) -> Optional[str]:
+        # The client's tag that matches, if any.
+        if_none_match = _header(scope, b"if-none-match")
+        if not if_none_match:
+            return None
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return next((tag for tag in candidates if tag == "*" or _strip_etag(tag) == etag), None)
+
+    def not_modified(self, scope) -> bool:
+        policy = self.policy(scope)
+        return policy is not None and policy.etag and self.match(scope, self.etag(scope)) is not None
+
+
+class ConditionalMiddleware:
+    def __init__(self, app, tags: EntityTags):
+        self.app = app
+        self.tags = tags
+
+    async def __call__(self, scope, receive, send):
+        policy = self.tags.policy(scope)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        etag = self.tags.etag(scope) if policy.etag else None
+        cache_headers = [(b"cache-control", policy.cache_control.encode())]
+
+        if etag is not None:
+            matched = self.tags.match(scope, etag)
+            if matched is not None:
+                http_stats['not_modified'] += 1
+                # Echo the client's tag, which may carry an encoding suffix.
+                echo = f'"{etag}"' if matched == "*" else matched
+                await send({
+                    "type": "http.response.start",
+                    "status": 304,
+                    "headers": cache_headers + [(b"etag", echo.encode())],
+                })
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = [
+                    (key, value) for key, value in message.get("headers", [])
+                    if key not in (b"cache-control", b"etag")
+                ]
+                headers.extend(cache_headers)
+                if etag is not None:
+                    headers.append((b"etag", f'"{etag}"'.encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+def _accepted_encodings(header: Optional[str]) -> List[Tuple[str, float]]:
+    accepted = []
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name and quality > 0:
+            accepted.append((name.strip().lower(), quality))
+    return accepted
+
+
+def choose_encoding(header: Optional[str]) -> Optional[str]:
+    accepted = dict(_accepted_encodings(header))
+    wildcard = accepted.get("*", 0.0)
+    options = []
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        options.append((accepted.get("br", wildcard), 1, "br"))
+    if accepted.get("gzip", wildcard) > 0:
+        options.append((accepted.get("gzip", wildcard), 0, "gzip"))
+    if not options:
+        return None
+    return max(options)[2]
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(_header(scope, b"accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def buffered_send(message):
+            nonlocal start_message, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                content_type = headers.get(b"content-type", b"")
+                if (
+                    message["status"] in (204, 304)
+                    or b"content-encoding" in headers
+                    or content_type.startswith(b"text/event-stream")
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            headers = [
+                (key, value) for key, value in start_message.get("headers", [])
+                if key != b"content-length"
+            ]
+            if len(body) >= self.minimum_size:
+                compressed = compress(body, encoding)
+                http_stats['compressed'] += 1
+                http_stats['bytes_saved'] += len(body) - len(compressed)
+                body = compressed
+                headers = [
+                    (key, self._suffix_etag(value, encoding) if key == b"etag" else value)
+                    for key, value in headers
+                ]
+                headers.append((b"content-encoding", encoding.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+            headers.append((b"content-length", str(len(body)).encode()))
+
+            await send(dict(start_message, headers=headers))
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, buffered_send)
+
+    @staticmethod
+    def _suffix_etag(value: bytes, encoding: str) -> bytes:
+        # A strong ETag names one exact representation.
+        tag = value.decode("latin-1")
+        if tag.endswith('"'):
+            tag = f'{tag[:-1]}-{encoding}"'
+        return tag.encode("latin-1")
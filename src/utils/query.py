@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Small query language for the search endpoints:
+#
+#   war AND "crusalis city"       both must match, the quoted part as a phrase
+#   title:election OR category:sports
+#   flood NOT region:europe       NOT (or a leading "-") excludes matches
+#   title:(bridge collapse)       a field prefix applies to a whole group
+#
+# Bare words next to each other are OR'ed, exactly like the old search, while
+# a NOT next to a word narrows it: "flood -europe" is "flood AND NOT europe".
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+
+FIELD_ALIASES = {
+    'title': 'title',
+    'description': 'description',
+    'desc': 'description',
+    'category': 'category',
+    'cat': 'category',
+    'region': 'region',
+}
+
+_TOKEN_RE = re.compile(
+    r'(?P<lparen>\()'
+    r'|(?P<rparen>\))'
+    r'|(?P<neg>-)(?=[\w"(])'
+    r'|(?:(?P<field>\w+):)?"(?P<phrase>[^"]*)"?'
+    r'|(?:(?P<gfield>\w+):)(?=\()'
+    r'|(?:(?P<wfield>\w+):)?(?P<word>[^\s()"]+)'
+)
+
+
+@dataclass
+class Term:
+    text: str
+    field: Optional[str] = None
+
+
+@dataclass
+class Phrase:
+    text: str
+    field: Optional[str] = None
+
+
+@dataclass
+class And:
+    children: List["Node"] = field(default_factory=list)
+
+
+@dataclass
+class Or:
+    children: List["Node"] = field(default_factory=list)
+
+
+@dataclass
+class Not:
+    child: "Node"
+
+
+Node = Union[Term, Phrase, And, Or, Not]
+
+
+@dataclass
+class _Token:
+    kind: str
+    value: str = ''
+    field: Optional[str] = None
+
+
+def _resolve_field(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    return FIELD_ALIASES.get(name.lower())
+
+
+def _tokenize(query: str) -> List[_Token]:
+    tokens: List[_Token] = []
+    for match in _TOKEN_RE.finditer(query):
+        if match.group('lparen'):
+            tokens.append(_Token('('))
+        elif match.group('rparen'):
+            tokens.append(_Token(')'))
+        elif match.group('neg'):
+            tokens.append(_Token('NOT'))
+        elif match.group('phrase') is not None:
+            tokens.append(_Token('phrase', match.group('phrase'), _resolve_field(match.group('field'))))
+        elif match.group('gfield'):
+            tokens.append(_Token('group', field=_resolve_field(match.group('gfield'))))
+        elif match.group('word'):
+            word = match.group('word')
+            prefix = match.group('wfield')
+            if prefix and _resolve_field(prefix) is None:
+                # Not a known field, so "foo:bar" is just text.
+                word = f"{prefix}:{word}"
+                prefix = None
+            if prefix is None and word in ('AND', 'OR', 'NOT'):
+                tokens.append(_Token(word))
+            elif prefix is None and word in ('&&', '||'):
+                tokens.append(_Token('AND' if word == '&&' else 'OR'))
+            else:
+                tokens.append(_Token('word', word, _resolve_field(prefix)))
+    return tokens
+
+
+class _Parser:
+    # or_expr  := and_expr ((OR)? and_expr)*
+    # and_expr := unary (AND unary)*
+    # unary    := NOT unary | primary
+    # primary  := '(' or_expr ')' | field: '(' or_expr ')' | phrase | word
+
+    def __init__(self, tokens: List[_Token]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def _peek(self) -> Optional[_Token]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> _Token:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self) -> Optional[Node]:
+        nodes = []
+        while self._peek() is not None:
+            node = self._or_expr(None)
+            if node is not None:
+                nodes.append(node)
+            elif self._peek() is not None:
+                # Stray ")" or operator with nothing after it.
+                self._next()
+        return _flatten(Or(nodes))
+
+    def _or_expr(self, field_name: Optional[str]) -> Optional[Node]:
+        nodes = []
+        node = self._and_expr(field_name)
+        if node is not None:
+            nodes.append(node)
+        while True:
+            token = self._peek()
+            if token is None or token.kind == ')':
+                break
+            explicit = token.kind == 'OR'
+            if explicit:
+                self._next()
+            node = self._and_expr(field_name)
+            if node is None:
+                if not explicit:
+                    break
+                continue
+            if isinstance(node, Not) and nodes and not explicit:
+                nodes[-1] = _flatten(And([nodes[-1], node]))
+            else:
+                nodes.append(node)
+        return _flatten(Or(nodes))
+
+    def _and_expr(self, field_name: Optional[str]) -> Optional[Node]:
+        nodes = []
+        node = self._unary(field_name)
+        if node is not None:
+            nodes.append(node)
+        while self._peek() is not None and self._peek().kind == 'AND':
+            self._next()
+            node = self._unary(field_name)
+            if node is not None:
+                nodes.append(node)
+        return _flatten(And(nodes))
+
+    def _unary(self, field_name: Optional[str]) -> Optional[Node]:
+        token = self._peek()
+        if token is None:
+            return None
+        if token.kind == 'NOT':
+            self._next()
+            child = self._unary(field_name)
+            return Not(child) if child is not None else None
+        return self._primary(field_name)
+
+    def _primary(self, field_name: Optional[str]) -> Optional[Node]:
+        token = self._peek()
+        if token is None or token.kind in (')', 'AND', 'OR'):
+            return None
+        self._next()
+        if token.kind == 'group':
+            if self._peek() is None or self._peek().kind != '(':
+                return None
+            self._next()
+            return self._group(token.field or field_name)
+        if token.kind == '(':
+            return self._group(field_name)
+        if token.kind == 'phrase':
+            return Phrase(token.value, token.field or field_name) if token.value.strip() else None
+        return Term(token.value, token.field or field_name)
+
+    def _group(self, field_name: Optional[str]) -> Optional[Node]:
+        node = self._or_expr(field_name)
+        if self._peek() is not None and self._peek().kind == ')':
+            self._next()
+        return node
+
+
+def _flatten(node: Union[And, Or]) -> Optional[Node]:
+    if not node.children:
+        return None
+    if len(node.children) == 1:
+        return node.children[0]
+    flat: List[Node] = []
+    for child in node.children:
+        if type(child) is type(node):
+            flat.extend(child.children)
+        else:
+            flat.append(child)
+    node.children = flat
+    return node
+
+
+def parse_query(query: str) -> Optional[Node]:
+    return _Parser(_tokenize(query)).parse()
+
+
+def is_plain(node: Optional[Node]) -> bool:
+    # True for queries made only of bare, unfielded words.
+    if isinstance(node, Term):
+        return node.field is None
+    if isinstance(node, Or):
+        return all(isinstance(child, Term) and child.field is None for child in node.children)
+    return False
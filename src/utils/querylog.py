@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Query log and startup warm-up. Route hits are counted in memory and
+# appended to a small rotating JSONL file as (route, params, count) lines.
+# On startup the most frequent entries are replayed in the background, so
+# the index, the database pages, the payload cache and the username cache are
+# warm before the first wave of real traffic.
+#
+# With several API workers only one of them writes the file; see `claim`.
+
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .globals import logger
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+Entry = Tuple[str, str]
+
+QUERY_LOG_PATH = os.environ.get("QUERY_LOG_PATH", "query_log.jsonl")
+QUERY_LOG_FLUSH_INTERVAL = float(os.environ.get("QUERY_LOG_FLUSH_SECONDS", "30"))
+WARM_TOP_QUERIES = int(os.environ.get("WARM_TOP_QUERIES", "50"))
+
+
+def _entry(route: str, params: Dict[str, Any]) -> Entry:
+    # Params without the unset ones, in a stable order, as the counting key.
+    return route, json.dumps({k: v for k, v in params.items() if v is not None}, sort_keys=True, separators=(",", ":"))
+
+
+class QueryLog:
+    def __init__(self, path: Optional[str], max_bytes: int = 1_000_000):
+        self.path = path or None
+        self.max_bytes = max_bytes
+        self.pending: Counter = Counter()
+        self.recorded = 0
+        self.flushed_lines = 0
+        self.rotations = 0
+        self.writer = True
+        self.lock_file = None
+
+    def claim(self) -> bool:
+        # Workers share QUERY_LOG_PATH, and rotating it from several
+        # processes loses lines. Whichever worker holds the lock file writes
+        # the log for as long as it runs; the others still read it to warm
+        # up. Traffic is spread evenly, so one worker's counts rank the
+        # queries the same way all of them would.
+        if self.path is None or fcntl is None:
+            return self.writer
+        try:
+            self.lock_file = open(f"{self.path}.lock", "a")
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            if self.lock_file is not None:
+                self.lock_file.close()
+                self.lock_file = None
+            self.writer = False
+            self.pending.clear()
+        return self.writer
+
+    def record(self, route: str, **params: Any) -> None:
+        if self.path is None or not self.writer:
+            return
+        self.pending[_entry(route, params)] += 1
+        self.recorded += 1
+
+    def flush(self) -> None:
+        if self.path is None or not self.writer or not self.pending:
+            return
+        pending, self.pending = self.pending, Counter()
+        now = int(time.time())
+        lines = [
+            json.dumps({'ts': now, 'route': route, 'params': json.loads(params), 'n': count},
+                       ensure_ascii=False, separators=(",", ":"))
+            for (route, params), count in pending.items()
+        ]
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                # One previous file is kept, so the log is at most twice max_bytes.
+                os.replace(self.path, f"{self.path}.1")
+                self.rotations += 1
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            self.flushed_lines += len(lines)
+        except OSError as e:
+            logger.error(f"Could not write query log {self.path}: {e}")
+
+    def top(self, limit: int) -> List[Tuple[str, Dict[str, Any], int]]:
+        counts: Counter = Counter(self.pending)
+        if self.path is not None:
+            for path in (f"{self.path}.1", self.path):
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        for line in f:
+                            try:
+                                row = json.loads(line)
+                                counts[_entry(row['route'], row['params'])] += row['n']
+                            except (ValueError, KeyError, TypeError):
+                                continue
+                except FileNotFoundError:
+                    continue
+        return [(route, json.loads(params), count) for (route, params), count in counts.most_common(limit)]
+
+    async def run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'writer': self.writer,
+            'recorded': self.recorded,
+            'pending': len(self.pending),
+            'flushed_lines': self.flushed_lines,
+            'rotations': self.rotations,
+        }
+
+
+Replay = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+class CacheWarmer:
+    def __init__(self):
+        self.state = "idle"
+        self.planned = 0
+        self.done = 0
+        self.failed = 0
+        self.started: Optional[float] = None
+        self.elapsed = 0.0
+
+    async def run(self, entries: List[Tuple[str, Dict[str, Any]]], replay: Replay,
+                  ready: Callable[[], bool], ready_timeout: float = 60.0) -> None:
+        self.planned = len(entries)
+        if not entries:
+            self.state = "done"
+            return
+
+        # Usernames only resolve once the bot is connected; warming before
+        # that would cache payloads nobody asks for afterwards.
+        self.state = "waiting"
+        deadline = time.monotonic() + ready_timeout
+        while not ready() and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+
+        self.state = "running"
+        self.started = time.monotonic()
+        for route, params in entries:
+            try:
+                await replay(route, params)
+                self.done += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Warm-up of {route} {params} failed: {e}")
+            self.elapsed = time.monotonic() - self.started
+            # Real requests go first.
+            await asyncio.sleep(0)
+        self.state = "done"
+        logger.info(f"Warm-up replayed {self.done}/{self.planned} queries in {self.elapsed:.2f}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'planned': self.planned,
+            'done': self.done,
+            'failed': self.failed,
+            'elapsed_ms': round(self.elapsed * 1000, 1),
+        }
+
+
+query_log = QueryLog(QUERY_LOG_PATH, max_bytes=int(os.environ.get("QUERY_LOG_MAX_BYTES", "1000000")))
+cache_warmer = CacheWarmer()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# "Related stories": cosine similarity of sparse TF-IDF vectors built from
+# the reverse index's token streams. Every article's top-k neighbours are
+# precomputed, so serving them is a dictionary lookup.
+
+import asyncio
+import heapq
+import math
+import os
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from .globals import logger
+from .idx import ReverseIndex, news_index
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+Vector = Dict[int, float]
+
+FIELD_WEIGHTS = {
+    'title': 2.0,
+    'description': 1.0,
+}
+
+# Dense batches are only used while docs x features stays below this.
+NUMPY_MAX_CELLS = 50_000_000
+NUMPY_BATCH_SIZE = 256
+
+
+class _IndexCopy:
+    # What rebuild() reads from the reverse index, copied on the loop so the
+    # rebuild can run in a thread. Streams and position lists are replaced
+    # rather than changed in place, so copying their containers is enough.
+
+    def __init__(self, index: ReverseIndex):
+        self.documents = dict(index.documents)
+        self.streams = {news_id: dict(streams) for news_id, streams in index.streams.items()}
+        self.title_index = {term_id: dict(docs) for term_id, docs in index.title_index.items()}
+        self.description_index = {term_id: dict(docs) for term_id, docs in index.description_index.items()}
+
+
+class RelatedIndex:
+    def __init__(self, index: ReverseIndex, k: int = 5, min_score: float = 0.05):
+        self.index = index
+        self.k = k
+        self.min_score = min_score
+
+        self.vectors: Dict[int, Vector] = {}
+        self.term_docs: Dict[int, Dict[int, float]] = defaultdict(dict)
+        self.neighbours: Dict[int, List[Tuple[int, float]]] = {}
+        # news_id -> the articles whose lists include it, so a change only
+        # visits the lists it is in.
+        self.members: Dict[int, Set[int]] = defaultdict(set)
+        self.dirty: Set[int] = set()
+        self.built_size = 0
+        # Lists come ready-made from an index snapshot in API workers.
+        self.attached = False
+        # Full rebuilds run in a thread when there is a loop to come back to;
+        # articles changed meanwhile are replayed onto the result.
+        self.rebuilding: Optional[asyncio.Task] = None
+        self.pending: Set[int] = set()
+        self.epoch = 0
+        # Bumped whenever a rebuild replaces the lists.
+        self.version = 0
+
+    def _idf(self, term_id: int) -> float:
+        n = len(self.index.documents)
+        df = max(
+            len(self.index.title_index.get(term_id, ())),
+            len(self.index.description_index.get(term_id, ())),
+        )
+        return math.log((n + 1) / (df + 1)) + 1.0
+
+    def _vector(self, news_id: int) -> Vector:
+        streams = self.index.streams.get(news_id, {})
+        counts: Dict[int, float] = Counter()
+        for field_name, weight in FIELD_WEIGHTS.items():
+            stream = streams.get(field_name)
+            if stream is not None:
+                for term_id in stream.term_ids:
+                    counts[term_id] += weight
+
+        vector = {
+            term_id: (1.0 + math.log(count)) * self._idf(term_id)
+            for term_id, count in counts.items()
+        }
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        if norm:
+            vector = {term_id: value / norm for term_id, value in vector.items()}
+        return vector
+
+    def _set_vector(self, news_id: int, vector: Vector) -> None:
+        self._drop_vector(news_id)
+        self.vectors[news_id] = vector
+        for term_id, value in vector.items():
+            self.term_docs[term_id][news_id] = value
+
+    def _drop_vector(self, news_id: int) -> None:
+        for term_id in self.vectors.pop(news_id, {}):
+            docs = self.term_docs.get(term_id)
+            if docs is not None:
+                docs.pop(news_id, None)
+                if not docs:
+                    del self.term_docs[term_id]
+
+    def _scores(self, news_id: int) -> Dict[int, float]:
+        # Sparse dot products, visiting only articles that share a term.
+        scores: Dict[int, float] = defaultdict(float)
+        for term_id, value in self.vectors.get(news_id, {}).items():
+            for other_id, other_value in self.term_docs.get(term_id, {}).items():
+                if other_id != news_id:
+                    scores[other_id] += value * other_value
+        return scores
+
+    def _top(self, scores: Dict[int, float]) -> List[Tuple[int, float]]:
+        best = heapq.nlargest(self.k, scores.items(), key=lambda pair: pair[1])
+        return [(other_id, round(score, 4)) for other_id, score in best if score >= self.min_score]
+
+    def _set_list(self, news_id: int, pairs: Optional[List[Tuple[int, float]]]) -> None:
+        for other_id, _score in self.neighbours.get(news_id, ()):
+            owners = self.members.get(other_id)
+            if owners is not None:
+                owners.discard(news_id)
+                if not owners:
+                    del self.members[other_id]
+        if pairs is None:
+            self.neighbours.pop(news_id, None)
+            return
+        self.neighbours[news_id] = pairs
+        for other_id, _score in pairs:
+            self.members[other_id].add(news_id)
+
+    def _index_members(self) -> None:
+        self.members.clear()
+        for news_id, pairs in self.neighbours.items():
+            for other_id, _score in pairs:
+                self.members[other_id].add(news_id)
+
+    def rebuild(self) -> None:
+        self.vectors.clear()
+        self.term_docs.clear()
+        self.neighbours.clear()
+        self.members.clear()
+        self.dirty.clear()
+
+        for news_id in list(self.index.documents):
+            self._set_vector(news_id, self._vector(news_id))
+
+        if numpy is not None and len(self.vectors) * len(self.term_docs) <= NUMPY_MAX_CELLS:
+            self._rebuild_numpy()
+        else:
+            for news_id in self.vectors:
+                self.neighbours[news_id] = self._top(self._scores(news_id))
+        self._index_members()
+
+        self.built_size = len(self.vectors)
+        self.version += 1
+        logger.info(f"Related index built for {self.built_size} articles")
+
+    def _rebuild_numpy(self) -> None:
+        ids = list(self.vectors)
+        columns = {term_id: column for column, term_id in enumerate(self.term_docs)}
+        matrix = numpy.zeros((len(ids), len(columns)), dtype=numpy.float32)
+        for row, news_id in enumerate(ids):
+            for term_id, value in self.vectors[news_id].items():
+                matrix[row, columns[term_id]] = value
+
+        k = min(self.k, len(ids) - 1)
+        for start in range(0, len(ids), NUMPY_BATCH_SIZE):
+            similarities = matrix[start:start + NUMPY_BATCH_SIZE] @ matrix.T
+            for offset, row in enumerate(similarities):
+                news_id = ids[start + offset]
+                row[start + offset] = -1.0
+                if k <= 0:
+                    self.neighbours[news_id] = []
+                    continue
+                candidates = numpy.argpartition(row, -k)[-k:]
+                candidates = candidates[numpy.argsort(row[candidates])[::-1]]
+                self.neighbours[news_id] = [
+                    (ids[column], round(float(row[column]), 4))
+                    for column in candidates if row[column] >= self.min_score
+                ]
+
+    def schedule_rebuild(self) -> None:
+        if self.rebuilding is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.rebuild()
+            return
+        self.rebuilding = loop.create_task(self._rebuild_in_thread())
+
+    async def _rebuild_in_thread(self) -> None:
+        try:
+            while True:
+                epoch = self.epoch
+                self.pending.clear()
+                fresh = RelatedIndex(_IndexCopy(self.index), self.k, self.min_score)
+                await asyncio.to_thread(fresh.rebuild)
+                if epoch == self.epoch:
+                    break
+                # Everything changed again while that one ran.
+        except Exception as e:
+            logger.error(f"Related index rebuild failed: {e}")
+            return
+        finally:
+            self.rebuilding = None
+        if self.attached:
+            return
+
+        self.vectors = fresh.vectors
+        self.term_docs = fresh.term_docs
+        self.neighbours = fresh.neighbours
+        self.members = fresh.members
+        self.dirty = fresh.dirty
+        self.built_size = fresh.built_size
+        self.version += 1
+        pending, self.pending = self.pending, set()
+        for news_id in pending:
+            self.on_change(news_id)
+
+    def on_change(self, news_id: Optional[int]) -> None:
+        if news_id is None:
+            # Term ids may have been reassigned, so the old vectors are no use.
+            self.vectors.clear()
+            self.term_docs.clear()
+            self.neighbours.clear()
+            self.members.clear()
+            self.dirty.clear()
+            self.built_size = 0
+            self.epoch += 1
+            self.schedule_rebuild()
+            return
+
+        if self.rebuilding is not None:
+            self.pending.add(news_id)
+
+        if news_id not in self.index.documents:
+            self._remove(news_id)
+            return
+
+        if self.built_size and len(self.index.documents) > self.built_size * 1.25:
+            # Enough new articles that the stored IDF weights have drifted.
+            # Meanwhile the article is added with the weights there are.
+            self.schedule_rebuild()
+
+        self._set_vector(news_id, self._vector(news_id))
+        scores = self._scores(news_id)
+        self._set_list(news_id, self._top(scores))
+        self.dirty.discard(news_id)
+
+        # Let the new article into the lists it now belongs in, and refill
+        # the ones it dropped out of on first read.
+        for other_id in self.members.get(news_id, ()):
+            if other_id not in scores:
+                self.dirty.add(other_id)
+        for other_id, score in scores.items():
+            pairs = self.neighbours.get(other_id, [])
+            current = [pair for pair in pairs if pair[0] != news_id]
+            if score >= self.min_score and (len(current) < self.k or score > current[-1][1]):
+                current.append((news_id, round(score, 4)))
+                current.sort(key=lambda pair: pair[1], reverse=True)
+                del current[self.k:]
+            elif len(current) < len(pairs):
+                self.dirty.add(other_id)
+            self._set_list(other_id, current)
+
+    def _remove(self, news_id: int) -> None:
+        self._drop_vector(news_id)
+        self._set_list(news_id, None)
+        self.dirty.discard(news_id)
+        # Those lists keep the id until they are refilled.
+        self.dirty.update(self.members.get(news_id, ()))
+
+    def attach(self, neighbours) -> None:
+        self.vectors.clear()
+        self.term_docs.clear()
+        self.members.clear()
+        self.dirty.clear()
+        self.neighbours = neighbours
+        self.attached = True
+
+    def related(self, news_id: int, limit: Optional[int] = None) -> Optional[List[Tuple[int, float]]]:
+        if self.attached:
+            pairs = self.neighbours.get(news_id)
+            return pairs[:limit] if limit and pairs else pairs
+        if news_id not in self.vectors:
+            return None
+        if news_id in self.dirty:
+            # A neighbour was deleted; refill this list on first read.
+            self._set_list(news_id, self._top(self._scores(news_id)))
+            self.dirty.discard(news_id)
+        pairs = self.neighbours.get(news_id, [])
+        return pairs[:limit] if limit else pairs
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'articles': len(self.neighbours) if self.attached else len(self.vectors),
+            'features': len(self.term_docs),
+            'dirty': len(self.dirty),
+            'k': self.k,
+        }
+
+
+related_index = RelatedIndex(news_index, k=int(os.environ.get("RELATED_TOP_K", "5")))
+news_index.listeners.append(related_index.on_change)
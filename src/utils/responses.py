@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Response classes for the API. Kept apart from serialize so the bot can
+# encode JSON (stream, stats) without importing FastAPI.
+
+from typing import Any, Dict, Optional
+
+from fastapi.responses import JSONResponse, Response
+
+from .serialize import dumps, orjson
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+else:
+    FastJSONResponse = JSONResponse
+
+
+class EncodedJSONResponse(Response):
+    # For bodies that are already JSON bytes.
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            return bytes(content)
+        return dumps(content)
+
+
+def json_bytes(body: bytes, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> EncodedJSONResponse:
+    return EncodedJSONResponse(content=body, status_code=status_code, headers=headers)
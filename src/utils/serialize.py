@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# JSON encoding for API responses. Each article is encoded once per version
+# (id + last update) and list responses are stitched from the cached bytes.
+
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .db import usernames
+from .tracing import tracer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class PayloadCache:
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        # key -> (payload, monotonic expiry or None)
+        self.entries: "OrderedDict[Tuple[Any, ...], Tuple[Any, Optional[float]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key: Tuple[Any, ...]) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.entries[key]
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: Tuple[Any, ...], payload: bytes, ttl: Optional[float] = None) -> None:
+        self.entries[key] = (payload, time.monotonic() + ttl if ttl is not None else None)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+        }
+
+
+payload_cache = PayloadCache(int(os.environ.get("PAYLOAD_CACHE_SIZE", "2048")))
+
+
+NEWS_FIELDS = ("id", "title", "description", "image_url", "credit", "reporter", "region", "date", "category")
+
+# Computed per request rather than stored: snippet, highlights, title_highlights.
+SNIPPET_FIELD = "snippet"
+# Type, size and dimensions of image_url, from the image metadata cache.
+IMAGE_FIELD = "image"
+EXTRA_FIELDS = (SNIPPET_FIELD, IMAGE_FIELD)
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    # "title,snippet" -> ("id", "title", "snippet"); None means everything.
+    if not value:
+        return None
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = requested - set(NEWS_FIELDS) - set(EXTRA_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(name for name in NEWS_FIELDS + EXTRA_FIELDS if name in requested or name == "id")
+
+
+def _item_key(item, bot, fields: Optional[Tuple[str, ...]]) -> Tuple[Any, ...]:
+    # `date` is auto_now, so it changes on every save. Usernames are only
+    # resolved once the bot is ready, which changes the payload as well.
+    resolved = bool(bot and hasattr(bot, 'fetch_user') and bot.is_ready())
+    updated = item.date.timestamp() if item.date else None
+    return (item.id, updated, resolved, fields)
+
+
+# What NewsSchema.to_dict puts in place of a name it couldn't look up.
+_FAILED_LOOKUPS = (b'"credit":"Unknown:', b'"reporter":"Unknown:')
+
+
+def username_ttl(payload: bytes, resolved: bool) -> Optional[float]:
+    # How long a payload holding usernames stays right: renames show up
+    # after the username cache's ttl, and failed lookups are retried after
+    # its failure_ttl. Payloads without resolved names never go stale.
+    if not resolved:
+        return None
+    if any(marker in payload for marker in _FAILED_LOOKUPS):
+        return usernames.failure_ttl
+    return usernames.ttl
+
+
+async def encode_item(item, bot, fields: Optional[Tuple[str, ...]] = None,
+                      extra: Optional[Dict[str, Any]] = None) -> bytes:
+    if fields is not None:
+        fields = tuple(name for name in fields if name not in EXTRA_FIELDS)
+    key = _item_key(item, bot, fields)
+    payload = payload_cache.get(key)
+    if payload is None:
+        payload = dumps(await item.to_dict(bot, fields))
+        names = fields is None or "credit" in fields or "reporter" in fields
+        payload_cache.put(key, payload, username_ttl(payload, key[2] and names))
+    if extra:
+        # Per-request keys are spliced onto the cached object.
+        payload = payload[:-1] + b"," + dumps(extra)[1:]
+    return payload
+
+
+async def encode_items(items: Iterable, bot, fields: Optional[Tuple[str, ...]] = None,
+                       extras: Optional[Dict[int, Dict[str, Any]]] = None) -> bytes:
+    items = list(items)
+    with tracer.span("encode_items", items=len(items), fields=",".join(fields) if fields else "*"):
+        encoded = [await encode_item(item, bot, fields, extras.get(item.id) if extras else None) for item in items]
+        return b"[" + b",".join(encoded) + b"]"
+
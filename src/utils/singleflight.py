@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Request coalescing: concurrent calls with the same key share one in-flight
+# computation instead of each running it.
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from .tracing import tracer
+
+T = TypeVar("T")
+
+
+def _consume_exception(task: asyncio.Task) -> None:
+    # Every caller may have gone away; don't log "exception never retrieved".
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    def __init__(self):
+        self.in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.requests = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self.requests += 1
+
+        task = self.in_flight.get(key)
+        coalesced = task is not None
+        # The span is opened first so the leader's task records its work under it.
+        with tracer.span("singleflight", coalesced=coalesced):
+            if coalesced:
+                self.coalesced += 1
+            else:
+                self.executions += 1
+                task = asyncio.ensure_future(fn())
+                self.in_flight[key] = task
+                task.add_done_callback(lambda _t: self.in_flight.pop(key, None))
+                task.add_done_callback(_consume_exception)
+
+            # Shielded, so one disconnecting client doesn't cancel the others' work.
+            return await asyncio.shield(task)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'in_flight': len(self.in_flight),
+            'coalescing_rate': round(self.coalesced / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+search_flight = SingleFlight()
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split())
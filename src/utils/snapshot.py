@@ -0,0 +1,705 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Index snapshots for multi-worker API serving. The bot process keeps the
+# live index and writes it out as flat arrays whenever it changes; API worker
+# processes mmap the file read-only and answer queries through views over it,
+# so the page cache holds one copy of the index however many workers there
+# are. A new snapshot is written next to the old one and renamed over it, and
+# workers switch over on their next poll.
+
+import asyncio
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from tortoise import Tortoise
+
+from .analysis import Analyzer, AnalyzerConfig
+from .archive import cold_archive
+from .db import DATABASE_URL
+from .globals import logger
+from .idx import FieldStream, ReverseIndex, news_index
+from .related import RelatedIndex, related_index
+from .spell import spell_index
+from .startup import startup
+from .stats import news_stats
+from .stream import event_hub
+from .timeidx import to_timestamp
+
+MAGIC = b"CNNSNAP\x01"
+FORMAT_VERSION = 1
+
+SNAPSHOT_FIELDS = ('title', 'description', 'category', 'region')
+STREAM_FIELDS = ('title', 'description')
+
+SNAPSHOT_PATH = os.environ.get("INDEX_SNAPSHOT_PATH", "index.snapshot")
+# The cold archive's index, next to it and in the same format.
+ARCHIVE_SUFFIX = ".archive"
+# At most one snapshot per SNAPSHOT_MIN_INTERVAL; a burst of changes is
+# written once it has been quiet for SNAPSHOT_DEBOUNCE.
+SNAPSHOT_MIN_INTERVAL = float(os.environ.get("SNAPSHOT_MIN_INTERVAL_SECONDS", "5"))
+SNAPSHOT_DEBOUNCE = float(os.environ.get("SNAPSHOT_DEBOUNCE_SECONDS", "1"))
+SNAPSHOT_POLL = float(os.environ.get("SNAPSHOT_POLL_SECONDS", "1"))
+
+# Tells workers that the builder restarted and numbered its terms afresh.
+BUILDER_ID = f"{os.getpid()}-{time.time_ns():x}"
+
+
+class SnapshotMismatch(Exception):
+    """The snapshot was written by an incompatible version of the bot."""
+
+
+class _Writer:
+    # Sections are 8-byte aligned so every array can be cast in place.
+
+    def __init__(self):
+        self.body = bytearray()
+        self.sections: Dict[str, List[Any]] = {}
+
+    def add(self, name: str, data) -> None:
+        self.body += b"\0" * (-len(self.body) % 8)
+        if isinstance(data, array):
+            raw, typecode = data.tobytes(), data.typecode
+        else:
+            raw, typecode = bytes(data), 'B'
+        self.sections[name] = [len(self.body), len(raw), typecode]
+        self.body += raw
+
+    def add_strings(self, name: str, strings) -> None:
+        offsets = array('I', [0])
+        blob = bytearray()
+        for text in strings:
+            blob += text.encode("utf-8")
+            offsets.append(len(blob))
+        self.add(f"{name}.offsets", offsets)
+        self.add(f"{name}.blob", blob)
+
+
+class IndexCopy:
+    # What build_snapshot reads, copied on the loop that changes the index so
+    # the encoding can run in a thread. Position lists, streams and documents
+    # are replaced rather than changed in place, so the containers holding
+    # them are all that needs copying.
+
+    def __init__(self, index: ReverseIndex, related: Optional[RelatedIndex]):
+        self.analyzer = index.analyzer
+        self.generation = index.generation
+        self.terms = list(index.terms)
+        self.field_indexes = {
+            field_name: {term_id: dict(docs) for term_id, docs in index.field_indexes[field_name].items()}
+            for field_name in SNAPSHOT_FIELDS
+        }
+        self.documents = dict(index.documents)
+        self.streams = {news_id: dict(streams) for news_id, streams in index.streams.items()}
+        self.dates = dict(index.time_index.by_id)
+        self.time_entries = list(index.time_index.entries)
+        # related() also refills lists left dirty by deletes.
+        self.neighbours = {news_id: related.related(news_id) or [] for news_id in self.documents} if related else {}
+
+
+def build_snapshot(index: IndexCopy, events) -> bytes:
+    # Term ids are kept as they are, so workers can extend their spelling
+    # index instead of rebuilding it while the builder keeps running.
+    writer = _Writer()
+    terms = index.terms
+    writer.add_strings("terms", terms)
+    writer.add("terms.sorted", array('I', sorted(range(len(terms)), key=terms.__getitem__)))
+
+    field_terms = {}
+    for field_name in SNAPSHOT_FIELDS:
+        postings = index.field_indexes[field_name]
+        term_offsets = array('I', [0])
+        entries = array('I')
+        positions = array('I')
+        for term_id in range(len(terms)):
+            docs = postings.get(term_id)
+            if docs:
+                for news_id in sorted(docs):
+                    entries.extend((news_id, len(positions), len(docs[news_id])))
+                    positions.extend(docs[news_id])
+            term_offsets.append(len(entries) // 3)
+        field_terms[field_name] = sum(1 for docs in postings.values() if docs)
+        writer.add(f"{field_name}.terms", term_offsets)
+        writer.add(f"{field_name}.entries", entries)
+        writer.add(f"{field_name}.positions", positions)
+
+    doc_ids = sorted(index.documents)
+    writer.add("docs.ids", array('I', doc_ids))
+    writer.add("docs.dates", array('d', (index.dates.get(news_id, math.nan) for news_id in doc_ids)))
+    writer.add_strings("docs.text", (
+        index.documents[news_id][field_name] or "" for news_id in doc_ids for field_name in SNAPSHOT_FIELDS
+    ))
+
+    for field_name in STREAM_FIELDS:
+        offsets = array('I', [0])
+        columns = [array('I') for _ in range(4)]
+        for news_id in doc_ids:
+            stream = index.streams.get(news_id, {}).get(field_name)
+            if stream is not None:
+                for column, values in zip(columns, (stream.term_ids, stream.positions, stream.starts, stream.ends)):
+                    column.extend(values)
+            offsets.append(len(columns[0]))
+        writer.add(f"streams.{field_name}.offsets", offsets)
+        for name, column in zip(("term_ids", "positions", "starts", "ends"), columns):
+            writer.add(f"streams.{field_name}.{name}", column)
+
+    writer.add("time.dates", array('d', (timestamp for timestamp, _news_id in index.time_entries)))
+    writer.add("time.ids", array('I', (news_id for _timestamp, news_id in index.time_entries)))
+
+    offsets = array('I', [0])
+    neighbour_ids = array('I')
+    scores = array('f')
+    for news_id in doc_ids:
+        for other_id, score in index.neighbours.get(news_id, ()):
+            neighbour_ids.append(other_id)
+            scores.append(score)
+        offsets.append(len(neighbour_ids))
+    writer.add("related.offsets", offsets)
+    writer.add("related.ids", neighbour_ids)
+    writer.add("related.scores", scores)
+
+    config = index.analyzer.config
+    header = json.dumps({
+        'format': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'builder': BUILDER_ID,
+        'generation': index.generation,
+        'created': time.time(),
+        'analyzer_version': index.analyzer.version,
+        'analyzer': {
+            'unicode_form': config.unicode_form,
+            'casefold': config.casefold,
+            'stop_words': sorted(config.stop_words),
+            'stem': config.stem,
+            'min_length': config.min_length,
+        },
+        'documents': len(doc_ids),
+        'field_terms': field_terms,
+        'events': [[event.id, event.frame.decode("utf-8")] for event in events],
+        # Shown by the workers' /healthz, since the builder serves no HTTP.
+        'startup': startup.to_dict(),
+        'sections': writer.sections,
+    }).encode("utf-8")
+
+    start = len(MAGIC) + 4 + len(header)
+    padding = b"\0" * (-start % 8)
+    return MAGIC + struct.pack("<I", len(header)) + header + padding + bytes(writer.body)
+
+
+def write_snapshot(path: str, data: bytes) -> None:
+    # Workers holding the old file keep their mapping; the rename only
+    # changes what the next open sees.
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+class _Strings:
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+
+class _TermIds:
+    # term -> id by binary search over the ids in term order.
+
+    def __init__(self, terms: _Strings, order: memoryview):
+        self.terms = terms
+        self.order = order
+        self.cache: Dict[str, Optional[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __contains__(self, term: str) -> bool:
+        return self.get(term) is not None
+
+    def get(self, term: str, default: Optional[int] = None) -> Optional[int]:
+        if term in self.cache:
+            term_id = self.cache[term]
+            return default if term_id is None else term_id
+
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.terms[self.order[middle]] < term:
+                low = middle + 1
+            else:
+                high = middle
+        term_id = self.order[low] if low < len(self.order) and self.terms[self.order[low]] == term else None
+
+        if len(self.cache) >= 4096:
+            self.cache.clear()
+        self.cache[term] = term_id
+        return default if term_id is None else term_id
+
+
+class _FieldPostings:
+    # One field's postings. Lists are decoded per lookup, with a small LRU
+    # for the terms that keep coming up.
+
+    def __init__(self, term_offsets: memoryview, entries: memoryview, positions: memoryview,
+                 term_count: int, cache_size: int = 256):
+        self.term_offsets = term_offsets
+        self.entries = entries
+        self.positions = positions
+        self.term_count = term_count
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[int, Dict[int, List[int]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return self.term_count
+
+    def get(self, term_id: int, default=None):
+        if term_id + 1 >= len(self.term_offsets):
+            return default
+        start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+        if start == end:
+            return default
+
+        docs = self.cache.get(term_id)
+        if docs is not None:
+            self.cache.move_to_end(term_id)
+            return docs
+
+        entries, positions = self.entries, self.positions
+        docs = {}
+        for i in range(start * 3, end * 3, 3):
+            first = entries[i + 1]
+            docs[entries[i]] = positions[first:first + entries[i + 2]].tolist()
+        self.cache[term_id] = docs
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return docs
+
+
+class _Document(Mapping):
+    def __init__(self, text: _Strings, row: int):
+        self.text = text
+        self.row = row
+
+    def __getitem__(self, field_name: str) -> str:
+        return self.text[self.row * len(SNAPSHOT_FIELDS) + SNAPSHOT_FIELDS.index(field_name)]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(SNAPSHOT_FIELDS)
+
+    def __len__(self) -> int:
+        return len(SNAPSHOT_FIELDS)
+
+
+class _Documents(Mapping):
+    def __init__(self, ids: memoryview, text: _Strings):
+        self.ids = ids
+        self.text = text
+
+    def row(self, news_id: int) -> int:
+        i = bisect_left(self.ids, news_id)
+        return i if i < len(self.ids) and self.ids[i] == news_id else -1
+
+    def __contains__(self, news_id) -> bool:
+        return isinstance(news_id, int) and self.row(news_id) >= 0
+
+    def __getitem__(self, news_id: int) -> _Document:
+        row = self.row(news_id)
+        if row < 0:
+            raise KeyError(news_id)
+        return _Document(self.text, row)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class _Streams:
+    def __init__(self, documents: _Documents, columns: Dict[str, Tuple[memoryview, ...]]):
+        self.documents = documents
+        self.columns = columns
+
+    def get(self, news_id: int, default=None):
+        row = self.documents.row(news_id)
+        if row < 0:
+            return default
+        streams = {}
+        for field_name, (offsets, *values) in self.columns.items():
+            start, end = offsets[row], offsets[row + 1]
+            streams[field_name] = FieldStream(*(column[start:end] for column in values))
+        return streams
+
+
+class _Dates:
+    # news id -> timestamp, like TimeIndex.by_id.
+
+    def __init__(self, documents: _Documents, dates: memoryview):
+        self.documents = documents
+        self.dates = dates
+
+    def get(self, news_id: int, default=None):
+        row = self.documents.row(news_id)
+        if row < 0 or math.isnan(self.dates[row]):
+            return default
+        return self.dates[row]
+
+
+class SnapshotTimeIndex:
+    # The read side of TimeIndex over two parallel arrays.
+
+    def __init__(self, dates: memoryview, ids: memoryview, by_id: _Dates):
+        self.dates = dates
+        self.ids = ids
+        self.by_id = by_id
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _bounds(self, since: Optional[datetime], until: Optional[datetime]) -> Tuple[int, int]:
+        low = 0 if since is None else bisect_left(self.dates, to_timestamp(since))
+        high = len(self.ids) if until is None else bisect_left(self.dates, to_timestamp(until))
+        return low, max(low, high)
+
+    def iter_range(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   newest_first: bool = True) -> Iterator[int]:
+        low, high = self._bounds(since, until)
+        indices = range(high - 1, low - 1, -1) if newest_first else range(low, high)
+        for i in indices:
+            yield self.ids[i]
+
+    def count_range(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> int:
+        low, high = self._bounds(since, until)
+        return high - low
+
+    def latest(self, limit: int) -> List[int]:
+        if limit <= 0:
+            return []
+        return self.ids[max(0, len(self.ids) - limit):].tolist()[::-1]
+
+
+class _Neighbours:
+    def __init__(self, documents: _Documents, offsets: memoryview, ids: memoryview, scores: memoryview):
+        self.documents = documents
+        self.offsets = offsets
+        self.ids = ids
+        self.scores = scores
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def get(self, news_id: int, default=None):
+        row = self.documents.row(news_id)
+        if row < 0:
+            return default
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return [(self.ids[i], round(self.scores[i], 4)) for i in range(start, end)]
+
+
+class Snapshot:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.mmap)
+        view = memoryview(self.mmap)
+
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise SnapshotMismatch(f"{path} is not an index snapshot")
+        (header_size,) = struct.unpack_from("<I", self.mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(bytes(view[start:start + header_size]))
+        body = start + header_size
+        body += -body % 8
+
+        if self.header['format'] != FORMAT_VERSION or self.header['byteorder'] != sys.byteorder:
+            raise SnapshotMismatch(f"Unsupported snapshot format {self.header['format']}/{self.header['byteorder']}")
+
+        config = self.header['analyzer']
+        self.analyzer = Analyzer(AnalyzerConfig(
+            unicode_form=config['unicode_form'],
+            casefold=config['casefold'],
+            stop_words=frozenset(config['stop_words']),
+            stem=config['stem'],
+            min_length=config['min_length'],
+        ))
+        # Same settings but a different pipeline: this worker would analyze
+        # queries differently from how the builder analyzed the articles.
+        if self.analyzer.version != self.header['analyzer_version']:
+            raise SnapshotMismatch(
+                f"Snapshot analyzer {self.header['analyzer_version']} does not match ours ({self.analyzer.version})"
+            )
+
+        def section(name: str) -> memoryview:
+            offset, length, typecode = self.header['sections'][name]
+            data = view[body + offset:body + offset + length]
+            return data if typecode == 'B' else data.cast(typecode)
+
+        self.generation: int = self.header['generation']
+        self.events: List[Tuple[int, bytes]] = [(event_id, frame.encode("utf-8")) for event_id, frame in self.header['events']]
+
+        self.terms = _Strings(section("terms.offsets"), section("terms.blob"))
+        self.term_ids = _TermIds(self.terms, section("terms.sorted"))
+        self.field_indexes = {
+            field_name: _FieldPostings(
+                section(f"{field_name}.terms"), section(f"{field_name}.entries"),
+                section(f"{field_name}.positions"), self.header['field_terms'][field_name],
+            )
+            for field_name in SNAPSHOT_FIELDS
+        }
+        self.documents = _Documents(section("docs.ids"), _Strings(section("docs.text.offsets"), section("docs.text.blob")))
+        self.streams = _Streams(self.documents, {
+            field_name: tuple(
+                section(f"streams.{field_name}.{name}")
+                for name in ("offsets", "term_ids", "positions", "starts", "ends")
+            )
+            for field_name in STREAM_FIELDS
+        })
+        self.time_index = SnapshotTimeIndex(
+            section("time.dates"), section("time.ids"), _Dates(self.documents, section("docs.dates"))
+        )
+        self.neighbours = _Neighbours(
+            self.documents, section("related.offsets"), section("related.ids"), section("related.scores")
+        )
+
+
+class SnapshotPublisher:
+    # Runs in the bot process, on the loop that also applies every change.
+
+    def __init__(self, path: str, index: ReverseIndex, related: RelatedIndex):
+        self.path = path
+        self.index = index
+        self.related = related
+        self.published_generation: Optional[int] = None
+        self.published_event: Optional[int] = None
+        self.published_archive: Optional[int] = None
+        self.published_related: Optional[int] = None
+        self.publishes = 0
+        self.failures = 0
+        self.last_bytes = 0
+        self.last_build_ms = 0.0
+        self.last_copy_ms = 0.0
+
+    def _version(self) -> Tuple[int, int, int]:
+        # Related lists also change when a rebuild finishes in its thread.
+        return self.index.generation, event_hub.next_id, self.related.version
+
+    def is_stale(self) -> bool:
+        return self._version() != (self.published_generation, self.published_event, self.published_related)
+
+    async def publish_archive(self) -> None:
+        # Written before the main snapshot that reflects the same archive
+        # run, so workers find it when they pick that one up.
+        version = cold_archive.version
+        if cold_archive.block_count:
+            copy = IndexCopy(await cold_archive.ensure_loaded(), None)
+            data = await asyncio.to_thread(build_snapshot, copy, [])
+            await asyncio.to_thread(write_snapshot, self.path + ARCHIVE_SUFFIX, data)
+            logger.info(f"Archive index snapshot written: {len(data)} bytes")
+        self.published_archive = version
+
+    async def publish(self) -> None:
+        if cold_archive.version != self.published_archive:
+            await self.publish_archive()
+        started = time.perf_counter()
+        # Only the copy happens on the loop; encoding and writing don't hold
+        # up the gateway.
+        with event_hub.lock:
+            events = list(event_hub.history)
+            last_event = event_hub.next_id
+        related_version = self.related.version
+        copy = IndexCopy(self.index, self.related)
+        self.last_copy_ms = round((time.perf_counter() - started) * 1000, 3)
+        data = await asyncio.to_thread(build_snapshot, copy, events)
+        await asyncio.to_thread(write_snapshot, self.path, data)
+        self.published_generation = copy.generation
+        self.published_event = last_event
+        self.published_related = related_version
+        self.publishes += 1
+        self.last_bytes = len(data)
+        self.last_build_ms = round((time.perf_counter() - started) * 1000, 3)
+        logger.info(f"Index snapshot {self.published_generation} written: {len(data)} bytes in {self.last_build_ms} ms")
+
+    async def run(self, min_interval: float, debounce: float) -> None:
+        last_publish = time.monotonic()
+        stale_since: Optional[float] = None
+        seen = self._version()
+        while True:
+            await asyncio.sleep(debounce)
+            if not self.index.is_initialized or not self.is_stale():
+                stale_since = None
+                continue
+            now = time.monotonic()
+            if stale_since is None:
+                stale_since = now
+            version, seen = seen, self._version()
+            quiet = version == seen
+            # Steady writes still go out once they've waited min_interval.
+            if now - last_publish < min_interval or (not quiet and now - stale_since < min_interval):
+                continue
+            try:
+                await self.publish()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Failed to write index snapshot: {e}")
+            last_publish = time.monotonic()
+            stale_since = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'generation': self.published_generation,
+            'publishes': self.publishes,
+            'failures': self.failures,
+            'bytes': self.last_bytes,
+            'build_ms': self.last_build_ms,
+            'copy_ms': self.last_copy_ms,
+        }
+
+
+class SnapshotReader:
+    # Runs in each API worker: attaches the newest snapshot to news_index.
+
+    def __init__(self, path: str, index: ReverseIndex):
+        self.path = path
+        self.index = index
+        self.snapshot: Optional[Snapshot] = None
+        self.file_id: Optional[Tuple[int, int, int]] = None
+        self.archive_id: Optional[Tuple[int, int, int]] = None
+        self.attaches = 0
+        self.rejected = 0
+
+    def _refresh_archive(self) -> None:
+        # Every worker maps the same file instead of decoding the archive
+        # blocks into its own index.
+        path = self.path + ARCHIVE_SUFFIX
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_id == self.archive_id:
+            return
+        self.archive_id = file_id
+        try:
+            snapshot = Snapshot(path)
+        except (SnapshotMismatch, ValueError, KeyError) as e:
+            logger.error(f"Not attaching archive snapshot {path}: {e}")
+            return
+        index = ReverseIndex(snapshot.analyzer)
+        index.attach_snapshot(snapshot)
+        cold_archive.attach(index)
+        logger.info(f"Attached archive snapshot ({snapshot.size} bytes)")
+
+    def refresh(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_id == self.file_id:
+            return False
+        self.file_id = file_id
+        self._refresh_archive()
+
+        try:
+            snapshot = Snapshot(self.path)
+        except (SnapshotMismatch, ValueError, KeyError) as e:
+            # Keep serving the previous snapshot, if there is one.
+            self.rejected += 1
+            logger.error(f"Not attaching index snapshot {self.path}: {e}")
+            return False
+
+        previous, self.snapshot = self.snapshot, snapshot
+        analyzer_changed = previous is None or previous.analyzer.version != snapshot.analyzer.version
+        restarted = previous is not None and previous.header['builder'] != snapshot.header['builder']
+
+        self.index.attach_snapshot(snapshot)
+        related_index.attach(snapshot.neighbours)
+        if analyzer_changed or restarted:
+            spell_index.rebuild()
+        else:
+            spell_index.refresh()
+        for event_id, frame in snapshot.events:
+            event_hub.relay(event_id, frame)
+
+        self.attaches += 1
+        logger.info(f"Attached index snapshot {snapshot.generation} ({snapshot.size} bytes)")
+        return True
+
+    async def watch(self, interval: float) -> None:
+        # Until the first snapshot arrives, routes use their database fallbacks.
+        while True:
+            try:
+                if self.refresh():
+                    if self.attaches == 1:
+                        startup.finish("index")
+                    await news_stats.load(rebuild=False)
+                    await cold_archive.refresh_totals()
+            except Exception as e:
+                logger.error(f"Failed to refresh index snapshot: {e}")
+            await asyncio.sleep(interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'generation': self.snapshot.generation if self.snapshot else None,
+            'bytes': self.snapshot.size if self.snapshot else 0,
+            'attaches': self.attaches,
+            'rejected': self.rejected,
+        }
+
+
+snapshot_publisher = SnapshotPublisher(SNAPSHOT_PATH, news_index, related_index)
+snapshot_reader = SnapshotReader(SNAPSHOT_PATH, news_index)
+
+
+@asynccontextmanager
+async def worker_lifespan():
+    # Workers share the builder's database but never write the index or run
+    # the archiver; the builder does both.
+    with startup.stage("database"):
+        await Tortoise.init(db_url=DATABASE_URL, modules={"models": ["utils.db"]})
+    try:
+        with startup.stage("stats"):
+            await news_stats.load(rebuild=False)
+        await cold_archive.refresh_totals()
+        startup.start("index")
+        watcher = asyncio.create_task(snapshot_reader.watch(SNAPSHOT_POLL))
+        try:
+            yield
+        finally:
+            watcher.cancel()
+    finally:
+        await Tortoise.close_connections()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Search result snippets. Matches are found from the token streams the index
+# already keeps (term ids plus character offsets), so the text is never
+# re-analyzed; the snippet is the window of the description holding the most
+# distinct query terms.
+
+import os
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .idx import DEFAULT_FIELDS, FieldStream, ReverseIndex
+from .query import And, Not, Or, Phrase, Term, parse_query
+
+SNIPPET_LENGTH = int(os.environ.get("SNIPPET_LENGTH", "160"))
+
+ELLIPSIS = "…"
+
+Match = Tuple[int, int, int]
+
+
+def query_terms(index: ReverseIndex, query: Optional[str]) -> Dict[str, Set[int]]:
+    # Term ids the query can match, by field. Terms under NOT are left out.
+    result: Dict[str, Set[int]] = defaultdict(set)
+    node = parse_query(query) if query and query.strip() else None
+
+    def walk(node, negated: bool) -> None:
+        if isinstance(node, Not):
+            walk(node.child, not negated)
+        elif isinstance(node, (And, Or)):
+            for child in node.children:
+                walk(child, negated)
+        elif isinstance(node, (Term, Phrase)) and not negated:
+            fields = (node.field,) if node.field else DEFAULT_FIELDS
+            for term in index.analyzer.terms(node.text):
+                term_id = index.term_ids.get(term)
+                if term_id is not None:
+                    for field_name in fields:
+                        result[field_name].add(term_id)
+
+    if node is not None:
+        walk(node, False)
+    return result
+
+
+def _matches(stream: Optional[FieldStream], term_ids: Set[int]) -> List[Match]:
+    # (start, end, term id) of every matching token, in text order.
+    if stream is None or not term_ids:
+        return []
+    return [
+        (stream.starts[i], stream.ends[i], term_id)
+        for i, term_id in enumerate(stream.term_ids) if term_id in term_ids
+    ]
+
+
+def _best_start(text: str, matches: List[Match], length: int) -> int:
+    # Window start covering the most distinct terms, then the most matches;
+    # each candidate leaves a little context before its first match.
+    lead = length // 4
+    best, best_score = 0, (-1, -1)
+    for anchor, _end, _term_id in matches:
+        start = max(0, min(anchor - lead, len(text) - length))
+        inside = [m for m in matches if m[0] >= start and m[1] <= start + length]
+        score = (len({m[2] for m in inside}), len(inside))
+        if score > best_score:
+            best, best_score = start, score
+    return best
+
+
+def _window(text: str, matches: List[Match], length: int) -> Tuple[str, List[List[int]]]:
+    if len(text) <= length:
+        return text, [[start, end] for start, end, _term_id in matches]
+
+    start = _best_start(text, matches, length) if matches else 0
+    end = start + length
+    first = next((m[0] for m in matches if m[0] >= start), end)
+    last = max((m[1] for m in matches if m[0] >= start and m[1] <= end), default=start)
+
+    # Don't cut words in half, unless that would drop a match.
+    if start > 0:
+        space = text.find(" ", start, first)
+        if space != -1:
+            start = space + 1
+    if end < len(text):
+        space = text.rfind(" ", last, end)
+        if space > start:
+            end = space
+
+    prefix = ELLIPSIS if start > 0 else ""
+    suffix = ELLIPSIS if end < len(text) else ""
+    shift = len(prefix) - start
+    highlights = [[s + shift, e + shift] for s, e, _term_id in matches if s >= start and e <= end]
+    return prefix + text[start:end].rstrip() + suffix, highlights
+
+
+def build_snippet(index: ReverseIndex, news_id: int, terms: Dict[str, Set[int]],
+                  length: int = SNIPPET_LENGTH) -> Optional[Dict[str, Any]]:
+    doc = index.documents.get(news_id)
+    if doc is None:
+        return None
+    streams = index.streams.get(news_id, {})
+    snippet, highlights = _window(
+        doc['description'], _matches(streams.get('description'), terms.get('description', set())), length
+    )
+    title_matches = _matches(streams.get('title'), terms.get('title', set()))
+    return {
+        'snippet': snippet,
+        'highlights': highlights,
+        'title_highlights': [[start, end] for start, end, _term_id in title_matches],
+    }
+
+
+def plain_snippet(text: str, length: int = SNIPPET_LENGTH) -> Dict[str, Any]:
+    snippet, _highlights = _window(text or "", [], length)
+    return {'snippet': snippet, 'highlights': [], 'title_highlights': []}
+
+
+def snippets_for(index: ReverseIndex, items: Iterable, query: Optional[str]) -> Dict[int, Dict[str, Any]]:
+    terms = query_terms(index, query) if index.is_initialized else {}
+    result = {}
+    for item in items:
+        snippet = build_snippet(index, item.id, terms) if index.is_initialized else None
+        result[item.id] = snippet if snippet is not None else plain_snippet(item.description)
+    return result
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# "Did you mean" for the search routes, SymSpell style: every vocabulary term
+# is stored under all of its deletions up to `max_distance`, so a lookup only
+# generates deletions of the query word and checks a dict.
+
+import os
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from .idx import DEFAULT_FIELDS, ReverseIndex, news_index
+from .query import FIELD_ALIASES
+
+_WORD_RE = re.compile(r'(\w+)(:?)')
+
+OPERATORS = {'AND', 'OR', 'NOT'}
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for item in frontier:
+            if len(item) <= 1:
+                continue
+            for i in range(len(item)):
+                variant = item[:i] + item[i + 1:]
+                if variant not in result:
+                    next_frontier.add(variant)
+        result |= next_frontier
+        frontier = next_frontier
+    return result
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    # Optimal string alignment distance, giving up past `max_distance`.
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SpellIndex:
+    def __init__(self, index: ReverseIndex, max_distance: int = 2, prefix_length: int = 7):
+        self.index = index
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.deletes: Dict[str, Set[int]] = defaultdict(set)
+        self.indexed_terms = 0
+        self.lookups = 0
+        self.corrections = 0
+
+    def _frequency(self, term_id: int) -> int:
+        return sum(len(self.index.field_indexes[field].get(term_id, ())) for field in DEFAULT_FIELDS)
+
+    def _add_new_terms(self) -> None:
+        terms = self.index.terms
+        for term_id in range(self.indexed_terms, len(terms)):
+            for variant in _deletes(terms[term_id][:self.prefix_length], self.max_distance):
+                self.deletes[variant].add(term_id)
+        self.indexed_terms = len(terms)
+
+    def rebuild(self) -> None:
+        self.deletes.clear()
+        self.indexed_terms = 0
+        self._add_new_terms()
+
+    def on_change(self, news_id: Optional[int]) -> None:
+        if news_id is None:
+            self.rebuild()
+        else:
+            self.refresh()
+
+    def refresh(self) -> None:
+        # Term ids only ever grow, except when the analyzer changes.
+        if len(self.index.terms) < self.indexed_terms:
+            self.rebuild()
+        else:
+            self._add_new_terms()
+
+    def lookup(self, word: str, limit: int = 3) -> List[Tuple[str, int, int]]:
+        # (term, distance, document frequency), best first.
+        self.lookups += 1
+        prefix = word[:self.prefix_length]
+        candidates: Set[int] = set()
+        for variant in _deletes(prefix, self.max_distance):
+            candidates |= self.deletes.get(variant, set())
+
+        results = []
+        for term_id in candidates:
+            term = self.index.terms[term_id]
+            frequency = self._frequency(term_id)
+            if frequency == 0 or term == word:
+                continue
+            distance = edit_distance(word, term, self.max_distance)
+            if distance <= self.max_distance:
+                results.append((term, distance, frequency))
+
+        results.sort(key=lambda item: (item[1], -item[2], item[0]))
+        return results[:limit]
+
+    def _known(self, term: str) -> bool:
+        term_id = self.index.term_ids.get(term)
+        return term_id is not None and self._frequency(term_id) > 0
+
+    def suggest(self, query: str, limit: int = 3) -> List[str]:
+        # Corrected versions of `query`, keeping operators, quotes and field
+        # prefixes where they were. Best guess first.
+        replacements: List[Tuple[int, int, List[str]]] = []
+        for match in _WORD_RE.finditer(query):
+            word, colon = match.group(1), match.group(2)
+            if word in OPERATORS or (colon and word.lower() in FIELD_ALIASES):
+                continue
+            terms = self.index.analyzer.terms(word)
+            if len(terms) != 1 or self._known(terms[0]):
+                continue
+            options = [term for term, _distance, _frequency in self.lookup(terms[0])]
+            if options:
+                replacements.append((match.start(1), match.end(1), options))
+
+        if not replacements:
+            return []
+
+        def build(choice: Dict[int, int]) -> str:
+            parts = []
+            last = 0
+            for i, (start, end, options) in enumerate(replacements):
+                parts.append(query[last:start])
+                parts.append(options[choice.get(i, 0)])
+                last = end
+            parts.append(query[last:])
+            return "".join(parts)
+
+        suggestions = [build({})]
+        for i, (_start, _end, options) in enumerate(replacements):
+            for alternative in range(1, len(options)):
+                if len(suggestions) >= limit:
+                    break
+                suggestions.append(build({i: alternative}))
+
+        self.corrections += 1
+        return suggestions[:limit]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'terms': self.indexed_terms,
+            'delete_keys': len(self.deletes),
+            'lookups': self.lookups,
+            'corrections': self.corrections,
+        }
+
+
+spell_index = SpellIndex(
+    news_index,
+    max_distance=int(os.environ.get("SPELL_MAX_DISTANCE", "2")),
+)
+news_index.listeners.append(spell_index.on_change)
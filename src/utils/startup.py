@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Startup stages (database, index, Discord login, ...) with their status and
+# timings, for /healthz and /readyz. Stages run on different threads and
+# partly in the background, so each one records itself as it goes.
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+# As close to process start as this module gets imported.
+BOOT = time.monotonic()
+
+
+@dataclass
+class Stage:
+    name: str
+    status: str = "pending"
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        def offset(moment: Optional[float]) -> Optional[float]:
+            return None if moment is None else round((moment - BOOT) * 1000, 1)
+
+        end = self.finished if self.finished is not None else time.monotonic()
+        return {
+            'status': self.status,
+            'started_ms': offset(self.started),
+            'finished_ms': offset(self.finished),
+            'duration_ms': round((end - self.started) * 1000, 1) if self.started is not None else None,
+            'error': self.error,
+        }
+
+
+class Startup:
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        self.lock = threading.Lock()
+
+    def _get(self, name: str) -> Stage:
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = Stage(name)
+            return stage
+
+    def start(self, name: str) -> None:
+        stage = self._get(name)
+        if stage.started is None:
+            stage.started = time.monotonic()
+            stage.status = "running"
+
+    def finish(self, name: str, error: Optional[str] = None) -> None:
+        stage = self._get(name)
+        if stage.started is None:
+            stage.started = BOOT
+        stage.finished = time.monotonic()
+        stage.status = "failed" if error else "done"
+        stage.error = error
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        self.start(name)
+        try:
+            yield
+        except BaseException as e:
+            self.finish(name, f"{type(e).__name__}: {e}")
+            raise
+        self.finish(name)
+
+    def is_done(self, names: Iterable[str]) -> bool:
+        return all(name in self.stages and self.stages[name].status == "done" for name in names)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            stages = list(self.stages.values())
+        return {
+            'uptime_ms': round((time.monotonic() - BOOT) * 1000, 1),
+            'stages': {stage.name: stage.to_dict() for stage in stages},
+        }
+
+
+startup = Startup()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Article counters per reporter, category, region and day, kept up to date on
+# every create/edit/delete so reads never scan `newsschema`.
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.signals import post_delete, post_save, pre_save
+
+from .db import NewsSchema, Region, ReporterSchema, StatSchema
+from .globals import logger
+
+StatKeys = Dict[str, str]
+
+KINDS = ('total', 'reporter', 'category', 'region', 'day')
+
+
+def stat_keys(reporter, category, region, date: Optional[datetime]) -> StatKeys:
+    if isinstance(region, Region):
+        region = region.value
+    return {
+        'total': 'all',
+        'reporter': str(reporter),
+        'category': category,
+        'region': region or Region.Global.value,
+        'day': date.date().isoformat() if date else 'unknown',
+    }
+
+
+def _item_keys(item: NewsSchema) -> StatKeys:
+    return stat_keys(item.reporter, item.category, item.region, item.date)
+
+
+class NewsStats:
+    def __init__(self):
+        self.counters: Dict[str, Dict[str, int]] = {kind: defaultdict(int) for kind in KINDS}
+        self.is_loaded = False
+
+    def count(self, kind: str, key: str = 'all') -> int:
+        return self.counters[kind].get(key, 0)
+
+    async def load(self, rebuild: bool = True) -> None:
+        # API workers pass rebuild=False: they only read what the bot writes,
+        # and catch up on the next refresh if the bot is still rebuilding.
+        rows = await StatSchema.all().values_list('kind', 'key', 'count')
+        if rebuild and not rows and await NewsSchema.all().exists():
+            await self.rebuild()
+            return
+
+        for kind in KINDS:
+            self.counters[kind].clear()
+        for kind, key, count in rows:
+            if kind in self.counters and count > 0:
+                self.counters[kind][key] = count
+        self.is_loaded = True
+        logger.info(f"Stats loaded: {self.count('total')} articles")
+
+    async def rebuild(self) -> None:
+        # One-off scan for databases that predate the counters table.
+        logger.info("Rebuilding stats counters from newsschema...")
+        for kind in KINDS:
+            self.counters[kind].clear()
+
+        rows = await NewsSchema.all().values_list('reporter', 'category', 'region', 'date')
+        for reporter, category, region, date in rows:
+            for kind, key in stat_keys(reporter, category, region, date).items():
+                self.counters[kind][key] += 1
+
+        await StatSchema.all().delete()
+        await StatSchema.bulk_create([
+            StatSchema(kind=kind, key=key, count=count)
+            for kind, counts in self.counters.items()
+            for key, count in counts.items()
+        ])
+
+        await ReporterSchema.all().update(posts=0)
+        for reporter, posts in self.counters['reporter'].items():
+            await self._set_reporter_posts(reporter, posts)
+
+        self.is_loaded = True
+        logger.info(f"Stats rebuilt: {self.count('total')} articles")
+
+    async def apply(self, before: Optional[StatKeys], after: Optional[StatKeys]) -> None:
+        deltas: Dict[tuple, int] = defaultdict(int)
+        for keys, sign in ((before, -1), (after, 1)):
+            if keys:
+                for kind, key in keys.items():
+                    deltas[(kind, key)] += sign
+
+        for (kind, key), delta in deltas.items():
+            if delta == 0:
+                continue
+            self.counters[kind][key] += delta
+            if self.counters[kind][key] <= 0:
+                self.counters[kind].pop(key, None)
+            try:
+                await self._persist(kind, key, delta)
+                if kind == 'reporter':
+                    await self._bump_reporter_posts(key, delta)
+            except Exception as e:
+                logger.error(f"Failed to persist stat {kind}:{key} ({delta:+d}): {e}")
+
+    async def _persist(self, kind: str, key: str, delta: int) -> None:
+        updated = await StatSchema.filter(kind=kind, key=key).update(count=F('count') + delta)
+        if updated:
+            return
+        try:
+            await StatSchema.create(kind=kind, key=key, count=delta)
+        except IntegrityError:
+            await StatSchema.filter(kind=kind, key=key).update(count=F('count') + delta)
+
+    async def _bump_reporter_posts(self, reporter: str, delta: int) -> None:
+        try:
+            user_id = int(reporter)
+        except ValueError:
+            return
+        await ReporterSchema.filter(user_id=user_id).update(posts=F('posts') + delta)
+
+    async def _set_reporter_posts(self, reporter: str, posts: int) -> None:
+        try:
+            user_id = int(reporter)
+        except ValueError:
+            return
+        await ReporterSchema.filter(user_id=user_id).update(posts=posts)
+
+    def get_stats(self, days: int = 30) -> Dict[str, Any]:
+        recent_days = sorted(self.counters['day'].items(), reverse=True)[:days]
+        return {
+            'total': self.count('total'),
+            'reporters': dict(self.counters['reporter']),
+            'categories': dict(self.counters['category']),
+            'regions': dict(self.counters['region']),
+            'days': dict(recent_days),
+        }
+
+
+news_stats = NewsStats()
+
+
+@pre_save(NewsSchema)
+async def _remember_stat_keys(sender, instance: NewsSchema, using_db, update_fields) -> None:
+    instance._stat_keys_before = None
+    if not instance._saved_in_db:
+        return
+    row = await NewsSchema.filter(id=instance.id).values_list('reporter', 'category', 'region', 'date')
+    if row:
+        instance._stat_keys_before = stat_keys(*row[0])
+
+
+@post_save(NewsSchema)
+async def _count_saved_news(sender, instance: NewsSchema, created, using_db, update_fields) -> None:
+    before = None if created else getattr(instance, '_stat_keys_before', None)
+    await news_stats.apply(before, _item_keys(instance))
+
+
+@post_delete(NewsSchema)
+async def _count_deleted_news(sender, instance: NewsSchema, using_db) -> None:
+    await news_stats.apply(_item_keys(instance), None)
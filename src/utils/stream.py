@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Fan-out hub for the /api/stream server-sent events feed. Articles are
+# written from the bot's event loop while subscribers live on the API's, so
+# publishing hands each pre-encoded frame over with call_soon_threadsafe.
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from tortoise.signals import post_delete, post_save
+
+from .db import NewsSchema
+from .globals import logger
+from .serialize import dumps
+
+
+@dataclass
+class Event:
+    id: int
+    frame: bytes
+
+
+@dataclass(eq=False)
+class Subscriber:
+    loop: asyncio.AbstractEventLoop
+    queue: "asyncio.Queue[Optional[bytes]]"
+    dropped: bool = False
+
+    def offer(self, frame: bytes) -> None:
+        # Runs on the subscriber's loop. A client that can't keep up is cut
+        # off rather than buffered; it resumes with Last-Event-ID.
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class EventHub:
+    def __init__(self, queue_size: int = 64, history_size: int = 512, max_subscribers: int = 1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.history: Deque[Event] = deque(maxlen=history_size)
+        self.subscribers: Set[Subscriber] = set()
+        self.lock = threading.Lock()
+        # Starts at the boot time in ms so ids keep increasing across restarts.
+        self.next_id = time.time_ns() // 1_000_000
+        self.published = 0
+        self.dropped = 0
+
+    def _frame(self, event_id: int, event_type: str, data: bytes) -> bytes:
+        return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event_type.encode(), data)
+
+    def publish(self, event_type: str, payload: Dict[str, Any]) -> None:
+        data = dumps(payload)
+        with self.lock:
+            self.next_id += 1
+            event = Event(self.next_id, self._frame(self.next_id, event_type, data))
+            subscribers = self._append(event)
+        self._fan_out(event, subscribers)
+
+    def relay(self, event_id: int, frame: bytes) -> None:
+        # API workers replay the builder's events from its index snapshots,
+        # keeping the builder's ids so Last-Event-ID works on any worker.
+        with self.lock:
+            if self.history and event_id <= self.history[-1].id:
+                return
+            self.next_id = event_id
+            event = Event(event_id, frame)
+            subscribers = self._append(event)
+        self._fan_out(event, subscribers)
+
+    def _append(self, event: Event) -> List[Subscriber]:
+        # Called with the lock held.
+        self.history.append(event)
+        self.published += 1
+        return list(self.subscribers)
+
+    def _fan_out(self, event: Event, subscribers: List[Subscriber]) -> None:
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event.frame)
+            except RuntimeError:
+                # The subscriber's loop is gone.
+                self.unsubscribe(subscriber)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Optional[Subscriber]:
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            backlog = self._replay(last_event_id)
+            subscriber = Subscriber(asyncio.get_running_loop(), asyncio.Queue(self.queue_size + len(backlog)))
+            for frame in backlog:
+                subscriber.offer(frame)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def _replay(self, last_event_id: Optional[str]) -> List[bytes]:
+        if not last_event_id:
+            return []
+        try:
+            last_id = int(last_event_id)
+        except ValueError:
+            return []
+        if not self.history or last_id >= self.history[-1].id:
+            return []
+        if last_id < self.history[0].id - 1:
+            # Too far behind to replay: tell the client to refetch instead.
+            return [self._frame(self.history[0].id - 1, "reset", b"{}")]
+        return [event.frame for event in self.history if event.id > last_id]
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.discard(subscriber)
+                if subscriber.dropped:
+                    self.dropped += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'subscribers': len(self.subscribers),
+            'published': self.published,
+            'dropped_subscribers': self.dropped,
+            'history': len(self.history),
+        }
+
+
+event_hub = EventHub(
+    queue_size=int(os.environ.get("STREAM_QUEUE_SIZE", "64")),
+    history_size=int(os.environ.get("STREAM_HISTORY_SIZE", "512")),
+    max_subscribers=int(os.environ.get("STREAM_MAX_SUBSCRIBERS", "1000")),
+)
+
+
+async def publish_news_event(event_type: str, news_item) -> None:
+    if event_type == "deleted":
+        payload = {"id": news_item.id}
+    else:
+        payload = await news_item.to_dict(None)
+    try:
+        event_hub.publish(event_type, payload)
+    except Exception as e:
+        logger.error(f"Failed to publish {event_type} event for news {news_item.id}: {e}")
+
+
+@post_save(NewsSchema)
+async def _stream_saved_news(sender, instance: NewsSchema, created, using_db, update_fields) -> None:
+    if not created and update_fields and set(update_fields) <= {"message_id"}:
+        # Bookkeeping after publishing to Discord, not a content change.
+        return
+    await publish_news_event("created" if created else "edited", instance)
+
+
+@post_delete(NewsSchema)
+async def _stream_deleted_news(sender, instance: NewsSchema, using_db) -> None:
+    await publish_news_event("deleted", instance)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+def to_timestamp(date: Optional[datetime]) -> Optional[float]:
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        # Stored dates are naive UTC.
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+def month_range(year: int, month: int) -> Tuple[datetime, datetime]:
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    if month == 12:
+        end = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        end = datetime(year, month + 1, 1, tzinfo=timezone.utc)
+    return start, end
+
+
+class TimeIndex:
+    # (timestamp, news_id) pairs kept sorted; ranges are two bisects.
+
+    def __init__(self):
+        self.entries: List[Tuple[float, int]] = []
+        self.by_id: Dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, news_id: int, date: Optional[datetime]) -> None:
+        timestamp = to_timestamp(date)
+        if self.by_id.get(news_id) == timestamp:
+            return
+        self.remove(news_id)
+        if timestamp is None:
+            return
+        insort(self.entries, (timestamp, news_id))
+        self.by_id[news_id] = timestamp
+
+    def remove(self, news_id: int) -> None:
+        timestamp = self.by_id.pop(news_id, None)
+        if timestamp is None:
+            return
+        pos = bisect_left(self.entries, (timestamp, news_id))
+        if pos < len(self.entries) and self.entries[pos] == (timestamp, news_id):
+            del self.entries[pos]
+
+    def _bounds(self, since: Optional[datetime], until: Optional[datetime]) -> Tuple[int, int]:
+        # `since` is inclusive, `until` exclusive.
+        low = 0 if since is None else bisect_left(self.entries, (to_timestamp(since), -1))
+        high = len(self.entries) if until is None else bisect_left(self.entries, (to_timestamp(until), -1))
+        return low, max(low, high)
+
+    def iter_range(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   newest_first: bool = True) -> Iterator[int]:
+        low, high = self._bounds(since, until)
+        indices = range(high - 1, low - 1, -1) if newest_first else range(low, high)
+        for i in indices:
+            yield self.entries[i][1]
+
+    def count_range(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> int:
+        low, high = self._bounds(since, until)
+        return high - low
+
+    def latest(self, limit: int) -> List[int]:
+        return [news_id for _timestamp, news_id in reversed(self.entries[-limit:])] if limit > 0 else []
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2025 charis_k
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+# Request tracing. A sampled API request or slash command becomes a trace;
+# the stages it passes through (index, database, encoding, Discord calls)
+# record spans under it. The current span travels in a contextvar, so spans
+# nest without being passed around and cost one lookup when not sampled.
+
+import functools
+import hmac
+import html
+import inspect
+import json
+import os
+import random
+import threading
+import time
+import typing
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence
+
+from .globals import logger
+
+_current_span: "ContextVar[Optional[Span]]" = ContextVar("trace_span", default=None)
+
+
+@dataclass(eq=False)
+class Span:
+    trace: "Trace"
+    name: str
+    parent: Optional["Span"]
+    attrs: Dict[str, Any]
+    start: float = field(default_factory=time.perf_counter)
+    end: Optional[float] = None
+    error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+@dataclass(eq=False)
+class Trace:
+    trace_id: str
+    name: str
+    started_at: float = field(default_factory=time.time)
+    spans: List[Span] = field(default_factory=list)
+    dropped_spans: int = 0
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    @property
+    def duration(self) -> float:
+        return self.root.duration
+
+    def to_dict(self) -> Dict[str, Any]:
+        origin = self.root.start
+        index = {id(span): i for i, span in enumerate(self.spans)}
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            'duration_ms': round(self.duration * 1000, 3),
+            'error': self.root.error,
+            'dropped_spans': self.dropped_spans,
+            'spans': [
+                {
+                    'id': i,
+                    'parent': index.get(id(span.parent)) if span.parent is not None else None,
+                    'name': span.name,
+                    'start_ms': round((span.start - origin) * 1000, 3),
+                    'duration_ms': round(span.duration * 1000, 3),
+                    'attrs': span.attrs,
+                    'error': span.error,
+                }
+                for i, span in enumerate(self.spans)
+            ],
+        }
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0, max_traces: int = 500, max_spans: int = 500,
+                 export_path: Optional[str] = None, export_max_bytes: int = 10_000_000,
+                 debug_token: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.export_max_bytes = export_max_bytes
+        # Required for /debug/traces and for forcing a trace with X-Trace;
+        # without one, both are off.
+        self.debug_token = debug_token
+        self.max_spans = max_spans
+        self.export_path = export_path
+        self.finished: Deque[Trace] = deque(maxlen=max_traces)
+        # Traces finish on both the bot's and the API's threads.
+        self.lock = threading.Lock()
+        self.export_file = None
+        self.started = 0
+        self.sampled = 0
+        self.exported = 0
+        self.rotations = 0
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        return cls(
+            sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", "0")),
+            max_traces=int(os.environ.get("TRACE_BUFFER_SIZE", "500")),
+            export_path=os.environ.get("TRACE_EXPORT_PATH") or None,
+            export_max_bytes=int(os.environ.get("TRACE_EXPORT_MAX_BYTES", "10000000")),
+            debug_token=os.environ.get("TRACE_DEBUG_TOKEN") or None,
+        )
+
+    def authorized(self, token: Optional[str]) -> bool:
+        if not self.debug_token or not token:
+            return False
+        return hmac.compare_digest(token.encode(), self.debug_token.encode())
+
+    @contextmanager
+    def trace(self, name: str, force: bool = False, **attrs: Any) -> Iterator[Optional[Span]]:
+        # Starts a trace, or a plain span when one is already running.
+        if _current_span.get() is not None:
+            with self.span(name, **attrs) as span:
+                yield span
+            return
+
+        self.started += 1
+        if not force and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            yield None
+            return
+
+        self.sampled += 1
+        trace = Trace(uuid.uuid4().hex[:16], name)
+        root = Span(trace, name, None, attrs)
+        trace.spans.append(root)
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            root.end = time.perf_counter()
+            _current_span.reset(token)
+            self._finish(trace)
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+
+        trace = parent.trace
+        if len(trace.spans) >= self.max_spans:
+            trace.dropped_spans += 1
+            yield None
+            return
+
+        span = Span(trace, name, parent, attrs)
+        trace.spans.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+
+    def current(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def _finish(self, trace: Trace) -> None:
+        with self.lock:
+            self.finished.append(trace)
+            if self.export_path:
+                self._export(trace)
+
+    def _export(self, trace: Trace) -> None:
+        try:
+            if self.export_file is not None and self.export_file.tell() >= self.export_max_bytes:
+                # One previous file is kept, like the query log.
+                self.export_file.close()
+                self.export_file = None
+                os.replace(self.export_path, f"{self.export_path}.1")
+                self.rotations += 1
+            if self.export_file is None:
+                self.export_file = open(self.export_path, "ab")
+            self.export_file.write(json.dumps(trace.to_dict(), default=str).encode("utf-8") + b"\n")
+            self.export_file.flush()
+            self.exported += 1
+        except OSError as e:
+            logger.error(f"Could not export trace to {self.export_path}: {e}")
+            self.export_path = None
+
+    def slowest(self, limit: int = 50, name: Optional[str] = None) -> List[Trace]:
+        with self.lock:
+            traces = [t for t in self.finished if name is None or t.name.startswith(name)]
+        traces.sort(key=lambda t: t.duration, reverse=True)
+        return traces[:limit]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'sample_rate': self.sample_rate,
+            'started': self.started,
+            'sampled': self.sampled,
+            'buffered': len(self.finished),
+            'exported': self.exported,
+            'export_rotations': self.rotations,
+        }
+
+
+tracer = Tracer.from_env()
+
+
+def _resolved_signature(func: Callable) -> inspect.Signature:
+    # discord.py resolves string annotations against the callback's module,
+    # which for a wrapper would be this one; hand it resolved types instead.
+    signature = inspect.signature(func)
+    try:
+        hints = typing.get_type_hints(func)
+    except Exception:
+        return signature
+    return signature.replace(
+        parameters=[p.replace(annotation=hints.get(p.name, p.annotation)) for p in signature.parameters.values()],
+        return_annotation=hints.get("return", signature.return_annotation),
+    )
+
+
+def traced(name: Optional[str] = None):
+    """Wrap a coroutine function in a span named `name` (default: its qualname)."""
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return await func(*args, **kwargs)
+
+        wrapper.__signature__ = _resolved_signature(func)
+        return wrapper
+
+    return decorator
+
+
+def traced_command(name: str):
+    """`traced` for slash command callbacks: every invocation may start a trace."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(group, interaction, *args, **kwargs):
+            with tracer.trace(name, user=str(interaction.user.id)):
+                return await func(group, interaction, *args, **kwargs)
+
+        wrapper.__signature__ = _resolved_signature(func)
+        return wrapper
+
+    return decorator
+
+
+class TracingMiddleware:
+    def __init__(self, app, tracer: Tracer, exclude_prefixes: Sequence[str] = ()):
+        self.app = app
+        self.tracer = tracer
+        self.exclude_prefixes = tuple(exclude_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        force = headers.get(b"x-trace") == b"1" and \
+            self.tracer.authorized(headers.get(b"x-debug-token", b"").decode("latin-1"))
+        with self.tracer.trace(f"{scope['method']} {scope['path']}", force=force) as root:
+            if root is None:
+                await self.app(scope, receive, send)
+                return
+
+            if scope.get("query_string"):
+                root.set(query=scope["query_string"].decode("latin-1"))
+
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    root.set(status=message["status"])
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-trace-id", root.trace.trace_id.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
+
+
+_PAGE_STYLE = """
+body { font: 13px/1.4 system-ui, sans-serif; margin: 1.5em; }
+details { margin: .3em 0; border-bottom: 1px solid #ddd; padding-bottom: .3em; }
+summary { cursor: pointer; }
+table { border-collapse: collapse; width: 100%; margin-top: .4em; }
+td { padding: 1px 6px; white-space: nowrap; }
+td.bar { width: 50%; }
+.bar div { background: #5865f2; height: 10px; min-width: 1px; }
+.error { color: #c00; }
+.muted { color: #777; }
+"""
+
+
+def render_traces_page(traces: List[Trace]) -> str:
+    rows = []
+    for trace in traces:
+        data = trace.to_dict()
+        total = data['duration_ms'] or 1.0
+        depth: Dict[int, int] = {}
+        spans = []
+        for span in data['spans']:
+            level = 0 if span['parent'] is None else depth[span['parent']] + 1
+            depth[span['id']] = level
+            attrs = " ".join(f"{k}={v}" for k, v in span['attrs'].items())
+            error = f' <span class="error">{html.escape(span["error"])}</span>' if span['error'] else ""
+            spans.append(
+                f"<tr><td style=\"padding-left:{level * 16 + 6}px\">{html.escape(span['name'])}{error}</td>"
+                f"<td>{span['duration_ms']:.2f} ms</td>"
+                f"<td class=\"bar\"><div style=\"margin-left:{span['start_ms'] / total * 100:.2f}%;"
+                f"width:{span['duration_ms'] / total * 100:.2f}%\"></div></td>"
+                f"<td class=\"muted\">{html.escape(attrs)}</td></tr>"
+            )
+        error = f' <span class="error">{html.escape(data["error"])}</span>' if data['error'] else ""
+        rows.append(
+            f"<details><summary><b>{data['duration_ms']:.1f} ms</b> {html.escape(data['name'])}{error} "
+            f"<span class=\"muted\">{data['started_at']} {data['trace_id']}</span></summary>"
+            f"<table>{''.join(spans)}</table></details>"
+        )
+
+    body = "".join(rows) or "<p class=\"muted\">No traces yet. Set TRACE_SAMPLE_RATE, or send <code>X-Trace: 1</code>.</p>"
+    return (
+        "<!doctype html><html><head><meta charset=\"utf-8\"><title>Slowest traces</title>"
+        f"<style>{_PAGE_STYLE}</style></head><body><h1>Slowest recent traces</h1>{body}</body></html>"
+    )
@@ -0,0 +1,68 @@
+# Archiving keeps an article's posted copies, and /news still reaches
+# archived articles. Runs the commands against the simulator's stand-in
+# Discord.
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from tortoise import Tortoise
+
+from tools.simulate import SimConfig, SimInteraction, Simulation, news_command
+from utils.archive import cold_archive
+from utils.db import ArchivedNewsSchema, Category, NewsCopySchema, NewsSchema, Region
+from utils.idx import initialize_idx, news_index
+
+
+def test_archived_articles_keep_copies_and_stay_editable(tmp_path):
+    async def run():
+        await Tortoise.init(db_url=f"sqlite://{tmp_path}/archive.db", modules={"models": ["utils.db"]})
+        try:
+            await Tortoise.generate_schemas()
+            simulation = Simulation(SimConfig(latency=0, jitter=0), reporters=1, seed=1)
+            await simulation.seed(3)
+            await initialize_idx(NewsSchema)
+            member = simulation.members[0]
+            ids = sorted(simulation.articles)
+            old_date = datetime(2020, 1, 1, tzinfo=timezone.utc)
+            await NewsSchema.filter(id__in=ids).update(date=old_date)
+            titles = {news.id: news.title for news in await NewsSchema.filter(id__in=ids)}
+
+            assert await cold_archive.archive_before(datetime.now(timezone.utc) - timedelta(days=1)) == 3
+            assert await NewsSchema.filter(id__in=ids).count() == 0
+            assert await ArchivedNewsSchema.all().count() == 3
+
+            def interaction():
+                return SimInteraction(simulation.sim, simulation.client, member)
+
+            # An archived title is still taken.
+            add = interaction()
+            await news_command.add.callback(
+                news_command, add, title=titles[ids[0]], description="Again",
+                image_url="https://example.invalid/again.png", credit=str(member.id),
+                category=Category.WORLD, region=Region.Global,
+            )
+            assert await NewsSchema.filter(title=titles[ids[0]]).count() == 0
+
+            # Deleting comes back through the hot table, copies and all.
+            message_id = (await cold_archive.fetch([ids[0]]))[ids[0]].message_id
+            await news_command.delete.callback(news_command, interaction(), news_id=ids[0])
+            assert message_id not in simulation.channel.messages
+            assert await NewsSchema.filter(id=ids[0]).count() == 0
+            assert await NewsCopySchema.filter(news_id=ids[0]).count() == 0
+            assert not await ArchivedNewsSchema.exists(id=ids[0])
+
+            await news_command.edit.callback(news_command, interaction(), news_id=ids[1], description="Updated")
+            edited = await NewsSchema.get(id=ids[1])
+            assert edited.description == "Updated"
+            assert await NewsCopySchema.filter(news_id=ids[1]).count() == 1
+            assert news_index.documents[ids[1]]["description"] == "Updated"
+
+            # The untouched article is still archived, with its original date.
+            restored = await cold_archive.restore(ids[2])
+            assert restored.date == old_date
+            assert (await NewsSchema.get(id=ids[2])).date == old_date
+            assert await cold_archive.restore(ids[2]) is None
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
@@ -0,0 +1,145 @@
+# Image metadata probes against a local aiohttp server standing in for an
+# image host. The server is on loopback, so these probes allow private
+# addresses unless a test says otherwise.
+
+import asyncio
+import struct
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from utils.images import ImageMetadataService, image_size, is_public_address
+
+USER_AGENTS = web.AppKey("user_agents", list)
+
+PNG = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">IIBBBBB", 800, 600, 8, 2, 0, 0, 0) + b"\0" * 200
+
+
+async def ranged_png(request: web.Request) -> web.Response:
+    request.app[USER_AGENTS].append(request.headers.get("User-Agent"))
+    first, last = request.headers["Range"].split("=")[1].split("-")
+    part = PNG[int(first):int(last) + 1]
+    return web.Response(status=206, body=part, content_type="image/png",
+                        headers={"Content-Range": f"bytes {first}-{len(part) - 1}/{len(PNG)}"})
+
+
+async def no_ranges(request: web.Request) -> web.Response:
+    if request.method == "GET":
+        return web.Response(status=416)
+    return web.Response(content_type="image/jpeg", headers={"Content-Length": "5000"})
+
+
+async def page(request: web.Request) -> web.Response:
+    return web.Response(text="<html></html>", content_type="text/html")
+
+
+async def slow(request: web.Request) -> web.Response:
+    await asyncio.sleep(2)
+    return web.Response(body=PNG, content_type="image/png")
+
+
+def image_host() -> web.Application:
+    app = web.Application()
+    app[USER_AGENTS] = []
+    app.router.add_get("/ranged.png", ranged_png)
+    app.router.add_route("*", "/no-ranges.jpg", no_ranges)
+    app.router.add_get("/page", page)
+    app.router.add_get("/slow.png", slow)
+    return app
+
+
+def probe(*paths: str, **options):
+    async def run():
+        app = image_host()
+        async with TestServer(app) as server:
+            service = ImageMetadataService(**{"allow_private": True, **options})
+            try:
+                urls = [str(server.make_url(path)) for path in paths]
+                results = await service.probe_many(urls)
+                # Second time round everything comes from the cache.
+                await service.probe_many(urls)
+            finally:
+                await service.close()
+            return list(results.values()), service, app[USER_AGENTS]
+    return asyncio.run(run())
+
+
+def test_ranged_get_reads_dimensions():
+    (info,), service, _agents = probe("/ranged.png")
+    assert info.ok and not info.broken
+    assert (info.status, info.format, info.width, info.height) == (206, "png", 800, 600)
+    assert info.size == len(PNG)
+    assert service.stats['head_fallbacks'] == 0
+
+
+def test_head_fallback_when_ranges_are_refused():
+    (info,), service, _agents = probe("/no-ranges.jpg")
+    assert info.ok
+    assert (info.status, info.content_type, info.size) == (200, "image/jpeg", 5000)
+    assert info.width is None
+    assert service.stats['head_fallbacks'] == 1
+
+
+def test_non_image_content_type_is_broken():
+    (info,), _service, _agents = probe("/page")
+    assert info.broken
+    assert info.problem() == "not an image (text/html)"
+
+
+def test_timeout_is_unreachable_not_broken():
+    (info,), service, _agents = probe("/slow.png", timeout=0.2)
+    assert not info.ok and not info.broken
+    assert info.problem() == "timed out after 0.2s"
+    assert service.stats['unreachable'] == 1
+
+
+def test_results_are_cached():
+    _results, service, agents = probe("/ranged.png", "/ranged.png")
+    assert len(agents) == 1
+    assert service.stats['hits'] == 1
+
+
+def test_session_factory_is_used():
+    def factory():
+        return aiohttp.ClientSession(headers={"User-Agent": "test-agent"})
+    _results, _service, agents = probe("/ranged.png", session_factory=factory)
+    assert agents == ["test-agent"]
+
+
+def test_private_addresses_are_refused():
+    (info,), service, agents = probe("/ranged.png", allow_private=False)
+    assert info.broken
+    assert info.problem() == "127.0.0.1 is not a public address"
+    assert agents == []
+    assert service.stats['refused'] == 1
+
+
+def test_names_resolving_to_private_addresses_are_refused():
+    async def run():
+        service = ImageMetadataService()
+        try:
+            return await service.probe("http://localhost:9/a.png"), await service.probe("ftp://example.com/a.png")
+        finally:
+            await service.close()
+    by_name, other_scheme = asyncio.run(run())
+    assert by_name.broken and by_name.problem() == "localhost is not a public address"
+    assert other_scheme.broken and other_scheme.problem() == "not an http(s) URL"
+
+
+def test_public_address_check():
+    assert is_public_address("93.184.215.14")
+    assert is_public_address("2606:2800:21f:cb07:6820:80da:af6b:8b2c")
+    for host in ("127.0.0.1", "10.1.2.3", "169.254.169.254", "192.168.0.1", "100.64.0.1",
+                 "0.0.0.0", "::1", "fe80::1", "fd00::1", "::ffff:127.0.0.1", "224.0.0.1"):
+        assert not is_public_address(host), host
+
+
+def test_image_size_formats():
+    gif = b"GIF89a" + struct.pack("<HH", 10, 20)
+    webp = b"RIFF\0\0\0\0WEBPVP8X" + b"\0" * 8 + (299).to_bytes(3, "little") + (199).to_bytes(3, "little")
+    jpeg = b"\xff\xd8\xff\xe0" + struct.pack(">H", 4) + b"JF" + b"\xff\xc0" + struct.pack(">HBHH", 11, 8, 480, 640) + b"\0" * 6
+    assert image_size(gif) == ("gif", 10, 20)
+    assert image_size(webp) == ("webp", 300, 200)
+    assert image_size(jpeg) == ("jpeg", 640, 480)
+    assert image_size(PNG[:20]) is None
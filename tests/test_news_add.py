@@ -0,0 +1,43 @@
+# `/news add` against the simulator's stand-in Discord, with the crosspost
+# rate limit already used up.
+
+import asyncio
+
+from tortoise import Tortoise
+
+from tools.simulate import SimConfig, SimInteraction, Simulation, news_command
+from utils.db import Category, NewsCopySchema, NewsSchema, Region
+
+
+def test_add_replies_when_publish_is_rate_limited(tmp_path):
+    async def run():
+        await Tortoise.init(db_url=f"sqlite://{tmp_path}/add.db", modules={"models": ["utils.db"]})
+        try:
+            await Tortoise.generate_schemas()
+            config = SimConfig(latency=0, jitter=0, publish_rate=(1, 3600.0), max_ratelimit_timeout=0)
+            simulation = Simulation(config, reporters=1, seed=1)
+            await simulation.seed(0)
+            member = simulation.members[0]
+
+            interactions = []
+            for title in ("First bridge story", "Second bridge story"):
+                interaction = SimInteraction(simulation.sim, simulation.client, member)
+                await news_command.add.callback(
+                    news_command, interaction, title=title, description="About a bridge",
+                    image_url=f"https://example.invalid/{len(interactions)}.png", credit=str(member.id),
+                    category=Category.WORLD, region=Region.Global,
+                )
+                interactions.append(interaction)
+
+            assert [interaction.followup.sent for interaction in interactions] == [1, 1]
+            assert simulation.sim.stats.rate_limited["publish"] == 1
+            published = [message.published for message in simulation.channel.messages.values()]
+            assert sorted(published) == [False, True]
+            # The second article is saved and editable all the same.
+            second = await NewsSchema.get(title="Second bridge story")
+            assert second.message_id is not None
+            assert await NewsCopySchema.filter(news_id=second.id).count() == 1
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())